@@ -0,0 +1,412 @@
+#!/usr/bin/python3
+""" Benchmarks for the backup utilities, run against synthetic trees built in a temp directory.
+"""
+import os
+import sys
+import json
+import time
+import shutil as sh
+import argparse
+import contextlib
+import tempfile
+import subprocess as subp
+
+import diskwalk_api as dwa
+import backup_utility as bu
+import compress_api as cpa
+
+
+def _wiki_text(seed, file_size):
+    """ vimwiki like text of roughly file_size bytes, distinct per seed """
+    lines = ["= Page %d =\n" % (seed)]
+    total = len(lines[0])
+    row = 0
+    while total < file_size:
+        line = "  * [[page_%d]] item %d -- note %d\n" % ((seed * 31 + row) % 997, row,
+                                                       (seed * 7919 + row) % 10007)
+        lines.append(line)
+        total = total + len(line)
+        row = row + 1
+    return "".join(lines).encode("UTF-8")
+
+
+def build_tree(root, depth=3, fanout=8, files_per_dir=20, file_size=512, text=False):
+    """ builds synthetic directory tree (fanout ** depth leaf directories) returns file count.
+        text writes distinct wiki like pages instead of a fixed payload
+    """
+    count = 0
+    payload = b"x" * file_size
+    stack = [(root, 0)]
+    while stack:
+        cur_dir, cur_depth = stack.pop()
+        os.makedirs(cur_dir, exist_ok=True)
+        for i in range(files_per_dir):
+            with open(os.sep.join([cur_dir, "file_%04d.wiki" % (i)]), "wb") as fp:
+                fp.write(_wiki_text(count, file_size) if text else payload)
+            count = count + 1
+        if cur_depth < depth:
+            for i in range(fanout):
+                stack.append((os.sep.join([cur_dir, "dir_%02d" % (i)]), cur_depth + 1))
+    return count
+
+
+def build_dump(path, size_mb=64):
+    """ writes SQL dump like (compressible, not trivially so) file of roughly size_mb """
+    row = 0
+    target = size_mb * 1024 * 1024
+    with open(path, "w") as fp:
+        fp.write("-- MySQL dump (synthetic)\n")
+        while fp.tell() < target:
+            values = ",".join(["(%d,'name_%d',%d.%02d,'2020-%02d-%02d')" % (
+                row + i, (row + i) * 7919 % 100003, (row + i) * 31 % 9973, i % 100,
+                i % 12 + 1, i % 28 + 1) for i in range(200)])
+            fp.write("INSERT INTO `positions` VALUES %s;\n" % (values))
+            row = row + 200
+    return os.path.getsize(path)
+
+
+def _time_call(func, repeat=3, setup=None):
+    """ returns best wall time (seconds) of repeat calls and the last result; setup (untimed)
+        runs before every call
+    """
+    best = None
+    rslt = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        rslt = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None or elapsed < best else best
+    return best, rslt
+
+
+def bench_walk(root, workers=(0, 4, 8, 16), latency_ms=0.0, repeat=3):
+    """ times serial vs parallel diskwalk.iterEntries over root. latency_ms adds a sleep to every
+        os.scandir call simulating the readdir round trip of a network share
+    """
+    orig_scandir = os.scandir
+    if latency_ms > 0:
+        def slow_scandir(path="."):
+            time.sleep(latency_ms / 1000.0)
+            return orig_scandir(path)
+        os.scandir = slow_scandir
+
+    results = {}
+    try:
+        for wrk in workers:
+            walker = dwa.diskwalk({"path": root, "workers": wrk})
+            elapsed, count = _time_call(lambda: sum(1 for _ in walker.iterEntries()), repeat)
+            results["walk_workers_%d" % (wrk)] = {"seconds": elapsed, "files": count}
+    finally:
+        os.scandir = orig_scandir
+
+    return results
+
+
+def bench_gzip(src_dir, base_dir, workers=(0, 2, 4, 8), repeat=3):
+    """ times construct_gzip single threaded (tarfile w:gz) vs parallel_gzip block compression,
+        reporting MB/s of input and output size
+    """
+    walker = dwa.diskwalk(os.sep.join([src_dir, base_dir]))
+    total = sum([ent.size for ent in walker.iterEntries()])
+    results = {}
+    for wrk in workers:
+        def call():
+            tarfilename, _ = bu.construct_gzip(src_dir, base_dir, base_name="bench", workers=wrk)
+            size = os.path.getsize(tarfilename)
+            os.remove(tarfilename)
+            return size
+        elapsed, size = _time_call(call, repeat)
+        results["gzip_workers_%d" % (wrk)] = {"seconds": elapsed,
+                                               "mb_per_sec": total / elapsed / 1e6,
+                                               "ratio": total / size}
+    return results
+
+
+def read_sample(sample_dir, sample_mb=32):
+    """ concatenates files below sample_dir up to sample_mb (our data, for codec comparisons) """
+    limit = sample_mb * 1024 * 1024
+    chunks = []
+    total = 0
+    for ent in dwa.diskwalk(sample_dir).iterEntries():
+        if total >= limit:
+            break
+        with open(ent.path, "rb") as fp:
+            data = fp.read(limit - total)
+        chunks.append(data)
+        total = total + len(data)
+    return b"".join(chunks)
+
+
+def bench_codecs(data, levels=None, repeat=1):
+    """ compresses data with every available codec at low / default / high levels, reporting
+        ratio against MB/s so nightly dumps and frequent snapshots can pick a trade off
+    """
+    results = {}
+    for codec in cpa.available_codecs():
+        _, default, (low, high) = cpa.CODECS[codec]
+        for level in (levels if levels else sorted(set([low, default, high]))):
+            elapsed, out = _time_call(lambda: cpa.compress_bytes(data, codec, level), repeat)
+            results["%s_%d" % (codec, level)] = {"seconds": elapsed,
+                                                 "mb_per_sec": len(data) / elapsed / 1e6,
+                                                 "ratio": len(data) / max(1, len(out))}
+    return results
+
+
+def write_stubs(bin_dir, dump_file):
+    """ writes local rsync (copies the tree) & mysqldump (emits dump_file) stand ins into
+        bin_dir, so the subprocess paths are timed without the real tools or a database
+    """
+    os.makedirs(bin_dir, exist_ok=True)
+    stubs = {
+        "rsync": "\n".join([
+            "#!" + sys.executable,
+            "import sys, shutil",
+            "args = [itm for itm in sys.argv[1:] if not itm.startswith('-')]",
+            "shutil.copytree(args[-2], args[-1], dirs_exist_ok=True)",
+            "print('sent %d args' % (len(sys.argv)))", ""]),
+        "mysqldump": "\n".join(["#!/bin/sh", "exec cat '%s'" % (dump_file), ""]),
+    }
+    for name, body in stubs.items():
+        path = os.sep.join([bin_dir, name])
+        with open(path, "w") as fp:
+            fp.write(body)
+        os.chmod(path, 0o755)
+    return bin_dir
+
+
+def _reset_dir(path, template=None):
+    """ recreates path, empty or as a copy of template """
+    if os.path.exists(path):
+        sh.rmtree(path)
+    if template is None:
+        os.makedirs(path)
+    else:
+        sh.copytree(template, path)
+
+
+def bench_hot_paths(base_dir, depth=3, fanout=8, files=20, dump_mb=8, dumps=2, deep=32,
+                    repeat=3, workers=0):
+    """ times the backup hot paths against synthetic data built below base_dir: a wiki tree of
+        small distinct pages plus a deep (deep levels) chain, dumps of dump_mb each and a mirror
+        of the tree with every 10th page edited & every 25th missing. rsync & mysqldump are
+        local stub scripts (write_stubs) put first on PATH
+    """
+    import mysql_backup as mb
+    import vimwiki_backup as vb
+
+    wiki = os.sep.join([base_dir, "wiki"])
+    count = build_tree(wiki, depth=depth, fanout=fanout, files_per_dir=files, text=True)
+    count = count + build_tree(os.sep.join([wiki, "deep"]), depth=deep, fanout=1,
+                               files_per_dir=2, text=True)
+    dump_dir = os.sep.join([base_dir, "dumps", "dump"])
+    os.makedirs(dump_dir)
+    for i in range(dumps):
+        build_dump(os.sep.join([dump_dir, "schema_%d.sql" % (i)]), dump_mb)
+
+    mirror = os.sep.join([base_dir, "mirror"])
+    sh.copytree(wiki, mirror)
+    rel_files = sorted([os.path.relpath(itm, wiki) for itm in
+                        dwa.diskwalk(wiki).enumeratePaths()])
+    for i, rel in enumerate(rel_files):
+        if i % 25 == 0:
+            os.remove(os.sep.join([mirror, rel]))
+        elif i % 10 == 0:
+            with open(os.sep.join([mirror, rel]), "ab") as fp:
+                fp.write(b"  * edited\n")
+
+    out_dir = os.sep.join([base_dir, "out"])
+    temp = os.sep.join([base_dir, "temp"])
+    dest = os.sep.join([base_dir, "dest"])
+    os.makedirs(out_dir)
+    bin_dir = write_stubs(os.sep.join([base_dir, "bin"]),
+                          os.sep.join([dump_dir, "schema_0.sql"]))
+    orig_path = os.environ.get("PATH", "")
+    os.environ["PATH"] = os.pathsep.join([bin_dir, orig_path])
+
+    def walk():
+        return len(dwa.diskwalk(wiki).enumeratePaths())
+
+    def diff():
+        rslt = {}
+        for rel in rel_files:
+            src_dir, filename = os.path.split(os.sep.join([wiki, rel]))
+            itm = bu.calc_diff(src_dir, os.path.dirname(os.sep.join([mirror, rel])), temp,
+                               filename)
+            rslt[itm] = rslt.get(itm, 0) + 1
+        return rslt
+
+    def gzip():
+        tarfilename, _ = bu.construct_gzip(os.path.dirname(dump_dir), "dump", base_name="bench",
+                                           workers=workers, dest_dir=out_dir)
+        os.remove(tarfilename)
+
+    def zip_():
+        zipname = bu.construct_zip(base_dir, "wiki", base_name="bench", dest_dir=out_dir)
+        os.remove(zipname)
+
+    def cleanse():
+        walker = dwa.diskwalk({"path": wiki, "delete": {"filetype": ["swp"],
+                                                         "regex": [r"file_000[0-4]\.wiki$"]}})
+        return walker.cleanseDir(dryrun=True, workers=workers)["files"]
+
+    def update():
+        return vb.update_files(wiki, dest, temp, workers=workers)
+
+    def update_setup():
+        _reset_dir(temp)
+        _reset_dir(dest)
+        sh.copytree(mirror, os.sep.join([dest, "wiki"]))
+
+    def rsync():
+        return bu.apply_rsync(wiki, os.sep.join([dest, "rsync"]), "bench")
+
+    def mysqldump():
+        target = os.sep.join([out_dir, "schema.sql"])
+        mb.mysql_backup_call(["mysqldump", "schema"], target)
+        os.remove(target)
+
+    cases = [("enumerate_paths", walk, None), ("calc_diff", diff, lambda: _reset_dir(temp)),
+             ("construct_gzip", gzip, None), ("construct_zip", zip_, None),
+             ("cleanse_dir", cleanse, None), ("update_files", update, update_setup),
+             ("apply_rsync", rsync, lambda: _reset_dir(dest)),
+             ("mysql_backup_call", mysqldump, None)]
+    results = {}
+    try:
+        # progress / dryrun messages of the timed code would swamp the JSON on stdout
+        with open(os.devnull, "w") as null_ptr, contextlib.redirect_stdout(null_ptr):
+            for name, func, setup in cases:
+                elapsed, rslt = _time_call(func, repeat, setup)
+                results[name] = {"seconds": elapsed}
+                if isinstance(rslt, (int, dict)) and not isinstance(rslt, bool):
+                    results[name]["result"] = rslt
+    finally:
+        os.environ["PATH"] = orig_path
+
+    results["hot_path_files"] = count
+    results["hot_path_dump_bytes"] = dumps * dump_mb * 1024 * 1024
+    return results
+
+
+def compare_results(current, baseline, threshold=0.2):
+    """ Returns regressions: timings (entries with 'seconds') present in both result sets that
+        slowed by more than threshold (fraction), as dicts of name, baseline, current, change
+    """
+    regressions = []
+    for name, itm in sorted(current.items()):
+        prev = baseline.get(name)
+        if not (isinstance(itm, dict) and isinstance(prev, dict) and "seconds" in itm and
+                "seconds" in prev) or prev["seconds"] <= 0:
+            continue
+        change = itm["seconds"] / prev["seconds"] - 1.0
+        if change > threshold:
+            regressions.append({"name": name, "baseline": prev["seconds"],
+                                "current": itm["seconds"], "change": change})
+    return regressions
+
+
+def bench_startup(modules=("vimwiki_backup", "mysql_backup", "rsync_wrap"), repeat=5):
+    """ cold start of the cron entry points: each module is imported in a fresh interpreter
+        with -X importtime, reporting best wall time of the process and of the import alone
+        plus the slowest imported modules of the last run (self time, microseconds)
+    """
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    for mod in modules:
+        best_wall = best_import = None
+        slowest = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            call_rslt = subp.run([sys.executable, "-X", "importtime", "-c", "import " + mod],
+                                 cwd=src_dir, stdout=subp.DEVNULL, stderr=subp.PIPE, check=True)
+            elapsed = time.perf_counter() - start
+            timings = []
+            for line in call_rslt.stderr.decode("UTF-8").splitlines():
+                parts = line.split("|")
+                if len(parts) == 3 and parts[0].startswith("import time:") and\
+                        parts[1].strip().isdigit():
+                    timings.append((int(parts[0][12:]), int(parts[1]), parts[2].strip()))
+            total = [itm[1] for itm in timings if itm[2] == mod]
+            best_wall = elapsed if best_wall is None or elapsed < best_wall else best_wall
+            if total and (best_import is None or total[0] < best_import):
+                best_import = total[0]
+            slowest = sorted(timings, reverse=True)[:5]
+        results["startup_" + mod] = {"seconds": best_wall,
+                                     "import_seconds": (best_import or 0) / 1e6,
+                                     "slowest": [[itm[2], itm[0]] for itm in slowest]}
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark harness for backup utilities"
+    )
+
+    parser.add_argument("-b", "--baseline", default=None, type=str,
+                        help="previous JSON results, slower timings are flagged (exit status 1)")
+    parser.add_argument("-c", "--codec_sample", default=None, type=str,
+                        help="directory sampled for codec ratio / throughput comparison")
+    parser.add_argument("-d", "--depth", default=3, type=int, help="synthetic tree depth")
+    parser.add_argument("-f", "--fanout", default=8, type=int,
+                        help="subdirectories per directory")
+    parser.add_argument("-g", "--gzip_mb", default=0, type=int,
+                        help="size (MB) of synthetic dump for the gzip benchmark (0 skips)")
+    parser.add_argument("-l", "--latency_ms", default=0.0, type=float,
+                        help="simulated per directory scan latency (network share)")
+    parser.add_argument("-n", "--files", default=20, type=int, help="files per directory")
+    parser.add_argument("-o", "--output", default=None, type=str, help="write JSON results")
+    parser.add_argument("-p", "--hot_paths", default=0, type=int,
+                        help="size (MB) of each dump for the hot path suite (0 skips)")
+    parser.add_argument("-r", "--repeat", default=3, type=int)
+    parser.add_argument("-s", "--startup", default=0, type=int,
+                        help="cold start runs per entry point (-X importtime, 0 skips)")
+    parser.add_argument("-t", "--threshold", default=0.2, type=float,
+                        help="slow down (fraction) against baseline flagged as regression")
+    parser.add_argument("-w", "--workers", default="0,4,8,16", type=str,
+                        help="comma separated worker counts for parallel walk")
+
+    args = parser.parse_args()
+
+    base_dir = tempfile.mkdtemp(prefix="backup_bench_")
+    try:
+        tree = os.sep.join([base_dir, "tree"])
+        file_count = build_tree(tree, depth=args.depth, fanout=args.fanout,
+                                files_per_dir=args.files)
+        rslt = {"files": file_count,
+                "meta": {"python": sys.version.split()[0], "host": os.uname().nodename,
+                         "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "args": vars(args)}}
+        rslt.update(bench_walk(tree, [int(itm) for itm in args.workers.split(",")],
+                               latency_ms=args.latency_ms, repeat=args.repeat))
+        if args.gzip_mb > 0:
+            os.mkdir(os.sep.join([base_dir, "dump"]))
+            build_dump(os.sep.join([base_dir, "dump", "positions.sql"]), args.gzip_mb)
+            rslt.update(bench_gzip(base_dir, "dump", [int(itm) for itm in args.workers.split(",")],
+                                   repeat=args.repeat))
+        if args.startup > 0:
+            rslt.update(bench_startup(repeat=args.startup))
+        if args.hot_paths > 0:
+            hot_dir = os.sep.join([base_dir, "hot"])
+            os.mkdir(hot_dir)
+            rslt.update(bench_hot_paths(hot_dir, depth=args.depth, fanout=args.fanout,
+                                        files=args.files, dump_mb=args.hot_paths,
+                                        repeat=args.repeat,
+                                        workers=int(args.workers.split(",")[0])))
+        if args.codec_sample:
+            rslt.update(bench_codecs(read_sample(args.codec_sample), repeat=args.repeat))
+    finally:
+        sh.rmtree(base_dir)
+
+    print(json.dumps(rslt, indent=4))
+    if args.output:
+        with open(args.output, "w") as fp:
+            json.dump(rslt, fp, indent=4)
+    if args.baseline:
+        with open(args.baseline, "r") as fp:
+            regressions = compare_results(rslt, json.load(fp), args.threshold)
+        for itm in regressions:
+            print("REGRESSION %s: %.4fs -> %.4fs (%+.0f%%)" % (
+                itm["name"], itm["baseline"], itm["current"], itm["change"] * 100),
+                  file=sys.stderr)
+        if regressions:
+            sys.exit(1)
@@ -1,12 +1,15 @@
 #!/usr/bin/python3
-""" Python libray supporting backup utilities applied across newton & feynman"""
-import subprocess as subp
+""" Python libray supporting backup utilities applied across newton & feynman
+Heavy modules (subprocess, shutil, tarfile, zipfile, compression, hashing) are imported inside
+the functions using them, keeping start up of the cron driven entry points short.
+"""
 import os
 import sys
-import shutil as sh
-import datetime as dt
+import stat
+import time
 import tarfile
-import zipfile as zp
+import datetime as dt
+import functools
 import debug_control as dbc
 import diskwalk_api as dwa
 
@@ -34,67 +37,132 @@ def calc_filename(name, split='.', include_time=False, dbg=False):
     return res
 
 def calc_hostname(dbg=False):
-    """" Calculates linux hostname"""
-    rsync_list = ["cat", "/proc/sys/kernel/hostname"]
+    """" Calculates linux hostname, read in-process from /proc/sys/kernel/hostname falling back
+    on uname
+    """
     hostname = None
 
-    call_rslt = subp.run(rsync_list, stdout=subp.PIPE, stderr=subp.PIPE)
-    if call_rslt.returncode != 0:
-        dbc.error_helper("Hostname", call_rslt.stderr, post=None, dbg=dbg)
+    try:
+        with open("/proc/sys/kernel/hostname", "r") as file_ptr:
+            hostname = file_ptr.read().replace("\n", "")
+    except OSError:
+        hostname = os.uname().nodename if hasattr(os, "uname") else None
+
+    if not hostname:
+        dbc.error_helper("Hostname", b"unable to determine hostname", post=None, dbg=dbg)
+        hostname = None
     else:
-        hostname = call_rslt.stdout.decode("UTF-8").replace("\n", "")
         dbc.print_helper(("Hostname " + hostname), dbg=dbg)
 
     return hostname
 
 
-def calc_diff(src, dest, temp, filename, inc_backup=None, dbg=False):
-    """Calls UNIX diff function comparing files """
+def compare_files(src_str, dest_str, quick=False, chunk_size=1024 * 1024):
+    """ In-process comparison, returns True when files are identical. Different sizes differ;
+        with quick equal size & mtime count as identical (rsync style, unsafe on filesystems with
+        coarse timestamps), otherwise contents are compared chunk by chunk stopping at the first
+        difference
+    """
+    src_st = os.stat(src_str)
+    dest_st = os.stat(dest_str)
+    dbc.span_add(nbytes=src_st.st_size)
+    if src_st.st_size != dest_st.st_size:
+        return False
+    if quick and src_st.st_mtime_ns == dest_st.st_mtime_ns:
+        return True
+
+    with open(src_str, "rb") as src_ptr, open(dest_str, "rb") as dest_ptr:
+        while True:
+            src_chunk = src_ptr.read(chunk_size)
+            if src_chunk != dest_ptr.read(chunk_size):
+                return False
+            if not src_chunk:
+                return True
+
+def write_unified_diff(src_str, dest_str, diff_str):
+    """ writes unified diff (difflib) of src against dest to diff_str, binary files get the
+        one line diff style notice
+    """
+    import difflib
+
+    with open(src_str, "rb") as src_ptr, open(dest_str, "rb") as dest_ptr:
+        src_bytes = src_ptr.read()
+        dest_bytes = dest_ptr.read()
+
+    with open(diff_str, "w", encoding="utf-8") as file_ptr:
+        if b"\0" in src_bytes[:8192] or b"\0" in dest_bytes[:8192]:
+            file_ptr.write("Binary files %s and %s differ%s" % (src_str, dest_str, os.linesep))
+        else:
+            file_ptr.writelines(difflib.unified_diff(
+                src_bytes.decode("UTF-8", errors="replace").splitlines(keepends=True),
+                dest_bytes.decode("UTF-8", errors="replace").splitlines(keepends=True),
+                fromfile=src_str, tofile=dest_str))
+
+@dbc.span("calc_diff")
+def calc_diff(src, dest, temp, filename, inc_backup=None, quick=False, dbg=False):
+    """ Compares src & dest copies of filename in-process (compare_files); only files that
+        differ get a unified diff written to temp (and, if in inc_backup, a timed copy).
+        inc_backup may be passed as a set / frozenset to avoid a conversion per call.
+        RETURNS :: "identical", "diff" or "error"
+    """
+    import shutil as sh
+
     src_str = os.sep.join([src, filename])
+    dbc.span_add(files=1, path=src_str)
     dest_str = os.sep.join([dest, filename])
-    if inc_backup is not None:
+    if inc_backup is not None and not isinstance(inc_backup, (set, frozenset)):
         inc_backup = set(inc_backup)
 
     val = str(filename).split(".")
 
     try:
         diff_str = "".join([temp, os.sep, val[0], ".diff"])
-        diff_list = ["/usr/bin/diff", "-s", src_str, dest_str]
 
-        call_rslt = subp.run(diff_list, stdout=subp.PIPE, stderr=subp.PIPE)
-        init_rslt = call_rslt.stdout.decode("UTF-8")
-        # print(str(call_rslt.returncode) + os.linesep + init_rslt)
-        if call_rslt.returncode == 0 and init_rslt.endswith("identical" + os.linesep):
+        if compare_files(src_str, dest_str, quick=quick):
             base_str = "Excluding Identical File: " + filename
             dbc.print_helper(base_str, dbg=dbg)
-        elif call_rslt.returncode == 1 and init_rslt is not None and\
-                not init_rslt.endswith("identical" + os.linesep):
-            file_ptr = open(diff_str, "w")
-            file_ptr.write(init_rslt)
-            file_ptr.close()
-
-            if inc_backup is not None and filename in inc_backup:
-                temp_filename = calc_filename(os.sep.join([temp, filename]), include_time=True,
-                                              dbg=dbg)
-                sh.copy(src_str, temp_filename)
-
-            base_str = " ".join(["Diff", diff_str, "success"])
-            dbc.print_helper(base_str, dbg=dbg)
-        else:
-            dbc.error_helper("Diff Error:", call_rslt.stderr, filename, dbg=dbg)
+            return "identical"
+
+        write_unified_diff(src_str, dest_str, diff_str)
+
+        if inc_backup is not None and filename in inc_backup:
+            temp_filename = calc_filename(os.sep.join([temp, filename]), include_time=True,
+                                          dbg=dbg)
+            sh.copy(src_str, temp_filename)
+
+        base_str = " ".join(["Diff", diff_str, "success"])
+        dbc.print_helper(base_str, dbg=dbg)
+        return "diff"
+    except OSError as err:
+        dbc.error_helper("Diff Error: " + str(err.strerror), stderr=None, post=filename,
+                         dbg=dbg)
     except:
         dbc.error_helper("Diff Exception: ", stderr=None, post=filename, dbg=dbg)
 
+    return "error"
 
+
+@dbc.span("construct_gzip")
 def construct_gzip(src_dir, base_dir, base_name="MySQL_backup_",
-                   excluded_ending=None, dbg=False):
+                   excluded_ending=None, workers=0, codec="gzip", level=None, dest_dir=None,
+                   dbg=False):
     """ constructs tar.gz file based in src dir
     excluded_ending is None removes items [".swo", ".swp", ".pyc", ".o", ".gz"], for all pass in []
+    codec gzip (default, level 9 as tarfile), bz2, xz or zstd (see compress_api.CODECS) sets the
+    compression and archive extension; workers > 1 compresses gzip blocks on that many threads
+    (compress_api.parallel_gzip)
+    The archive streams into a temp file in dest_dir (default src_dir) that is fsync'ed and
+    atomically renamed on success, nothing is left behind on failure (returns None)
     """
+    import compress_api as cpa
+
     dt_str, time_str = calc_date_time()
     base_name = "_".join([base_name, dt_str, time_str])
     tarfilename = None
     excluded = []
+    out_ptr = None
+
+    extension = cpa.tar_extension(codec)
 
     if excluded_ending is None:
         excluded_final = set([".swo", ".swp", ".pyc", ".o", ".gz"])
@@ -102,10 +170,14 @@ def construct_gzip(src_dir, base_dir, base_name="MySQL_backup_",
         excluded_final = set(excluded_ending)
 
     try:
-        tarfilename = "".join([src_dir, os.sep, base_name, ".tar.gz"])
-        with tarfile.open(tarfilename, "w:gz") as tar:
+        tarfilename = "".join([dest_dir or src_dir, os.sep, base_name, extension])
+        dbc.span_add(path=tarfilename)
+        out_ptr = cpa.atomic_file(tarfilename)
+        with cpa.open_compressed(out_ptr.file, codec, level, workers=workers) as comp_ptr,\
+                tarfile.open(fileobj=comp_ptr, mode="w|") as tar:
             dw = dwa.diskwalk(os.sep.join([src_dir, base_dir]))
-            for itm in dw.enumeratePaths():
+            for ent in dw.iterEntries():
+                itm = ent.path
                 _, init_splt = os.path.splitext(itm)
 
                 # print(filename + " " + str(init_splt) + " " + str(not_empty) + " " + cur_dir)
@@ -116,23 +188,37 @@ def construct_gzip(src_dir, base_dir, base_name="MySQL_backup_",
                 else:
                     itm_loc = str(itm).find(base_dir)
                     base_str = "--".join(["adding", itm[itm_loc:]])
-                    tar.add(itm[itm_loc:])
+                    _tar_add_entry(tar, ent, itm[itm_loc:])
+                    dbc.span_add(files=1, nbytes=ent.size)
 
-            tar.close()
+        out_ptr.commit()
     except:
-        tar.close()
+        if out_ptr is not None:
+            out_ptr.abort()
+        dbc.error_helper(("Error: Tar " + str(sys.exc_info()[0])), stderr=None, post=tarfilename,
+                         dbg=dbg)
+        tarfilename = None
 
     return tarfilename, excluded
 
+@dbc.span("construct_zip")
 def construct_zip(src_dir, base_dir, base_name="vimwiki_diff_backup", excluded_ending=None,
-                  dbg=False):
+                  codec=None, level=None, dest_dir=None, dbg=False):
     """ Construct zip file
     excluded_ending is None removes items line [".swo", ".swp", ".pyc", ".o", ".gz"],
         for all pass in []
+    codec None stores uncompressed (default), otherwise see compress_api.calc_zip_compression
+    The zip streams into a temp file in dest_dir (default src_dir) that is fsync'ed and
+    atomically renamed on success, nothing is left behind on failure (returns None)
     """
+    import zipfile as zp
+    import compress_api as cpa
+
     dt_str, time_str = calc_date_time()
     base_name = "_".join([base_name, dt_str, time_str])
     zipname = None
+    out_ptr = None
+    compression, compresslevel = cpa.calc_zip_compression(codec, level)
 
     if excluded_ending is None:
         excluded_final = set([".swo", ".swp", ".pyc", ".o", ".gz"])
@@ -141,11 +227,15 @@ def construct_zip(src_dir, base_dir, base_name="vimwiki_diff_backup", excluded_e
 
 
     try:
-        zipname = "".join([src_dir, os.sep, base_name, ".zip"])
+        zipname = "".join([dest_dir or src_dir, os.sep, base_name, ".zip"])
+        dbc.span_add(path=zipname)
         zip_count = 0
-        with zp.ZipFile(zipname, mode='w') as zp_ptr:
+        out_ptr = cpa.atomic_file(zipname)
+        with zp.ZipFile(out_ptr.file, mode='w', compression=compression,
+                        compresslevel=compresslevel, strict_timestamps=False) as zp_ptr:
             dw = dwa.diskwalk(os.sep.join([src_dir, base_dir]))
-            for itm in dw.enumeratePaths():
+            for ent in dw.iterEntries():
+                itm = ent.path
                 _, init_splt = os.path.splitext(itm)
 
                 # print(filename + " " + str(init_splt) + " " + str(not_empty) + " " + cur_dir)
@@ -155,36 +245,279 @@ def construct_zip(src_dir, base_dir, base_name="vimwiki_diff_backup", excluded_e
                 else:
                     itm_loc = str(itm).find(base_dir)
                     base_str = "--".join(["adding", itm[itm_loc:]])
-                    zp_ptr.write(itm[itm_loc:])
+                    _zip_add_entry(zp_ptr, ent, itm[itm_loc:])
+                    dbc.span_add(files=1, nbytes=ent.size)
                     if not itm.endswith(base_dir):
                         zip_count = zip_count + 1
 
-            zp_ptr.close()
-
-            if zip_count < 2:
-                dbc.print_helper("Warning construct_zip -- likely empty zip", dbg=dbg)
+        out_ptr.commit()
+        if zip_count < 2:
+            dbc.print_helper("Warning construct_zip -- likely empty zip", dbg=dbg)
     except OSError as err:
-        if zp_ptr is not None:
-            zp_ptr.close()
-        dbc.error_helper(("OSError: Zip" + err.strerror), stderr=None, post=zipname, dbg=dbg)
+        if out_ptr is not None:
+            out_ptr.abort()
+        dbc.error_helper(("OSError: Zip" + str(err.strerror)), stderr=None, post=zipname,
+                         dbg=dbg)
+        zipname = None
     except:
-        if zp_ptr is not None:
-            zp_ptr.close()
+        if out_ptr is not None:
+            out_ptr.abort()
         dbc.error_helper(("Error: Zip"  + str(sys.exc_info()[0])), stderr=None, post=None, dbg=dbg)
+        zipname = None
 
     return zipname
 
+def _load_manifest(path):
+    """ reads incremental archive manifest (JSON) """
+    import json
+    with open(path, "r", encoding="utf-8") as file_ptr:
+        return json.load(file_ptr)
+
+def _calc_chain_head(dest_dir, base_name):
+    """ path of the pointer file naming the newest manifest of a chain """
+    return os.sep.join([dest_dir, "".join([".", base_name.rstrip("_"), ".chain_head"])])
+
+@dbc.span("construct_incremental")
+def construct_incremental(src_dir, base_dir, dest_dir, base_name="MySQL_backup_", full_every=7,
+                          excluded_ending=None, workers=0, codec="gzip", level=None, cache=None,
+                          dbg=False):
+    """ Incremental / differential tar archive of src_dir/base_dir written into dest_dir.
+    Each archive gets a manifest (<archive>.manifest.json) listing path (relative to base_dir, so
+    the dated directory name does not matter), size, mtime & BLAKE2 hash of every file, the
+    directories holding them plus tombstone lists of deleted files & directories. A full archive
+    is written when no chain exists or every full_every runs, otherwise only new / changed files
+    (size or mtime differ and the hash too, or the file could not be hashed) go into the
+    archive. cache is an optional diskhash sqlite cache.
+    RETURNS :: archive path, manifest path (None, None on failure)
+    """
+    import json
+    import compress_api as cpa
+    import diskhash_api as dha
+
+    dt_str, time_str = calc_date_time(include_sec=True)
+    root = os.sep.join([src_dir, base_dir])
+    head_path = _calc_chain_head(dest_dir, base_name)
+    parent = None
+    if os.path.exists(head_path):
+        with open(head_path, "r", encoding="utf-8") as file_ptr:
+            parent_name = file_ptr.read().strip()
+        if os.path.exists(os.sep.join([dest_dir, parent_name])):
+            parent = _load_manifest(os.sep.join([dest_dir, parent_name]))
+            parent["name"] = parent_name
+
+    full = parent is None or parent["chain"] + 1 >= full_every
+    prev_files = {} if parent is None else parent["files"]
+    prev_dirs = [] if parent is None else parent.get("dirs", [])
+    kind = "full" if full else "incr"
+    archive_name = "".join(["_".join([base_name, dt_str, time_str, kind]),
+                            cpa.tar_extension(codec)])
+    archive = os.sep.join([dest_dir, archive_name])
+    manifest = {"archive": archive_name, "type": kind, "created": time.time(),
+                "parent": None if full else parent["name"],
+                "chain": 0 if full else parent["chain"] + 1, "files": {}, "dirs": [],
+                "deleted": [], "deleted_dirs": []}
+
+    if excluded_ending is None:
+        excluded_final = set([".swo", ".swp", ".pyc", ".o", ".gz"])
+    else:
+        excluded_final = set(excluded_ending)
+
+    out_ptr = None
+    added = 0
+    try:
+        out_ptr = cpa.atomic_file(archive)
+        with dha.diskhash(cache, workers=max(1, workers), dbg=dbc.test_dbg(dbg)) as hasher,\
+                cpa.open_compressed(out_ptr.file, codec, level, workers=workers) as comp_ptr,\
+                tarfile.open(fileobj=comp_ptr, mode="w|") as tar:
+            for ent in dwa.diskwalk(root).iterEntries():
+                _, init_splt = os.path.splitext(ent.path)
+                if init_splt != '' and init_splt in excluded_final:
+                    continue
+                rel = os.path.relpath(ent.path, root).replace(os.sep, "/")
+                prev = prev_files.get(rel)
+                if prev is not None and prev[0] == ent.size and prev[1] == ent.mtime and\
+                        prev[2] is not None:
+                    digest = prev[2]
+                else:
+                    digest = hasher.hashFile(ent)
+                manifest["files"][rel] = [ent.size, ent.mtime, digest]
+
+                # a hash error (None) can not prove the file unchanged
+                if full or prev is None or digest is None or prev[2] != digest:
+                    dbc.print_helper("--".join(["adding", rel]), dbg=dbg)
+                    _tar_add_entry(tar, ent, rel)
+                    dbc.span_add(files=1, nbytes=ent.size)
+                    added = added + 1
+
+        dirs = set()
+        for itm in manifest["files"]:
+            while "/" in itm:
+                itm = itm.rsplit("/", 1)[0]
+                dirs.add(itm)
+        manifest["dirs"] = sorted(dirs)
+        manifest["deleted"] = sorted([itm for itm in prev_files if itm not in manifest["files"]])
+        manifest["deleted_dirs"] = sorted([itm for itm in prev_dirs if itm not in dirs])
+        out_ptr.commit()
+        manifest_path = archive + ".manifest.json"
+        with cpa.atomic_file(manifest_path) as man_ptr:
+            man_ptr.file.write(json.dumps(manifest, separators=(",", ":")).encode("utf-8"))
+        with cpa.atomic_file(head_path) as head_ptr:
+            head_ptr.file.write((archive_name + ".manifest.json").encode("utf-8"))
+    except:
+        if out_ptr is not None:
+            out_ptr.abort()
+        dbc.error_helper(("Error: Incremental " + str(sys.exc_info()[0])), stderr=None,
+                         post=archive, dbg=dbg)
+        return None, None
+
+    dbc.print_helper("%s archive %s: %d of %d files, %d deleted, %d directories deleted" % (
+        kind, archive_name, added, len(manifest["files"]), len(manifest["deleted"]),
+        len(manifest["deleted_dirs"])), dbg=dbg)
+    return archive, manifest_path
+
+def restore_incremental(manifest_path, target_dir, dbg=False):
+    """ Restores the state recorded by manifest_path into target_dir by replaying its chain: the
+    base full archive, then each incremental in order, applying tombstones after each
+    (files first, then directories with whatever is left in them)
+    RETURNS :: list of archives applied
+    """
+    import shutil as sh
+    import compress_api as cpa
+
+    dest_dir = os.path.dirname(manifest_path)
+    chain = [_load_manifest(manifest_path)]
+    while chain[-1]["parent"] is not None:
+        chain.append(_load_manifest(os.sep.join([dest_dir, chain[-1]["parent"]])))
+
+    applied = []
+    for manifest in reversed(chain):
+        archive = os.sep.join([dest_dir, manifest["archive"]])
+        # tarfile's own "r:*" cannot read zstd, decompression goes through compress_api
+        with cpa.open_decompressed(archive) as comp_ptr,\
+                tarfile.open(fileobj=comp_ptr, mode="r|") as tar:
+            if hasattr(tarfile, "data_filter"):
+                tar.extractall(target_dir, filter="data")
+            else:
+                tar.extractall(target_dir)
+        for itm in manifest["deleted"]:
+            path = os.sep.join([target_dir, itm.replace("/", os.sep)])
+            if os.path.lexists(path):
+                os.remove(path)
+        for itm in reversed(manifest.get("deleted_dirs", [])):
+            path = os.sep.join([target_dir, itm.replace("/", os.sep)])
+            if os.path.islink(path):
+                os.remove(path)
+            elif os.path.isdir(path):
+                sh.rmtree(path)
+        applied.append(archive)
+        dbc.print_helper("Restored " + archive, dbg=dbg)
+
+    return applied
+
+@dbc.span("construct_repository")
+def construct_repository(src_dir, base_dir, repo_dir, base_name="MySQL_backup_",
+                         excluded_ending=None, workers=0, codec="gzip", level=None, dbg=False):
+    """ Stores src_dir/base_dir as a snapshot in the content addressed repository repo_dir
+    (created on first use with codec / level), only chunks not already stored are compressed
+    and written, see repository_api.backup_repository
+    RETURNS :: snapshot index path (None on failure)
+    """
+    import repository_api as rpa
+
+    dt_str, time_str = calc_date_time(include_sec=True)
+    if excluded_ending is None:
+        excluded_ending = [".swo", ".swp", ".pyc", ".o", ".gz"]
+
+    snapshot = None
+    try:
+        repo = rpa.backup_repository(repo_dir, codec=codec, level=level, workers=workers,
+                                     dbg=dbc.test_dbg(dbg))
+        snapshot, stats = repo.backup(os.sep.join([src_dir, base_dir]),
+                                      "_".join([base_name.rstrip("_"), dt_str, time_str]),
+                                      excluded_ending=excluded_ending)
+        dbc.span_add(files=stats["files"], nbytes=stats["bytes"])
+        dbc.print_helper("Repository %s: %d files, %d bytes, %d new chunks, %d bytes written" % (
+            repo_dir, stats["files"], stats["bytes"], stats["new_chunks"], stats["new_bytes"]),
+                         dbg=dbg)
+    except:
+        dbc.error_helper(("Error: Repository " + str(sys.exc_info()[0])), stderr=None,
+                         post=repo_dir, dbg=dbg)
+        snapshot = None
+
+    return snapshot
+
+@functools.lru_cache(maxsize=None)
+def _calc_owner_names(uid, gid):
+    """ cached (uname, gname) lookup for tar headers """
+    uname = gname = ""
+    try:
+        import pwd
+        import grp
+    except ImportError:
+        return uname, gname
+    try:
+        uname = pwd.getpwuid(uid)[0]
+    except KeyError:
+        pass
+    try:
+        gname = grp.getgrgid(gid)[0]
+    except KeyError:
+        pass
+    return uname, gname
+
+def _tar_add_entry(tar, ent, arcname):
+    """ adds diskentry to tar reusing metadata captured during the walk (no second stat);
+        anything other than a regular file falls back to tar.add
+    """
+
+    arcname = arcname.replace(os.sep, "/")
+    if not ent.is_file():
+        tar.add(ent.path, arcname=arcname, recursive=False)
+        return
+
+    info = tarfile.TarInfo(arcname)
+    info.size = ent.size
+    info.mtime = ent.mtime
+    info.mode = stat.S_IMODE(ent.mode)
+    info.uid = ent.uid
+    info.gid = ent.gid
+    info.uname, info.gname = _calc_owner_names(ent.uid, ent.gid)
+    with open(ent.path, "rb") as file_ptr:
+        tar.addfile(info, file_ptr)
+
+def _zip_add_entry(zp_ptr, ent, arcname):
+    """ adds diskentry to zip reusing metadata captured during the walk (no second stat);
+        anything other than a regular file, or an archive with an explicit compression level
+        (only ZipFile.write / writestr take one), goes through ZipFile.write
+    """
+    import shutil as sh
+    import zipfile as zp
+
+    if not ent.is_file() or zp_ptr.compresslevel is not None:
+        zp_ptr.write(ent.path, arcname, compresslevel=zp_ptr.compresslevel)
+        return
+
+    date_time = time.localtime(ent.mtime)[:6]
+    if date_time[0] < 1980:
+        date_time = (1980, 1, 1, 0, 0, 0)
+    zinfo = zp.ZipInfo(arcname.replace(os.sep, "/"), date_time)
+    zinfo.external_attr = (ent.mode & 0xFFFF) << 16
+    zinfo.file_size = ent.size
+    zinfo.compress_type = zp_ptr.compression
+    with open(ent.path, "rb") as src, zp_ptr.open(zinfo, mode="w") as dest:
+        sh.copyfileobj(src, dest, 1024 * 1024)
+
 def calc_date_time(join_char="", include_sec=False):
-    """ Calculates Date & Time strings from datetime.now()"""
-    dtn = dt.datetime.now()
+    """ Calculates Date & Time strings from the local time (hour is not zero padded)"""
+    now = time.localtime()
 
-    month = str(dtn.month) if dtn.month > 9 else "0" + str(dtn.month)
-    day = str(dtn.day) if dtn.day > 9 else "0" + str(dtn.day)
-    hour = str(dtn.hour)
-    mins = str(dtn.minute) if dtn.minute > 9 else "0" + str(dtn.minute)
-    sec = str(dtn.second) if dtn.second > 9 else "0" + str(dtn.second)
+    month = "%02d" % (now.tm_mon)
+    day = "%02d" % (now.tm_mday)
+    hour = str(now.tm_hour)
+    mins = "%02d" % (now.tm_min)
+    sec = "%02d" % (now.tm_sec)
 
-    dt_str = join_char.join([str(dtn.year), month, day])
+    dt_str = join_char.join([str(now.tm_year), month, day])
     if include_sec:
         time_str = join_char.join([hour, mins, sec])
     else:
@@ -217,6 +550,27 @@ def append_date_file(filename, search_str="----", append_time=True, include_seco
 
     return filename_final
 
+def calc_debug_file(args_dict, search_str="----"):
+    """ Returns args_dict["debug_file"] with its date template expanded (append_date_file). When
+    retention is requested (log_keep / log_keep_days) and no log_sweep given, log_sweep is set to
+    the earlier logs of the same template -- the template's literal text around a date stamp
+    (plus their rotated segments), nothing else in the directory
+    """
+    import glob
+
+    filename = args_dict["debug_file"]
+    if search_str in filename and "log_sweep" not in args_dict.keys() and\
+            ("log_keep" in args_dict.keys() or "log_keep_days" in args_dict.keys()):
+        parts = [glob.escape(itm) for itm in filename.split(search_str)]
+        patterns = []
+        # append_date_file stamps YYYYmmdd_HMM, the hour is not zero padded
+        for hour in ("[0-9]", "[0-9][0-9]"):
+            stamp = "[0-9]" * 8 + "_" + hour + "[0-9][0-9]"
+            patterns.append(stamp.join(parts))
+            patterns.append(stamp.join(parts) + ".[0-9]*")
+        args_dict["log_sweep"] = patterns
+    return append_date_file(filename, search_str)
+
 def calc_directory(init_dir, dbg=False):
     """ Returns calculated directory structure and date as str"""
     dt_str, _ = calc_date_time()
@@ -226,12 +580,27 @@ def calc_directory(init_dir, dbg=False):
     return dt_final, dt_str
 
 def calc_debug_levels(args_dict):
-    """ Calculates debug controls common to backup utilities
+    """ Calculates debug controls common to backup utilities, the debug file is written by a
+        background thread unless buffered_log is false; log_format "json" writes structured
+        records tagged with the hostname. Rotation / retention come from log_max_bytes,
+        log_max_age (seconds), log_keep, log_keep_days & log_sweep (glob(s) of sibling logs, see
+        calc_debug_file), see debug_control; log_keep_days alone prunes by age only
         RETURNS :: dbg, print_dbg
     """
     print_dbg = True
     if "debug_file" in args_dict.keys() and args_dict["debug_file"] is not None:
-        dbg = dbc.debug_control(args_dict["debug_file"], debug_level=1)
+        buffered = args_dict["buffered_log"] if "buffered_log" in args_dict.keys() else True
+        log_format = args_dict["log_format"] if "log_format" in args_dict.keys() and\
+            args_dict["log_format"] else "text"
+        host = calc_hostname() if log_format == "json" else None
+        rotation = {}
+        for key in ("max_bytes", "max_age", "keep", "keep_days", "sweep"):
+            if "log_" + key in args_dict.keys():
+                rotation[key] = args_dict["log_" + key]
+        if "keep_days" in rotation and "keep" not in rotation:
+            rotation["keep"] = None
+        dbg = dbc.debug_control(args_dict["debug_file"], debug_level=1, buffered=buffered,
+                                log_format=log_format, host=host, **rotation)
     else:
         dbg = args_dict["verbose"] > 0
         print_dbg = args_dict["verbose"] > 0
@@ -269,38 +638,96 @@ def calc_single_period_advance(curr_month=13, curr_year=9999, deltatype=1, dbg=F
 
     return delta
 
-def apply_rsync(init_base_dir, init_rslt_dir, itm, dbg=False):
+@dbc.span("apply_rsync")
+def apply_rsync(init_base_dir, init_rslt_dir, itm, link_dest=None, dbg=False):
     """ copies files from src (init_base_dir) to dest (init_rslt_dir)
+    link_dest (rsync --link-dest) hardlinks files unchanged relative to that directory
+    rsync output is streamed into the debug log while rsync runs (debug_control.stream_process)
+    RETURNS :: True on success
     """
-    print_dbg = dbc.test_dbg(dbg)
-
     rsync_list = [
         "rsync",
         "-vuogptr",
         "--info=SKIP,STATS",
         "--exclude=.*.sw[op] --exclude=*.pyc",
-        (init_base_dir + os.sep),
-        init_rslt_dir,
     ]
+    if link_dest is not None:
+        rsync_list.append("=".join(["--link-dest", os.path.abspath(link_dest)]))
+    rsync_list.extend([(init_base_dir + os.sep), init_rslt_dir])
     base_str = "".join(["RSYNC: ", itm, "--", " ".join(rsync_list), os.linesep])
     dbc.print_helper(base_str, dbg)
 
-    call_rslt = subp.run(rsync_list, stdout=subp.PIPE, stderr=subp.PIPE)
-    if call_rslt.returncode != 0:
-        dbc.error_helper("RSYNC Error:", call_rslt.stderr, post=itm, dbg=dbg)
-    else:
-        if print_dbg:
-            if isinstance(dbg, bool):
-                base_time_str = dt.datetime.now()
-                print(
-                    "".join(
-                        [
-                            call_rslt.stdout.decode("UTF-8"),
-                            os.linesep,
-                            base_time_str.strftime("%Y/%m/%d %H:%M:%S"),
-                        ]
-                    )
-                )
+    returncode, err = dbc.stream_process(rsync_list, itm, dbg=dbg)
+    if returncode != 0:
+        dbc.error_helper("RSYNC Error:", err, post=itm, dbg=dbg)
 
-            else:
-                dbg.write_stdout(itm, call_rslt.stdout)
+    return returncode == 0
+
+def _calc_snapshot_key(name):
+    """ sort key of snapshot directory name <YYYYMMDD>_<HMMSS> (hour is not zero padded) or
+        None when name is not a snapshot
+    """
+    parts = name.split("_")
+    if len(parts) != 2 or not (parts[0].isdigit() and parts[1].isdigit()) or len(parts[0]) != 8:
+        return None
+    return parts[0], int(parts[1])
+
+def list_snapshots(snapshot_root):
+    """ Returns completed snapshot directories of snapshot_root, oldest first (in progress
+        .partial directories are skipped)
+    """
+    if not os.path.isdir(snapshot_root):
+        return []
+    names = [itm.name for itm in os.scandir(snapshot_root)
+             if itm.is_dir(follow_symlinks=False) and _calc_snapshot_key(itm.name) is not None]
+    return [os.sep.join([snapshot_root, itm]) for itm in sorted(names, key=_calc_snapshot_key)]
+
+def apply_rsync_snapshot(init_base_dir, snapshot_root, itm, dbg=False):
+    """ point in time copy of init_base_dir into snapshot_root/<YYYYMMDD>_<HMMSS>; files
+    unchanged since the previous snapshot are hardlinked to it (rsync --link-dest), so only
+    changed files cost space & copy time. rsync writes into <name>.partial, renamed once it
+    succeeds; a .partial left by a failed run is reused so rsync resumes it
+    RETURNS :: snapshot directory (None on failure)
+    """
+    dt_str, time_str = calc_date_time(include_sec=True)
+    name = "_".join([dt_str, time_str])
+    final = os.sep.join([snapshot_root, name])
+    partial = final + ".partial"
+    os.makedirs(snapshot_root, exist_ok=True)
+
+    stale = sorted([itm_p.path for itm_p in os.scandir(snapshot_root)
+                    if itm_p.name.endswith(".partial") and itm_p.is_dir(follow_symlinks=False)])
+    if stale and stale[-1] != partial:
+        os.rename(stale[-1], partial)
+    previous = list_snapshots(snapshot_root)
+    link_dest = previous[-1] if previous else None
+
+    if not apply_rsync(init_base_dir, partial, itm, link_dest=link_dest, dbg=dbg):
+        return None
+    os.rename(partial, final)
+    dbc.print_helper(("Snapshot " + final + (" linked to " + link_dest if link_dest else "")),
+                     dbg=dbg)
+    return final
+
+def prune_snapshots(snapshot_root, keep=7, keep_days=None, dryrun=False, dbg=False):
+    """ removes the oldest snapshots keeping the newest keep (and, with keep_days, any younger
+    than keep_days); the newest snapshot is never removed. Hardlinked files stay available to
+    the snapshots still referencing them
+    RETURNS :: list of removed snapshot directories
+    """
+    import shutil as sh
+
+    snapshots = list_snapshots(snapshot_root)
+    cutoff = None
+    if keep_days is not None:
+        cutoff = (dt.datetime.now() - dt.timedelta(days=keep_days)).strftime("%Y%m%d")
+
+    removed = []
+    for snap in snapshots[:-max(1, keep)]:
+        if cutoff is not None and _calc_snapshot_key(os.path.basename(snap))[0] >= cutoff:
+            continue
+        dbc.print_helper(("Pruning " + snap), dbg=dbg)
+        if not dryrun:
+            sh.rmtree(snap)
+        removed.append(snap)
+    return removed
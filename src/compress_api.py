@@ -0,0 +1,296 @@
+#!/usr/bin/python3
+""" Compression helpers for the backup archives """
+import os
+import bz2
+import gzip
+import lzma
+import time
+import zlib
+import struct
+import tempfile
+import zipfile as zp
+import collections
+from concurrent.futures import ThreadPoolExecutor
+try:
+    from compression import zstd
+except ImportError:
+    zstd = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+BLOCK_SIZE = 1024 * 1024
+WINDOW_SIZE = 32 * 1024
+
+# codec -> (tar extension, default level, (min, max) level)
+CODECS = {
+    "gzip": (".tar.gz", 9, (1, 9)),
+    "bz2": (".tar.bz2", 9, (1, 9)),
+    "xz": (".tar.xz", 6, (0, 9)),
+    "zstd": (".tar.zst", 3, (1, 22)),
+}
+_ALIASES = {"gz": "gzip", "bzip2": "bz2", "lzma": "xz", "zst": "zstd"}
+# leading bytes of each codec's stream
+_MAGIC = ((b"\x1f\x8b", "gzip"), (b"BZh", "bz2"), (b"\xfd7zXZ\x00", "xz"),
+          (b"\x28\xb5\x2f\xfd", "zstd"))
+
+
+def calc_codec(codec, level=None):
+    """ Returns canonical (codec, level) validating availability & level range """
+    codec = _ALIASES.get(str(codec).lower(), str(codec).lower())
+    if codec not in CODECS:
+        raise ValueError("Unknown codec %s (expected one of %s)" % (codec, ", ".join(CODECS)))
+    if codec == "zstd" and zstd is None and zstandard is None:
+        raise ValueError("zstd requires Python 3.14 (compression.zstd) or zstandard")
+
+    _, default, (low, high) = CODECS[codec]
+    if level is None:
+        level = default
+    elif not low <= int(level) <= high:
+        raise ValueError("%s level must be in [%d, %d]" % (codec, low, high))
+    return codec, int(level)
+
+
+def available_codecs():
+    """ codecs usable with this Python runtime """
+    return [itm for itm in CODECS if itm != "zstd" or zstd is not None or zstandard is not None]
+
+
+def tar_extension(codec):
+    """ archive extension for codec e.g. .tar.xz """
+    return CODECS[calc_codec(codec)[0]][0]
+
+
+def open_compressed(filename, codec="gzip", level=None, workers=0):
+    """ Returns writable binary file object compressing into filename, which may also be an open
+        binary file (left open when the compressor is closed). gzip with workers > 1 uses
+        parallel_gzip
+    """
+    codec, level = calc_codec(codec, level)
+    is_path = isinstance(filename, (str, bytes, os.PathLike))
+    if codec == "gzip":
+        if workers and workers > 1:
+            if is_path:
+                return parallel_gzip(filename, level=level, workers=workers)
+            return parallel_gzip(None, level=level, workers=workers, fileobj=filename)
+        if is_path:
+            return gzip.GzipFile(filename, "wb", compresslevel=level)
+        return gzip.GzipFile(None, "wb", compresslevel=level, fileobj=filename)
+    if codec == "bz2":
+        return bz2.BZ2File(filename, "wb", compresslevel=level)
+    if codec == "xz":
+        return lzma.LZMAFile(filename, "wb", preset=level)
+    if zstd is not None:
+        return zstd.ZstdFile(filename, "wb", level=level)
+    if is_path:
+        return zstandard.ZstdCompressor(level=level).stream_writer(open(filename, "wb"),
+                                                                   closefd=True)
+    return zstandard.ZstdCompressor(level=level).stream_writer(filename, closefd=False)
+
+
+def open_decompressed(filename, codec=None):
+    """ Returns readable binary file object decompressing filename (inverse of open_compressed).
+        codec None detects it from the leading bytes of the file
+    """
+    if codec is None:
+        with open(filename, "rb") as file_ptr:
+            head = file_ptr.read(6)
+        codec = next((name for magic, name in _MAGIC if head.startswith(magic)), None)
+        if codec is None:
+            raise ValueError("Unknown compression format " + os.fspath(filename))
+    codec, _ = calc_codec(codec)
+    if codec == "gzip":
+        return gzip.GzipFile(filename, "rb")
+    if codec == "bz2":
+        return bz2.BZ2File(filename, "rb")
+    if codec == "xz":
+        return lzma.LZMAFile(filename, "rb")
+    if zstd is not None:
+        return zstd.ZstdFile(filename, "rb")
+    return zstandard.ZstdDecompressor().stream_reader(open(filename, "rb"), closefd=True)
+
+
+class atomic_file(object):
+    """ atomic_file -- binary file created as a hidden temp file in the directory of path.
+        commit() flushes, fsyncs and renames it onto path (then fsyncs the directory), abort()
+        removes it, so readers never see a partial archive. Use as context manager to commit on
+        success / abort on exception
+    """
+
+    def __init__(self, path):
+        self.path = path
+        dirname, basename = os.path.split(path)
+        fd, self.temp_path = tempfile.mkstemp(dir=dirname or ".", prefix="." + basename,
+                                              suffix=".part")
+        # mkstemp creates 0600, archives keep the permissions a plain open() would give
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(self.temp_path, 0o666 & ~umask)
+        self.file = os.fdopen(fd, "w+b")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *args):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+
+    def commit(self):
+        """ durably moves the temp file onto path """
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        os.replace(self.temp_path, self.path)
+        try:
+            dir_fd = os.open(os.path.dirname(self.path) or ".", os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+        except OSError:
+            pass
+        return self.path
+
+    def abort(self):
+        """ discards the temp file """
+        if not self.file.closed:
+            self.file.close()
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+
+def compress_bytes(data, codec="gzip", level=None):
+    """ one shot in-memory compression (benchmarks) """
+    codec, level = calc_codec(codec, level)
+    if codec == "gzip":
+        return gzip.compress(data, compresslevel=level)
+    if codec == "bz2":
+        return bz2.compress(data, compresslevel=level)
+    if codec == "xz":
+        return lzma.compress(data, preset=level)
+    if zstd is not None:
+        return zstd.compress(data, level=level)
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+def decompress_bytes(data, codec="gzip"):
+    """ inverse of compress_bytes """
+    codec, _ = calc_codec(codec)
+    if codec == "gzip":
+        return gzip.decompress(data)
+    if codec == "bz2":
+        return bz2.decompress(data)
+    if codec == "xz":
+        return lzma.decompress(data)
+    if zstd is not None:
+        return zstd.decompress(data)
+    return zstandard.ZstdDecompressor().decompress(data)
+
+
+def calc_zip_compression(codec=None, level=None):
+    """ Returns (compression, compresslevel) for zipfile.ZipFile. None / "store" keeps
+        ZIP_STORED; gzip maps to ZIP_DEFLATED, bz2 ZIP_BZIP2, xz ZIP_LZMA (no level),
+        zstd ZIP_ZSTANDARD where zipfile supports it
+    """
+    if codec is None or str(codec).lower() in ("store", "stored", "none"):
+        return zp.ZIP_STORED, None
+    if str(codec).lower() == "deflate":
+        codec = "gzip"
+    codec, level = calc_codec(codec, level)
+    if codec == "gzip":
+        return zp.ZIP_DEFLATED, level
+    if codec == "bz2":
+        return zp.ZIP_BZIP2, level
+    if codec == "xz":
+        return zp.ZIP_LZMA, None
+    if hasattr(zp, "ZIP_ZSTANDARD"):
+        return zp.ZIP_ZSTANDARD, level
+    raise ValueError("zipfile in this runtime has no zstd support")
+
+
+def _deflate_block(block, level, zdict, last):
+    """ raw deflate of one block primed with the previous block's tail; non final blocks end
+        on a byte aligned sync flush so the outputs can simply be concatenated
+    """
+    if zdict:
+        comp = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS, 9,
+                                zlib.Z_DEFAULT_STRATEGY, zdict)
+    else:
+        comp = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS, 9)
+    return comp.compress(block) + comp.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+class parallel_gzip(object):
+    """ parallel_gzip -- write only file object producing a standard single member gzip stream
+        (readable by gzip / tar xzf). Input is cut into block_size blocks compressed on a thread
+        pool (zlib releases the GIL) in the style of pigz; each block is primed with the last
+        32 KiB of its predecessor so the ratio stays close to serial gzip. At most 2 * workers
+        blocks are in flight, output order is preserved.
+    """
+
+    def __init__(self, filename, level=6, workers=None, block_size=BLOCK_SIZE, fileobj=None):
+        """ filename ignored when an open binary fileobj (left open on close) is given """
+        self.level = level
+        self.workers = workers if workers else (os.cpu_count() or 1)
+        self.block_size = block_size
+        self.closed = False
+        self._own = fileobj is None
+        self._fp = open(filename, "wb") if fileobj is None else fileobj
+        self._pool = ThreadPoolExecutor(max_workers=self.workers)
+        self._pending = collections.deque()
+        self._buf = bytearray()
+        self._dict = b""
+        self._crc = 0
+        self._size = 0
+        self._fp.write(struct.pack("<BBBBIBB", 0x1f, 0x8b, 8, 0, int(time.time()),
+                                   2 if level == 9 else (4 if level == 1 else 0), 255))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        """ buffers data, full blocks are handed to the pool """
+        self._buf += data
+        while len(self._buf) >= self.block_size:
+            block = bytes(self._buf[:self.block_size])
+            del self._buf[:self.block_size]
+            self._submit(block, False)
+        return len(data)
+
+    def flush(self):
+        """ data is only emitted per block, nothing to do until close """
+        return None
+
+    def _submit(self, block, last):
+        self._crc = zlib.crc32(block, self._crc)
+        self._size = self._size + len(block)
+        self._pending.append(self._pool.submit(_deflate_block, block, self.level, self._dict,
+                                               last))
+        self._dict = block[-WINDOW_SIZE:]
+        while len(self._pending) > 2 * self.workers:
+            self._fp.write(self._pending.popleft().result())
+
+    def close(self):
+        """ compresses the remaining data, writes the gzip trailer and closes """
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self._submit(bytes(self._buf), True)
+            self._buf = bytearray()
+            while self._pending:
+                self._fp.write(self._pending.popleft().result())
+            self._fp.write(struct.pack("<II", self._crc, self._size & 0xffffffff))
+        finally:
+            self._pool.shutdown(wait=True)
+            if self._own:
+                self._fp.close()
@@ -4,74 +4,301 @@
 #!/usr/bin/python3
 import datetime as dt
 import os
+import sys
+import time
+import atexit
+import functools
+import threading
+import collections
+
+_STAMPS = {}
+_SPANS = {}
+_SPAN_LOCK = threading.Lock()
+_SPAN_LOCAL = threading.local()
+_PROFILES = {}
+_EVENT_LOG = None
+
+
+def calc_timestamp(time_str="%Y/%m/%d %H:%M:%S", now=None):
+    """ formatted local time; the string is cached per format and rebuilt at most once a second """
+    sec = int(time.time() if now is None else now)
+    cached = _STAMPS.get(time_str)
+    if cached is None or cached[0] != sec:
+        cached = (sec, dt.datetime.fromtimestamp(sec).strftime(time_str))
+        _STAMPS[time_str] = cached
+    return cached[1]
 
 
 class debug_control(object):
     """ debug_control -- object wrapping debug output
+        buffered hands formatted lines to a background writer thread through a bounded queue
+        (queue_size, a deque so appending takes no lock) so callers never wait on log I/O; the
+        writer wakes every flush_interval seconds (or once a batch is waiting) and writes &
+        flushes everything queued at once. Should the queue fill up, lines are dropped and
+        counted rather than blocking. close() (also run at exit) drains the queue before closing.
+        log_format "json" writes one JSON object per line instead of text (see event /
+        read_events); every record carries ts (epoch seconds), host & event kind.
+        The file is rotated once it exceeds max_bytes or is older than max_age seconds (0 never):
+        renamed to <filename>.<YYYYmmdd_HHMMSS>, then gzip'ed and pruned to the newest keep
+        segments (and none older than keep_days) on a background thread. sweep is an optional
+        glob, or list of globs, of sibling logs (e.g. the dated per run files of
+        append_date_file, see backup_utility.calc_debug_file) given the same retention once at
+        start up.
     """
 
-    def __init__(self, filename=None, debug_level=0, time_str="%Y/%m/%d %H:%M:%S"):
+    def __init__(self, filename=None, debug_level=0, time_str="%Y/%m/%d %H:%M:%S",
+                 buffered=False, queue_size=100000, flush_interval=0.5, log_format="text",
+                 host=None, max_bytes=0, max_age=0, keep=5, keep_days=None, sweep=None):
+        global _EVENT_LOG
+        if log_format not in ("text", "json"):
+            raise ValueError("log_format must be text or json")
         self.start = dt.datetime.now()
         self.orig = self.start
-        self.curr = self.start
+        self._last = time.time()
         self.filename = filename
         self.reporting_level = debug_level
         self.time_str = time_str
+        self.dropped = 0
+        self.handle = None
+        # forked pool workers inherit the object (and a copy of the handle's buffer), only the
+        # creating process writes
+        self._pid = os.getpid()
+        self.queue_size = queue_size
+        self.flush_interval = flush_interval
+        self._queue = None
+        self._wake = threading.Event()
+        self._stopping = False
+        self._writer = None
+        self.log_format = log_format
+        self.host = host
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.keep = keep
+        self.keep_days = keep_days
+        self._size = 0
+        self._opened = time.time()
+        # serialises writes & rotation: unbuffered writes come from several threads at once
+        # (stream_process reads stdout & stderr on two)
+        self._io_lock = threading.RLock()
+        self._jobs = None
+        self._maintainer = None
+        self._encode = None
+        if log_format == "json":
+            import json
+            self._encode = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False,
+                                            default=str).encode
         if self.reporting_level > 0 and filename is not None:
             self.handle = open(self.filename, "w", encoding="utf-8")
+            if self._encode is not None:
+                _EVENT_LOG = self
+            if sweep:
+                self._background(sweep_logs, sweep, exclude=(os.path.abspath(filename),),
+                                 keep=keep, keep_days=keep_days, min_age=3600)
+            if buffered:
+                self._queue = collections.deque()
+                self._writer = threading.Thread(target=self._run_writer, name="debug_control",
+                                                daemon=True)
+                self._writer.start()
+            atexit.register(self.close)
         else:
             if self.reporting_level > 0:
                 print("reporting level must be positive & file not None")
 
+    @property
+    def curr(self):
+        """ time of the last write """
+        return dt.datetime.fromtimestamp(self._last)
+
+    def _stamp(self):
+        self._last = time.time()
+        return calc_timestamp(self.time_str, self._last)
+
+    def _emit(self, string):
+        """ writes string directly or queues it for the writer thread """
+        if self._pid != os.getpid():
+            return
+        if self._queue is None:
+            self._write_out(string)
+            return
+        pending = len(self._queue)
+        if pending >= self.queue_size:
+            self.dropped = self.dropped + 1
+            return
+        self._queue.append(string)
+        if pending >= 4096 and not self._wake.is_set():
+            self._wake.set()
+
+    def _run_writer(self):
+        """ writer thread: sleeps until woken / flush_interval, then writes the queued batch """
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            stop = self._stopping
+            batch = []
+            events = []
+            while True:
+                try:
+                    itm = self._queue.popleft()
+                except IndexError:
+                    break
+                if isinstance(itm, str):
+                    batch.append(itm)
+                else:
+                    events.append(itm)
+            if batch:
+                self._write_batch(batch)
+                with self._io_lock:
+                    self.handle.flush()
+            for itm in events:
+                itm.set()
+            if stop:
+                return
+
+    def _write_batch(self, batch):
+        """ writes queued lines, cut where the file reaches max_bytes so segments stay bounded """
+        if not self.max_bytes:
+            self._write_out("".join(batch))
+            return
+        group = []
+        size = 0
+        for itm in batch:
+            group.append(itm)
+            size = size + len(itm)
+            if self._size + size >= self.max_bytes:
+                self._write_out("".join(group))
+                group = []
+                size = 0
+        if group:
+            self._write_out("".join(group))
+
+    def _write_out(self, string):
+        """ writes to the file (caller or writer thread), rotating when a limit is reached """
+        with self._io_lock:
+            self.handle.write(string)
+            self._size = self._size + len(string)
+            if (self.max_bytes and self._size >= self.max_bytes) or\
+                    (self.max_age and time.time() - self._opened >= self.max_age):
+                self.rotate()
+
+    def rotate(self):
+        """ moves the current file aside & reopens filename; the new handle is in place before
+            the old one closes. Compression & retention run in the background
+        """
+        with self._io_lock:
+            segment = ".".join([self.filename, time.strftime("%Y%m%d_%H%M%S")])
+            count = 1
+            while os.path.exists(segment) or os.path.exists(segment + ".gz"):
+                segment = ".".join([self.filename, time.strftime("%Y%m%d_%H%M%S"), str(count)])
+                count = count + 1
+            old = self.handle
+            old.flush()
+            os.rename(self.filename, segment)
+            self.handle = open(self.filename, "w", encoding="utf-8")
+            old.close()
+            self._size = 0
+            self._opened = time.time()
+        self._background(compress_log, segment)
+        self._background(sweep_logs, self.filename + ".*", keep=self.keep,
+                         keep_days=self.keep_days)
+        return segment
+
+    def _background(self, func, *args, **kwargs):
+        """ queues maintenance (compression / retention) for the background thread """
+        if self._maintainer is None:
+            import queue
+            self._jobs = queue.Queue()
+            self._maintainer = threading.Thread(target=self._run_maintenance,
+                                                name="debug_control_maint", daemon=True)
+            self._maintainer.start()
+        self._jobs.put((func, args, kwargs))
+
+    def _run_maintenance(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            func, args, kwargs = job
+            try:
+                func(*args, **kwargs)
+            except OSError as err:
+                # stdout may be the program's output (e.g. a dump), keep it clean
+                sys.stderr.write("log maintenance failed: %s\n" % (err))
+
+    def flush(self):
+        """ waits until everything written so far is on disk (buffered) / flushes the handle """
+        if self.handle is None or self.handle.closed or self._pid != os.getpid():
+            return
+        if self._writer is not None and self._writer.is_alive():
+            done = threading.Event()
+            self._queue.append(done)
+            self._wake.set()
+            done.wait()
+        else:
+            with self._io_lock:
+                self.handle.flush()
+
     def write(self, string):
         """ Simple write method to--string appended w/ datetime & new line seperator """
         if self.handle.closed:
             print("File closed")
+        elif self._encode is not None:
+            self.event("message", msg=string)
         else:
-            self.curr = dt.datetime.now()
-            string = "".join(
-                [string, "-- ", self.curr.strftime(self.time_str), os.linesep]
-            )
-            self.handle.writelines(string)
+            self._emit("".join([string, "-- ", self._stamp(), os.linesep]))
+
+    def event(self, kind, **fields):
+        """ Structured event e.g. event("process", process="rsync", returncode=0, seconds=1.5);
+            one JSON object per line in json mode, "kind key=value ..." text otherwise
+        """
+        if self.handle is None or self.handle.closed or self._pid != os.getpid():
+            return
+        if self._encode is None:
+            self.write(" ".join([kind] + ["%s=%s" % (key, val) for key, val in fields.items()]))
+            return
+        self._last = time.time()
+        record = {"ts": round(self._last, 3), "host": self.host, "event": kind}
+        record.update(fields)
+        self._emit(self._encode(record) + "\n")
 
     def write_stdout(self, processname, out=None):
         ''' Writes tyo std out takes processname & out '''
-        if out is not None:
+        if out is not None and self._encode is not None:
+            self.event("stdout", process=processname, text=out.decode("UTF-8", errors="replace"))
+        elif out is not None:
             init = out.decode("UTF-8").split("\n")
-            self.curr = dt.datetime.now()
             base_str = "".join(
                 [
                     processname,
                     " (stdout) -- ",
                     str(len(init)),
                     os.linesep,
-                    self.curr.strftime(self.time_str),
+                    self._stamp(),
                     os.linesep,
                 ]
             )
-            self.handle.writelines(base_str)
-            for itm in init:
-                itm2 = itm + os.linesep
-                self.handle.writelines(itm2)
+            self._emit(base_str + "".join([itm + os.linesep for itm in init]))
 
     def write_stderr(self, processname, out=None):
         """ Attmepts to capture standard error and write stream """
-        if out is not None:
-            self.curr = dt.datetime.now()
+        if out is not None and self._encode is not None:
+            self.event("stderr", process=processname, text=out.decode("UTF-8", errors="replace"))
+        elif out is not None:
             base_str = " ".join(
                 [
                     processname,
                     "(stderr) --",
                     out.decode("UTF-8"),
                     os.linesep,
-                    self.curr.strftime(self.time_str),
+                    self._stamp(),
                     os.linesep
                 ]
             )
-            self.handle.writelines(base_str)
+            self._emit(base_str)
 
     def close(self):
         """ closes open file handle and applies closing message"""
+        if self.handle is None or self.handle.closed or self._pid != os.getpid():
+            return
         base_time = dt.datetime.now()
         base_diff = base_time - self.orig
         base_str = " ".join(
@@ -84,33 +311,62 @@ class debug_control(object):
                 str(base_diff.seconds % 60),
             ]
         )
-        self.write(base_str)
+        if self._encode is not None:
+            for itm in span_report():
+                self.event("span_total", phase=itm['path'], calls=itm['calls'],
+                           seconds=round(itm['seconds'], 6), files=itm['files'],
+                           bytes=itm['bytes'])
+        else:
+            for line in format_span_report():
+                self.write(line)
+        dump_profiles()
 
-        if self.handle.closed:
-            if self.reporting_level > 0:
-                self.write("File is closed")
+        if self._writer is not None:
+            self._stopping = True
+            self._wake.set()
+            self._writer.join()
+            self._writer = None
+            self._queue = None
+
+        if self._encode is not None:
+            self.event("finish", seconds=round(base_diff.total_seconds(), 3),
+                       dropped=self.dropped)
         else:
+            if self.dropped > 0:
+                base_str = base_str + " (%d lines dropped, log queue full)" % (self.dropped)
+            self.write(base_str)
+        with self._io_lock:
             self.handle.close()
+        if self._maintainer is not None:
+            self._jobs.put(None)
+            self._maintainer.join()
+            self._maintainer = None
+        atexit.unregister(self.close)
+        global _EVENT_LOG
+        if _EVENT_LOG is self:
+            _EVENT_LOG = None
 
     def __del__(self):
-        if not self.handle.closed:
-            self.handle.close()
+        if self.handle is not None and not self.handle.closed:
+            self.close()
 
 def test_dbg(dbg):
-    """ Simple function to test debug status"""
-    return (isinstance(dbg, bool) and dbg) or (
+    """ Simple function to test debug status (a list collects messages, see print_helper) """
+    return (isinstance(dbg, bool) and dbg) or isinstance(dbg, list) or (
         isinstance(dbg, debug_control) and dbg.reporting_level > 0
     )
 
 
 def print_helper(base_str, dbg):
-    """ print helper applied to test dbg type and take correct print action """
+    """ print helper applied to test dbg type and take correct print action. dbg may be a list
+        collecting the messages instead (pool workers hand them back to the parent's dbg)
+    """
     print_dbg = test_dbg(dbg)
     if print_dbg:
         if isinstance(dbg, bool):
-            print(
-                "  ".join([dt.datetime.now().strftime("%Y/%m/%d %H:%M:%S"), base_str])
-            )
+            print("  ".join([calc_timestamp(), base_str]))
+        elif isinstance(dbg, list):
+            dbg.append(base_str)
         else:
             dbg.write(base_str)
 
@@ -130,37 +386,297 @@ def print_helper_tuple(init_str, base_str, base_tuple=None, dbg=None):
 
             fnl_str = fnl_str % base_tuple
             fnl_str = init_str + fnl_str
-            if isinstance(dbg, bool):
-                print(
-                    "  ".join([dt.datetime.now().strftime("%Y/%m/%d %H:%M:%S"), fnl_str])
-                )
-            else:
-                dbg.write(fnl_str)
+            print_helper(fnl_str, dbg)
         else:
             if isinstance(base_str, tuple):
                 base_str = "".join(base_str)
             print_helper("".join([init_str, base_str]), dbg)
 
+def stream_process(command_list, processname, dbg=False, stdout=None, tail=50):
+    """ Runs command_list logging its output line by line as it arrives: stdout on the calling
+    thread, stderr on a helper thread, so memory stays bounded however much the child prints and
+    progress shows in the log while it runs. stdout may be an open file taking the child's
+    stdout instead (e.g. a dump); when nothing is logged stdout goes to /dev/null.
+    Only the last tail stderr lines are kept.
+    RETURNS :: returncode, stderr tail (bytes)
+    """
+    import subprocess as subp
+
+    print_dbg = test_dbg(dbg)
+    if stdout is None:
+        stdout = subp.PIPE if print_dbg else subp.DEVNULL
+    err_tail = collections.deque(maxlen=tail)
+
+    structured = isinstance(dbg, debug_control) and dbg.log_format == "json"
+
+    def log_line(stream, line):
+        text = line.decode("UTF-8", errors="replace").rstrip("\r\n")
+        if structured:
+            dbg.event("output", process=processname, stream=stream.strip("()"), line=text)
+        else:
+            print_helper(" ".join([processname, stream, text]), dbg)
+
+    start = time.perf_counter()
+    proc = subp.Popen(command_list, stdout=stdout, stderr=subp.PIPE, stdin=subp.DEVNULL)
+
+    def read_stderr():
+        logging = print_dbg
+        for line in proc.stderr:
+            err_tail.append(line)
+            if logging:
+                try:
+                    log_line("(stderr)", line)
+                except Exception:
+                    # keep draining, a child blocked on a full stderr pipe never exits
+                    logging = False
+
+    reader = threading.Thread(target=read_stderr, name="stream_process", daemon=True)
+    reader.start()
+    try:
+        if proc.stdout is not None:
+            for line in proc.stdout:
+                log_line("(stdout)", line)
+        proc.wait()
+    except BaseException:
+        # logging failed / interrupted: nobody reads stdout any more, stop the child rather
+        # than leave it blocked on a full pipe
+        proc.kill()
+        raise
+    finally:
+        if proc.stdout is not None:
+            proc.stdout.close()
+        proc.wait()
+        reader.join()
+        proc.stderr.close()
+
+    log_event("process", dbg, process=processname, command=" ".join(command_list),
+              returncode=proc.returncode, seconds=round(time.perf_counter() - start, 6))
+    return proc.returncode, b"".join(err_tail)
+
 def error_helper(pred, stderr=None, post=None, dbg=False):
     """
     pred predicate e.g. Diff Error
     stderr -- expects in bytew to be decoded from subp.stderr
     post -- defaults to None (& excluded)
     """
-    print_dbg = (isinstance(dbg, bool) and dbg) or (
-        isinstance(dbg, debug_control) and dbg.reporting_level > 0
-    )
+    print_dbg = test_dbg(dbg)
 
     if print_dbg:
-        if isinstance(dbg, bool):
-            base_time_str = dt.datetime.now()
+        if isinstance(dbg, (bool, list)):
             base_list = [pred]
             if stderr is not None:
                 base_list.append(stderr.decode("UTF-8"))
 
             if post is not None:
                 base_list.append(post)
-            base_list.append(base_time_str.strftime("%Y/%m/%d %H:%M:%S"))
+            if isinstance(dbg, list):
+                dbg.append(" ".join(base_list))
+                return
+            base_list.append(calc_timestamp())
             print(" ".join(base_list))
         else:
             dbg.write_stderr(pred, stderr)
+
+
+class span(object):
+    """ span -- timed phase, used as context manager or decorator (@span("calc_diff")). Spans
+        nest per thread: one opened inside another is recorded under "outer/inner". Wall time,
+        calls, files & bytes (span_add) are totalled per path for the whole process, see
+        span_report. Spans run in pool processes are neither collected nor logged.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.path = name
+        self.files = 0
+        self.nbytes = 0
+        self.fields = None
+        self.start = None
+        self._profile = None
+
+    def __enter__(self):
+        stack = getattr(_SPAN_LOCAL, "stack", None)
+        if stack is None:
+            stack = _SPAN_LOCAL.stack = []
+        if stack:
+            self.path = "/".join([stack[-1].path, self.name])
+        stack.append(self)
+        self._profile = _PROFILES.get(self.name)
+        if self._profile is not None and not self._profile[2]:
+            self._profile[2] = True
+            self._profile[0].enable()
+        else:
+            self._profile = None
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        elapsed = time.perf_counter() - self.start
+        if self._profile is not None:
+            self._profile[0].disable()
+            self._profile[2] = False
+        _SPAN_LOCAL.stack.pop()
+        with _SPAN_LOCK:
+            totals = _SPANS.get(self.path)
+            if totals is None:
+                totals = _SPANS[self.path] = [0, 0.0, 0, 0]
+            totals[0] = totals[0] + 1
+            totals[1] = totals[1] + elapsed
+            totals[2] = totals[2] + self.files
+            totals[3] = totals[3] + self.nbytes
+        if _EVENT_LOG is not None:
+            fields = self.fields or {}
+            _EVENT_LOG.event("span", phase=self.path, seconds=round(elapsed, 6),
+                             files=self.files, bytes=self.nbytes, **fields)
+
+    def add(self, files=0, nbytes=0, **fields):
+        """ counts files / bytes handled within this span, fields (path, returncode ...) are
+            attached to its structured log event
+        """
+        self.files = self.files + files
+        self.nbytes = self.nbytes + nbytes
+        if fields:
+            if self.fields is None:
+                self.fields = {}
+            self.fields.update(fields)
+
+    def __call__(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(self.name):
+                return func(*args, **kwargs)
+        return wrapper
+
+def span_add(files=0, nbytes=0, **fields):
+    """ counts files / bytes against the innermost open span of this thread (no-op outside) """
+    stack = getattr(_SPAN_LOCAL, "stack", None)
+    if stack:
+        stack[-1].add(files, nbytes, **fields)
+
+def span_report():
+    """ Returns per phase totals sorted by path: dicts of path, calls, seconds, files, bytes """
+    with _SPAN_LOCK:
+        items = sorted([(key, list(val)) for key, val in _SPANS.items()])
+    return [{'path': key, 'calls': val[0], 'seconds': val[1], 'files': val[2], 'bytes': val[3]}
+            for key, val in items]
+
+def format_span_report():
+    """ span_report as log lines, children indented below their parent """
+    lines = []
+    for itm in span_report():
+        depth = itm['path'].count("/")
+        lines.append("%sspan %s: %d calls %.3fs %d files %d bytes" % (
+            "  " * depth, itm['path'].rsplit("/", 1)[-1], itm['calls'], itm['seconds'],
+            itm['files'], itm['bytes']))
+    return lines
+
+def report_spans(dbg):
+    """ writes the span breakdown through print_helper (debug_control.close does this itself) """
+    for line in format_span_report():
+        print_helper(line, dbg)
+    dump_profiles()
+
+def reset_spans():
+    """ clears recorded span totals """
+    with _SPAN_LOCK:
+        _SPANS.clear()
+
+def profile_span(name, filename=None):
+    """ profiles every span called name with cProfile (thread opening the span), stats are
+        dumped to filename (default <name>.prof) by dump_profiles / close / at exit
+    """
+    import cProfile
+
+    if name not in _PROFILES:
+        _PROFILES[name] = [cProfile.Profile(), filename or name + ".prof", False]
+        if len(_PROFILES) == 1:
+            atexit.register(dump_profiles)
+
+def dump_profiles():
+    """ writes cProfile stats of profiled spans that ran """
+    for profile, filename, _ in _PROFILES.values():
+        if profile.getstats():
+            profile.dump_stats(filename)
+
+def log_event(kind, dbg=None, **fields):
+    """ structured event to dbg, or to the open json debug_control when dbg is not one; no-op
+        without a json log (text logs already carry the messages)
+    """
+    target = dbg if isinstance(dbg, debug_control) and dbg.log_format == "json" else _EVENT_LOG
+    if target is not None:
+        target.event(kind, **fields)
+
+def read_events(filename, kinds=None, where=None):
+    """ Generator streaming the records of a json log (plain or .gz), one line at a time.
+        kinds limits to those event kinds, where(record) is an extra predicate; lines that are
+        not JSON (e.g. truncated by a crash) are skipped
+    """
+    import json
+
+    if filename.endswith(".gz"):
+        import gzip
+        file_ptr = gzip.open(filename, "rt", encoding="utf-8")
+    else:
+        file_ptr = open(filename, "r", encoding="utf-8")
+    kinds = set(kinds) if kinds is not None else None
+    with file_ptr:
+        for line in file_ptr:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if kinds is not None and record.get("event") not in kinds:
+                continue
+            if where is not None and not where(record):
+                continue
+            yield record
+
+def compress_log(path, level=6):
+    """ gzip's path into path.gz (via a .part file) and removes path. path.gz keeps path's
+        mtime, retention ranks segments by it. Returns None when path is already gone (swept
+        before its queued compression ran)
+    """
+    import gzip
+    import shutil
+
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as src, gzip.open(path + ".gz.part", "wb", compresslevel=level) as dest:
+        shutil.copyfileobj(src, dest, 1024 * 1024)
+    shutil.copystat(path, path + ".gz.part")
+    os.replace(path + ".gz.part", path + ".gz")
+    os.remove(path)
+    return path + ".gz"
+
+
+def sweep_logs(pattern, exclude=(), keep=5, keep_days=None, compress=True, min_age=0):
+    """ Retention for the logs matching glob pattern or a list of patterns (rotated segments,
+        dated per run logs): beyond the newest keep (None no limit) or older than keep_days they
+        are deleted, the survivors not modified for min_age seconds are gzip'ed. exclude lists
+        paths left alone (the active log)
+        RETURNS :: list of removed paths
+    """
+    import glob
+
+    now = time.time()
+    exclude = set([os.path.abspath(itm) for itm in exclude])
+    patterns = [pattern] if isinstance(pattern, str) else pattern
+    found = []
+    for path in set([itm for pat in patterns for itm in glob.glob(pat)]):
+        if path.endswith(".part") or os.path.abspath(path) in exclude:
+            continue
+        try:
+            found.append((os.stat(path).st_mtime, path))
+        except OSError:
+            continue
+    found.sort(reverse=True)
+
+    cutoff = now - keep_days * 86400 if keep_days is not None else None
+    removed = []
+    for idx, (mtime, path) in enumerate(found):
+        if (keep is not None and idx >= keep) or (cutoff is not None and mtime < cutoff):
+            os.remove(path)
+            removed.append(path)
+        elif compress and not path.endswith(".gz") and now - mtime >= min_age:
+            compress_log(path)
+    return removed
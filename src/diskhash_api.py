@@ -0,0 +1,156 @@
+#!/usr/bin/python3
+""" Diskhash Class -- cached BLAKE2 content hashes for files walked by diskwalk """
+import os
+import hashlib
+import sqlite3
+import collections
+from concurrent.futures import ThreadPoolExecutor
+import diskwalk_api as dwa
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def hash_path(path, chunk_size=CHUNK_SIZE, digest_size=32):
+    """ Returns hex BLAKE2b digest of file content read in chunk_size blocks """
+    digest = hashlib.blake2b(digest_size=digest_size)
+    buf = bytearray(chunk_size)
+    view = memoryview(buf)
+    with open(path, "rb", buffering=0) as fp:
+        while True:
+            size = fp.readinto(buf)
+            if not size:
+                break
+            digest.update(view[:size])
+    return digest.hexdigest()
+
+
+class diskhash():
+    """ Content hashing on top of diskwalk. Digests are computed on a bounded thread pool
+        (hashlib releases the GIL) and cached in sqlite keyed by (dev, inode, size, mtime), so files
+        unchanged since they were last hashed are never read again. cache None keeps the cache
+        in memory for the life of the object.
+    """
+
+    def __init__(self, cache=None, workers=4, chunk_size=CHUNK_SIZE, digest_size=32, dbg=False):
+        self.cache = cache
+        self.workers = max(1, workers)
+        self.chunk_size = chunk_size
+        self.digest_size = digest_size
+        self.dbg = dbg
+        self.stats = {'cached': 0, 'hashed': 0, 'bytes': 0, 'failed': 0}
+        self._con = sqlite3.connect(cache if cache is not None else ":memory:")
+        columns = [row[1] for row in self._con.execute("PRAGMA table_info(hashes)")]
+        if columns and "dev" not in columns:
+            # caches keyed by inode alone mix up files of different file systems, start over
+            self._con.execute("DROP TABLE hashes")
+        self._con.execute("CREATE TABLE IF NOT EXISTS hashes (dev INTEGER, inode INTEGER, "
+                          "size INTEGER, mtime REAL, digest_size INTEGER, digest TEXT, "
+                          "PRIMARY KEY (dev, inode, size, mtime, digest_size)) WITHOUT ROWID")
+        self._pending = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """ flushes pending cache rows and closes the cache """
+        if self._con is not None:
+            self._flush()
+            self._con.close()
+            self._con = None
+
+    def _flush(self):
+        if self._pending:
+            self._con.executemany("INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?)",
+                                  self._pending)
+            self._con.commit()
+            self._pending = []
+
+    @staticmethod
+    def _as_entry(ent):
+        """ accepts diskentry or path (stat'ed here) """
+        if isinstance(ent, dwa.diskentry):
+            return ent
+        st = os.stat(ent)
+        return dwa.diskentry(os.fspath(ent), st.st_size, st.st_mtime, st.st_ino, st.st_mode,
+                             st.st_uid, st.st_gid, st.st_dev)
+
+    def lookup(self, ent):
+        """ Returns cached digest for entry or None """
+        row = self._con.execute(
+            "SELECT digest FROM hashes WHERE dev = ? AND inode = ? AND size = ? AND mtime = ? "
+            "AND digest_size = ?", (ent.dev, ent.inode, ent.size, ent.mtime,
+                                    self.digest_size)).fetchone()
+        return row[0] if row is not None else None
+
+    def _store(self, ent, digest):
+        self._pending.append((ent.dev, ent.inode, ent.size, ent.mtime, self.digest_size,
+                              digest))
+        if len(self._pending) >= 1000:
+            self._flush()
+
+    def _hash(self, ent):
+        try:
+            return hash_path(ent.path, self.chunk_size, self.digest_size)
+        except OSError as err:
+            if self.dbg:
+                print("unable to hash %s: %s" % (ent.path, err.strerror))
+            return None
+
+    def hashFile(self, ent):
+        """ Returns hex digest of a single diskentry / path (None if unreadable) """
+        ent = self._as_entry(ent)
+        digest = self.lookup(ent)
+        if digest is not None:
+            self.stats['cached'] = self.stats['cached'] + 1
+            return digest
+
+        digest = self._hash(ent)
+        self._account(ent, digest)
+        return digest
+
+    def _account(self, ent, digest):
+        if digest is None:
+            self.stats['failed'] = self.stats['failed'] + 1
+        else:
+            self.stats['hashed'] = self.stats['hashed'] + 1
+            self.stats['bytes'] = self.stats['bytes'] + ent.size
+            self._store(ent, digest)
+
+    def hashEntries(self, entries):
+        """ Generator yielding (diskentry, digest) in input order; cache misses are hashed on the
+            pool with at most 4 * workers reads in flight, keeping memory bounded
+        """
+        window = collections.deque()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for ent in entries:
+                ent = self._as_entry(ent)
+                digest = self.lookup(ent)
+                if digest is not None:
+                    self.stats['cached'] = self.stats['cached'] + 1
+                    window.append((ent, digest, None))
+                else:
+                    window.append((ent, None, pool.submit(self._hash, ent)))
+
+                while window and (window[0][2] is None or len(window) > 4 * self.workers):
+                    yield self._resolve(window.popleft())
+
+            while window:
+                yield self._resolve(window.popleft())
+        self._flush()
+
+    def _resolve(self, itm):
+        ent, digest, future = itm
+        if future is not None:
+            digest = future.result()
+            self._account(ent, digest)
+        return ent, digest
+
+    def hashTree(self, walker):
+        """ Returns dict path -> digest for every file of a diskwalk (or its options) """
+        if not isinstance(walker, dwa.diskwalk):
+            walker = dwa.diskwalk(walker)
+        return {ent.path: digest for ent, digest in self.hashEntries(walker.iterEntries())
+                if digest is not None}
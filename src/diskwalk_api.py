@@ -1,8 +1,234 @@
 #!/usr/bin/pytthon3
 """ Diswalk Class """
 import os
+import re
+import stat
+import time
+import heapq
 # import shutil as shu
 
+_GLOB_CHARS = frozenset("*?[")
+
+
+def _translate_glob(pattern):
+    """ translates an rsync style glob into a regex fragment ('*' & '?' stop at '/', '**' does
+        not)
+    """
+    res = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        i = i + 1
+        if c == '*':
+            if i < n and pattern[i] == '*':
+                i = i + 1
+                res.append('.*')
+            else:
+                res.append('[^/]*')
+        elif c == '?':
+            res.append('[^/]')
+        elif c == '[':
+            j = i
+            if j < n and pattern[j] in '!^':
+                j = j + 1
+            if j < n and pattern[j] == ']':
+                j = j + 1
+            j = pattern.find(']', j)
+            if j < 0:
+                res.append('\\[')
+            else:
+                stuff = ''.join(['\\' + ch if ch in '\\[&~|' else ch for ch in pattern[i:j]])
+                if stuff[0] in '!^':
+                    stuff = '^' + stuff[1:]
+                res.append('[' + stuff + ']')
+                i = j + 1
+        else:
+            res.append(re.escape(c))
+    return ''.join(res)
+
+
+class ignore_matcher():
+    """ options['ignore'] compiled once for matching during walks. Absolute literal entries keep
+        their historical meaning (path prefixes) and live in a character trie. Everything else is
+        treated rsync style relative to the walk root: bare names ('.ipynb_checkpoints') & '*.ext'
+        go to hash sets, remaining globs / paths ('Vendor/BBG/...') to one combined regex.
+        A trailing '/' restricts a pattern to directories.
+    """
+
+    def __init__(self, patterns, root):
+        self.patterns = tuple(patterns)
+        self.root = root.rstrip(os.sep) + os.sep
+        self._trie = {}
+        self._names = set()
+        self._suffixes = set()
+        self._dir_names = set()
+        regex, dir_regex, abs_regex = [], [], []
+
+        for itm in self.patterns:
+            if not isinstance(itm, str) or not itm:
+                continue
+            has_glob = not _GLOB_CHARS.isdisjoint(itm)
+            if os.path.isabs(itm) and not has_glob:
+                self._add_prefix(itm)
+                continue
+
+            dir_only = itm.endswith('/') and len(itm) > 1
+            body = itm.rstrip('/') if dir_only else itm
+            if os.path.isabs(body):
+                abs_regex.append(_translate_glob(body) + '(?:/.*)?')
+            elif '/' not in body and not has_glob:
+                (self._dir_names if dir_only else self._names).add(body)
+            elif not dir_only and body.startswith('*.') and '/' not in body and\
+                    _GLOB_CHARS.isdisjoint(body[2:]) and '.' not in body[2:]:
+                self._suffixes.add(body[1:])
+            else:
+                frag = _translate_glob(body.lstrip('/'))
+                if not body.startswith('/'):
+                    frag = '(?:.*/)?' + frag
+                (dir_regex if dir_only else regex).append(frag)
+
+        self._regex = self._compile(regex)
+        self._dir_regex = self._compile(dir_regex)
+        self._abs_regex = self._compile(abs_regex)
+
+    @staticmethod
+    def _compile(frags):
+        if not frags:
+            return None
+        return re.compile('|'.join(['(?:%s)' % (itm) for itm in frags]), re.DOTALL)
+
+    def _add_prefix(self, prefix):
+        node = self._trie
+        for c in prefix:
+            node = node.setdefault(c, {})
+        node[None] = True
+
+    def _test_prefix(self, path):
+        node = self._trie
+        for c in path:
+            if None in node:
+                return True
+            node = node.get(c)
+            if node is None:
+                return False
+        return None in node
+
+    def __bool__(self):
+        return bool(self._trie or self._names or self._suffixes or self._dir_names or
+                    self._regex or self._dir_regex or self._abs_regex)
+
+    def match(self, path, is_dir=False):
+        """ True if path (file or directory, full path) is ignored. Only the entry itself is
+            tested, walkers are expected to prune ignored directories.
+        """
+        if self._trie and self._test_prefix(path):
+            return True
+        if self._abs_regex is not None and self._abs_regex.fullmatch(path.replace(os.sep, '/')):
+            return True
+
+        if not path.startswith(self.root):
+            return False
+        rel = path[len(self.root):]
+        if os.sep != '/':
+            rel = rel.replace(os.sep, '/')
+
+        name = rel.rpartition('/')[2]
+        if name in self._names:
+            return True
+        if self._suffixes:
+            _, dot, ext = name.rpartition('.')
+            if dot and ('.' + ext) in self._suffixes:
+                return True
+        if self._regex is not None and self._regex.fullmatch(rel):
+            return True
+        if is_dir:
+            if name in self._dir_names:
+                return True
+            if self._dir_regex is not None and self._dir_regex.fullmatch(rel):
+                return True
+        return False
+
+    def match_tree(self, path, is_dir=False):
+        """ True if path or any of its parent directories below the root is ignored """
+        if self.match(path, is_dir):
+            return True
+        parent = os.path.dirname(path)
+        while len(parent) >= len(self.root):
+            if self.match(parent, True):
+                return True
+            parent = os.path.dirname(parent)
+        return False
+
+
+class diskentry():
+    """ Compact record of a walked file; metadata is taken from os.DirEntry at walk time so
+        consumers need not stat the path again. Usable directly as a path (os.fspath).
+    """
+    __slots__ = ('path', 'size', 'mtime', 'inode', 'mode', 'uid', 'gid', 'dev')
+
+    def __init__(self, path, size=0, mtime=0.0, inode=0, mode=0, uid=0, gid=0, dev=0):
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+        self.inode = inode
+        self.mode = mode
+        self.uid = uid
+        self.gid = gid
+        self.dev = dev
+
+    @classmethod
+    def from_direntry(cls, entry):
+        """ builds record from os.DirEntry (symlinks are described, not followed); inode numbers
+            are only unique per device, (dev, inode) identifies a file across mount points
+        """
+        st = entry.stat(follow_symlinks=False)
+        return cls(entry.path, st.st_size, st.st_mtime, entry.inode(), st.st_mode, st.st_uid,
+                   st.st_gid, st.st_dev)
+
+    @property
+    def type(self):
+        """ 'f' regular file, 'd' directory, 'l' symlink, 'o' other """
+        if stat.S_ISREG(self.mode):
+            return 'f'
+        if stat.S_ISDIR(self.mode):
+            return 'd'
+        if stat.S_ISLNK(self.mode):
+            return 'l'
+        return 'o'
+
+    def is_file(self):
+        """ True for regular files """
+        return stat.S_ISREG(self.mode)
+
+    def is_dir(self):
+        """ True for directories """
+        return stat.S_ISDIR(self.mode)
+
+    def is_symlink(self):
+        """ True for symbolic links """
+        return stat.S_ISLNK(self.mode)
+
+    def __fspath__(self):
+        return self.path
+
+    def __repr__(self):
+        return "diskentry(%r, size=%d, type=%s)" % (self.path, self.size, self.type)
+
+
+def _remove_file(path, size=None, dryrun=True):
+    """ unlinks (or reports on dryrun) path; returns (path, size, error string or None) """
+    try:
+        if size is None:
+            size = os.lstat(path).st_size
+        if dryrun:
+            print("D: dryrun deletion of %s" % (path))
+        else:
+            os.remove(path)
+    except OSError as err:
+        return path, 0, err.strerror
+    return path, size, None
+
+
 class diskwalk():
     """API for getting directory walking collections"""
 
@@ -22,23 +248,246 @@ class diskwalk():
                 self.options['delete'] = {'filetype': [], 'regex': []}
             if 'dbg' not in self.options.keys():
                 self.options['dbg'] = False
+            if 'workers' not in self.options.keys():
+                self.options['workers'] = 0
 
             self.path_collection = []
+            self._matcher = None
         else:
             raise ValueError("diskwalk requires str or dict")
 
 
     def enumeratePaths(self):
         """Returns the path to all the files in a directory as a list"""
-        for dirpath, _, filenames in os.walk(self.options['path']):
-            for filename in filenames:
-                fullpath = os.path.join(dirpath, filename)
-                base_dir_ind = self._test_string_start(fullpath)
-                if not base_dir_ind:
-                    self.path_collection.append(fullpath)
+        for fullpath in self.iterPaths():
+            self.path_collection.append(fullpath)
 
         return self.path_collection
 
+    def iterPaths(self, workers=None):
+        """ Generator yielding the path to each file as it is found. Built on os.scandir, ignored
+            directories are pruned before being descended into and nothing is collected.
+            workers > 1 (default options['workers']) scans directories on a thread pool, see
+            _scan_parallel.
+        """
+        workers = self.options['workers'] if workers is None else workers
+        if workers and workers > 1:
+            for entry in self._scan_parallel(workers, False):
+                yield entry.path
+        else:
+            for entry in self._scan():
+                yield entry.path
+
+    def iterEntries(self, workers=None):
+        """ Generator as iterPaths, but yields diskentry records carrying size, mtime, inode &
+            mode captured at walk time. Files vanishing during the walk are skipped.
+        """
+        workers = self.options['workers'] if workers is None else workers
+        if workers and workers > 1:
+            yield from self._scan_parallel(workers, True)
+            return
+
+        for entry in self._scan():
+            try:
+                yield diskentry.from_direntry(entry)
+            except OSError:
+                if self.options['dbg']:
+                    print("unable to stat %s" % (entry.path))
+
+    def _scan(self):
+        """ Core walk: yields os.DirEntry for every non directory entry, pruning ignored dirs """
+        matcher = self._ignore_matcher()
+        stack = [self.options['path']]
+        while stack:
+            files, subdirs = self._read_dir(stack.pop(), matcher)
+            yield from files
+            # reversed so that subdirectories are visited in scandir order (as os.walk)
+            stack.extend(reversed(subdirs))
+
+    def _read_dir(self, dirpath, matcher):
+        """ Reads a single directory, returns (files, subdirs) in scandir order: os.DirEntry of
+            the non directory entries & paths of the subdirectories to descend into (ignored
+            entries and symlinked directories left out)
+        """
+        files, subdirs = [], []
+        try:
+            with os.scandir(dirpath) as it:
+                for entry in it:
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+
+                    if matcher and matcher.match(entry.path, is_dir):
+                        if self.options['dbg'] and is_dir:
+                            print("excluding subdir %s" % (entry.path))
+                    elif not is_dir:
+                        files.append(entry)
+                    elif not entry.is_symlink():
+                        subdirs.append(entry.path)
+        except OSError as err:
+            if self.options['dbg']:
+                print("unable to scan %s: %s" % (dirpath, err.strerror))
+        return files, subdirs
+
+    def _scan_dir(self, dirpath, matcher, records):
+        """ _read_dir for the pool: files & subdirs sorted by name, files as diskentry records
+            (stat taken here, on the worker thread) when records is True
+        """
+        files, subdirs = self._read_dir(dirpath, matcher)
+        if records:
+            entries = []
+            for entry in files:
+                try:
+                    entries.append(diskentry.from_direntry(entry))
+                except OSError:
+                    if self.options['dbg']:
+                        print("unable to stat %s" % (entry.path))
+            files = entries
+
+        files.sort(key=lambda x: x.path)
+        subdirs.sort()
+        return files, subdirs
+
+    def _scan_parallel(self, workers, records, ahead=4):
+        """ Walk fanning directory scans (readdir + stat, network round trips on CIFS/NFS) out over
+            a bounded thread pool. Results are consumed depth first in name order, so output is
+            deterministic (sorted); only the next ahead * workers directories of that order are
+            scanned in advance, so memory stays that of the serial walk however large the tree.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        matcher = self._ignore_matcher()
+        limit = max(1, ahead * workers)
+        pool = ThreadPoolExecutor(max_workers=workers)
+        try:
+            # [path, future or None], the next directory to consume on top
+            stack = [[self.options['path'], None]]
+            while stack:
+                for itm in stack[-1:-limit - 1:-1]:
+                    if itm[1] is None:
+                        itm[1] = pool.submit(self._scan_dir, itm[0], matcher, records)
+                files, subdirs = stack.pop()[1].result()
+                stack.extend([[itm, None] for itm in reversed(subdirs)])
+                for entry in files:
+                    yield entry
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def saveSnapshot(self, manifest):
+        """ Walks the tree and records path, size, mtime & inode of every file in the sqlite
+            manifest (keyed by options['path'], so one manifest may hold several trees).
+            Returns the number of files recorded
+        """
+        return self._update_manifest(manifest, report=False)['count']
+
+    def changedSince(self, manifest, update=True):
+        """ Returns dict of sorted path lists 'added', 'modified' & 'removed' relative to the
+            snapshot held in manifest (all files are 'added' if none exists). When update the
+            manifest is moved forward to the current state, writing only the changed rows
+        """
+        rslt = self._update_manifest(manifest, report=True, update=update)
+        del rslt['count']
+        return rslt
+
+    def _update_manifest(self, manifest, report=True, update=True):
+        """ Streams the walk into a temp table and diffs it against the stored snapshot in SQL, so
+            memory is bounded by the size of the change set rather than the tree
+        """
+        import sqlite3
+        root = os.path.normpath(self.options['path'])
+        con = sqlite3.connect(manifest)
+        try:
+            con.execute("CREATE TABLE IF NOT EXISTS entries (root TEXT NOT NULL, "
+                        "path TEXT NOT NULL, size INTEGER, mtime REAL, inode INTEGER, "
+                        "PRIMARY KEY (root, path)) WITHOUT ROWID")
+            con.execute("CREATE TEMP TABLE scan (path TEXT PRIMARY KEY, size INTEGER, "
+                        "mtime REAL, inode INTEGER) WITHOUT ROWID")
+            con.executemany("INSERT OR REPLACE INTO scan VALUES (?, ?, ?, ?)",
+                            ((ent.path, ent.size, ent.mtime, ent.inode)
+                             for ent in self.iterEntries()))
+
+            rslt = {'added': [], 'modified': [], 'removed': [],
+                    'count': con.execute("SELECT COUNT(*) FROM scan").fetchone()[0]}
+            if report:
+                rslt['added'] = [itm[0] for itm in con.execute(
+                    "SELECT s.path FROM scan s LEFT JOIN entries e ON e.root = ? AND "
+                    "e.path = s.path WHERE e.path IS NULL ORDER BY s.path", (root,))]
+                rslt['modified'] = [itm[0] for itm in con.execute(
+                    "SELECT s.path FROM scan s JOIN entries e ON e.root = ? AND e.path = s.path "
+                    "WHERE s.size != e.size OR s.mtime != e.mtime OR s.inode != e.inode "
+                    "ORDER BY s.path", (root,))]
+                rslt['removed'] = [itm[0] for itm in con.execute(
+                    "SELECT e.path FROM entries e WHERE e.root = ? AND NOT EXISTS "
+                    "(SELECT 1 FROM scan s WHERE s.path = e.path) ORDER BY e.path", (root,))]
+
+            if update:
+                con.execute("DELETE FROM entries WHERE root = ? AND NOT EXISTS "
+                            "(SELECT 1 FROM scan s WHERE s.path = entries.path)", (root,))
+                con.execute("INSERT OR REPLACE INTO entries SELECT ?, s.path, s.size, s.mtime, "
+                            "s.inode FROM scan s LEFT JOIN entries e ON e.root = ? AND "
+                            "e.path = s.path WHERE e.path IS NULL OR s.size != e.size OR "
+                            "s.mtime != e.mtime OR s.inode != e.inode", (root, root))
+                con.commit()
+        finally:
+            con.close()
+
+        if self.options['dbg'] and report:
+            print("%d added, %d modified, %d removed" % (
+                len(rslt['added']), len(rslt['modified']), len(rslt['removed'])))
+        return rslt
+
+    def diskUsage(self, top=10, sort_key='bytes', workers=None):
+        """ du in one walk (ignore honoured). Returns dict with totals (files, bytes), elapsed &
+            rate of the walk itself (to spot slow mounts), dirs -- per directory cumulative
+            bytes / files sorted by sort_key ('bytes' / 'files' descending, 'path' ascending) --
+            and the top largest (size, path) files
+        """
+        if sort_key not in ('bytes', 'files', 'path'):
+            raise ValueError("sort_key must be bytes, files or path")
+        start = time.perf_counter()
+        direct = {}
+        largest = []
+        for ent in self.iterEntries(workers):
+            dirpath = os.path.dirname(ent.path)
+            tot = direct.get(dirpath)
+            if tot is None:
+                tot = direct[dirpath] = [0, 0]
+            tot[0] = tot[0] + ent.size
+            tot[1] = tot[1] + 1
+            if top:
+                if len(largest) < top:
+                    heapq.heappush(largest, (ent.size, ent.path))
+                elif ent.size > largest[0][0]:
+                    heapq.heapreplace(largest, (ent.size, ent.path))
+        elapsed = time.perf_counter() - start
+
+        # roll direct totals up into every ancestor below (and including) the root
+        root = self.options['path'].rstrip(os.sep) or os.sep
+        totals = {root: [0, 0]}
+        for dirpath, (size, count) in direct.items():
+            cur_dir = dirpath
+            while True:
+                tot = totals.get(cur_dir)
+                if tot is None:
+                    tot = totals[cur_dir] = [0, 0]
+                tot[0] = tot[0] + size
+                tot[1] = tot[1] + count
+                if len(cur_dir) <= len(root):
+                    break
+                cur_dir = os.path.dirname(cur_dir)
+
+        dirs = [{'path': key, 'bytes': val[0], 'files': val[1]} for key, val in totals.items()]
+        if sort_key == 'path':
+            dirs.sort(key=lambda x: x['path'])
+        else:
+            dirs.sort(key=lambda x: (-x[sort_key], x['path']))
+        files, size = totals[root][1], totals[root][0]
+        if self.options['dbg']:
+            print("%s: %d files, %d bytes walked in %.3fs" % (root, files, size, elapsed))
+        return {'path': root, 'files': files, 'bytes': size, 'elapsed': elapsed,
+                'files_per_sec': files / elapsed if elapsed > 0 else 0.0, 'dirs': dirs,
+                'largest': sorted(largest, reverse=True)}
+
     def enumerateFiles(self):
         """Returns all the files in a directory as a list"""
         file_collection = []
@@ -51,13 +500,14 @@ class diskwalk():
     def enumerateDir(self):
         """Returns all the directories in a directory as a list"""
         dir_collection = []
+        matcher = self._ignore_matcher()
         for dirpath, dirnames, _ in os.walk(self.options['path']):
-            base_dir_ind = self._test_string_start(dirpath)
+            base_dir_ind = bool(matcher) and matcher.match_tree(dirpath, True)
 
-            if dirpath not in self.options['ignore'] and not base_dir_ind:
+            if not base_dir_ind:
                 for dir1 in dirnames:
                     dir_fnl = os.sep.join([dirpath, dir1])
-                    if dir_fnl not in self.options['ignore']:
+                    if not matcher.match(dir_fnl, True):
                         dir_collection.append(dir_fnl)
                     else:
                         if 'dbg' in self.options and self.options['dbg']:
@@ -67,51 +517,89 @@ class diskwalk():
                     print("excluding subdir %s" % (dirpath))
         return dir_collection
 
-    def cleanseDir(self, dryrun=True):
-        ''' Removes files eeting criteria specficed in options['delete'] '''
-        deletes = []
+    def cleanseDir(self, dryrun=True, workers=None):
+        ''' Removes files meeting criteria specified in options['delete']: 'filetype' (list of
+            extensions) and / or 'regex' (list of patterns searched for in the full path).
+            Files are unlinked on a thread pool when workers (default options['workers']) > 1.
+            Returns summary dict: files & bytes reclaimed (or that would be on dryrun), failed
+        '''
+        summary = {'files': 0, 'bytes': 0, 'failed': [], 'dryrun': dryrun}
+        criteria = self.options['delete'] if 'delete' in self.options.keys() else None
+        filetypes = set()
+        regex = None
+        if isinstance(criteria, dict):
+            if 'filetype' in criteria.keys() and isinstance(criteria['filetype'], list):
+                filetypes = set([str(itm).lstrip('.') for itm in criteria['filetype']])
+            if 'regex' in criteria.keys() and isinstance(criteria['regex'], list) and\
+                    criteria['regex']:
+                regex = re.compile('|'.join(['(?:%s)' % (itm) for itm in criteria['regex']]))
 
-        if 'delete' in self.options.keys() and isinstance(self.options['delete'], dict):
-            if not self.path_collection:
-                self.enumeratePaths()
+        if not filetypes and regex is None:
+            if self.options['dbg']:
+                print("No files queued for deletion as NO criteria were specified ")
+            return summary
 
-            if 'filetype' in self.options['delete'].keys() and\
-                    isinstance(self.options['delete']['filetype'], list):
+        def test_delete(itm):
+            return (filetypes and os.path.splitext(itm)[1][1:] in filetypes) or\
+                (regex is not None and regex.search(itm) is not None)
 
-                for itm in self.path_collection:
-                    itm_list = itm.split('.')
-                    if itm_list[-1] in self.options['delete']['filetype']:
+        # sizes recorded during the walk when we do it ourselves, otherwise stat'ed on removal
+        deletes = {}
+        if not self.path_collection:
+            for ent in self.iterEntries():
+                self.path_collection.append(ent.path)
+                if test_delete(ent.path):
+                    deletes[ent.path] = ent.size
+        else:
+            for itm in self.path_collection:
+                if test_delete(itm):
+                    deletes[itm] = None
 
-                        deletes.append(itm)
-                        if dryrun:
-                            print("D: dryrun deletion of %s" % (itm))
-                        else:
-                            os.remove(itm)
+        if not deletes:
+            return summary
+        if self.options['dbg']:
+            print("%s Files are queued for deletion" % (len(deletes)))
 
+        workers = self.options['workers'] if workers is None else workers
+        if workers and workers > 1:
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                rslts = list(pool.map(_remove_file, deletes.keys(), deletes.values(),
+                                      [dryrun] * len(deletes)))
+        else:
+            rslts = [_remove_file(itm, size, dryrun) for itm, size in deletes.items()]
 
-            if deletes:
+        removed = set()
+        for itm, size, err in rslts:
+            if err is None:
+                removed.add(itm)
+                summary['files'] = summary['files'] + 1
+                summary['bytes'] = summary['bytes'] + size
+            else:
+                summary['failed'].append(itm)
                 if self.options['dbg']:
-                    print("%s Files are queued for deletion" % (len(deletes)))
-
-                for itm in deletes:
-                    self.path_collection.remove(itm)
-
+                    print("unable to delete %s: %s" % (itm, err))
 
-                # here -- need remove file + calculate statistics
-        else:
-            if self.options['dbg']:
-                print("No files queued for deletion as NO criteria were specified ")
+        self.path_collection = [itm for itm in self.path_collection if itm not in removed]
+        if self.options['dbg']:
+            print("%s%d files, %d bytes reclaimed, %d failed" % (
+                "D: dryrun " if dryrun else "", summary['files'], summary['bytes'],
+                len(summary['failed'])))
+        return summary
 
+    def _ignore_matcher(self):
+        """ Returns options['ignore'] compiled as an ignore_matcher, recompiled only if changed """
+        ignore = self.options['ignore']
+        patterns = tuple(ignore) if isinstance(ignore, (list, tuple)) else ()
+        if self._matcher is None or self._matcher.patterns != patterns or\
+                self._matcher.root != self.options['path'].rstrip(os.sep) + os.sep:
+            self._matcher = ignore_matcher(patterns, self.options['path'])
+        return self._matcher
 
-    def _test_string_start(self, init_str):
-        ''' relies on string method startswith to determine whether directory or file path is
-            amongst ignored directories. Returns true if directory or file path s amongst
-            ignored directories.
+    def _test_string_start(self, init_str, is_dir=False):
+        ''' Returns true if directory or file path (or one of its parents) is amongst ignored
+            directories / patterns. Literal absolute entries are tested as prefixes as before, see
+            ignore_matcher for the remaining pattern forms.
         '''
-        base_dir_ind = False
-        if isinstance(self.options['ignore'], list) and self.options['ignore']:
-            for itm in self.options['ignore']:
-                if init_str.startswith(itm):
-                    base_dir_ind = True
-                    break
-        return base_dir_ind
+        matcher = self._ignore_matcher()
+        return bool(matcher) and matcher.match_tree(init_str, is_dir)
@@ -0,0 +1,312 @@
+#!/usr/bin/python3
+""" Diskwatch Class -- keeps diskwalk results live using Linux inotify (via ctypes) """
+import os
+import errno
+import select
+import struct
+import threading
+import ctypes
+import ctypes.util
+import diskwalk_api as dwa
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE |\
+    IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR | IN_DONT_FOLLOW
+_EVENT = struct.Struct("iIII")
+
+_libc = None
+
+
+def _load_libc():
+    """ loads libc inotify entry points, raises OSError where unavailable (non Linux) """
+    global _libc
+    if _libc is None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError(errno.ENOSYS, "inotify unavailable")
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        _libc = libc
+    return _libc
+
+
+class diskwatch():
+    """ Long lived watch over a diskwalk tree. After start() the current file set and the
+        set of changes since the last call are kept up to date by a background thread, so
+        paths() / changes() need no walk. An inotify queue overflow (or a manual rescan())
+        falls back to a full walk, diffed against the known set.
+        Accepts the same str / dict options as diskwalk (ignore is honoured).
+    """
+
+    def __init__(self, path):
+        self.walker = dwa.diskwalk(path)
+        self.options = self.walker.options
+        self.complete = True
+        self.overflows = 0
+        self._lock = threading.Lock()
+        self._paths = set()
+        self._frozen = None
+        self._changes = self._new_changes()
+        # wd -> dir & the reverse, plus per directory files / watched subdirectories so a
+        # removed directory only costs the size of its subtree
+        self._wds = {}
+        self._dir_wds = {}
+        self._files = {}
+        self._subdirs = {}
+        self._matcher = None
+        self._fd = -1
+        self._thread = None
+        self._wake_r, self._wake_w = -1, -1
+
+    @staticmethod
+    def _new_changes():
+        return {'added': set(), 'modified': set(), 'removed': set()}
+
+    def start(self):
+        """ initial walk + watches, then starts background event thread """
+        libc = _load_libc()
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self._wake_r, self._wake_w = os.pipe()
+        self._matcher = self.walker._ignore_matcher()
+
+        with self._lock:
+            self._add_tree(self.options['path'])
+            self._changes = self._new_changes()
+
+        self._thread = threading.Thread(target=self._run, name="diskwatch", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """ stops event thread and releases the inotify descriptor """
+        if self._thread is not None:
+            os.write(self._wake_w, b"x")
+            self._thread.join()
+            self._thread = None
+        for fd in (self._fd, self._wake_r, self._wake_w):
+            if fd >= 0:
+                os.close(fd)
+        self._fd, self._wake_r, self._wake_w = -1, -1, -1
+        self._wds = {}
+        self._dir_wds = {}
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def paths(self):
+        """ Returns current file set (frozenset, rebuilt only after changes) """
+        with self._lock:
+            if self._frozen is None:
+                self._frozen = frozenset(self._paths)
+            return self._frozen
+
+    def changes(self, reset=True):
+        """ Returns dict of 'added', 'modified' & 'removed' path sets since the last reset """
+        with self._lock:
+            rslt = self._changes
+            if reset:
+                self._changes = self._new_changes()
+            else:
+                rslt = {key: set(val) for key, val in rslt.items()}
+        return rslt
+
+    def rescan(self, conservative=False):
+        """ Full walk re-establishing watches, differences to the known set are recorded as
+            changes. conservative (used after a queue overflow, when events were lost) also marks
+            every surviving file as modified
+        """
+        with self._lock:
+            old = self._paths
+            saved = self._changes
+            self._changes = self._new_changes()
+            self._paths = set()
+            self._files = {}
+            self._subdirs = {}
+            self._add_tree(self.options['path'])
+            self._changes = saved
+            for itm in self._paths - old:
+                self._record(itm, 'added')
+            for itm in old - self._paths:
+                self._record(itm, 'removed')
+            if conservative:
+                for itm in self._paths & old:
+                    self._record(itm, 'modified')
+
+    def _record(self, path, kind):
+        """ records change folding add/remove pairs (lock held) """
+        changes = self._changes
+        if kind == 'added':
+            if path in changes['removed']:
+                changes['removed'].discard(path)
+                changes['modified'].add(path)
+            else:
+                changes['added'].add(path)
+        elif kind == 'removed':
+            changes['modified'].discard(path)
+            if path in changes['added']:
+                changes['added'].discard(path)
+            else:
+                changes['removed'].add(path)
+        elif path not in changes['added']:
+            changes['modified'].add(path)
+
+    def _add_watch(self, dirpath):
+        wd = _libc.inotify_add_watch(self._fd, os.fsencode(dirpath), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err == errno.ENOSPC:
+                self.complete = False
+            if self.options['dbg']:
+                print("unable to watch %s: %s" % (dirpath, os.strerror(err)))
+            return False
+        self._wds[wd] = dirpath
+        self._dir_wds[dirpath] = wd
+        return True
+
+    def _add_file(self, dirpath, path):
+        """ adds path (file in watched dirpath) recording it as added, False if already known
+            (lock held)
+        """
+        if path in self._paths:
+            return False
+        self._paths.add(path)
+        self._files.setdefault(dirpath, set()).add(path)
+        self._frozen = None
+        self._record(path, 'added')
+        return True
+
+    def _discard_file(self, dirpath, path):
+        """ forgets path (file in watched dirpath) recording it as removed (lock held) """
+        if path in self._paths:
+            self._paths.discard(path)
+            files = self._files.get(dirpath)
+            if files is not None:
+                files.discard(path)
+            self._frozen = None
+            self._record(path, 'removed')
+
+    def _add_tree(self, dirpath, parent=None):
+        """ watches dirpath & subdirectories and adds their files (lock held). Watch is added
+            before listing so nothing created in between is missed. parent is the watched
+            directory holding dirpath (None for the root)
+        """
+        stack = [(dirpath, parent)]
+        while stack:
+            cur_dir, cur_parent = stack.pop()
+            if not self._add_watch(cur_dir):
+                continue
+            if cur_parent is not None:
+                self._subdirs.setdefault(cur_parent, set()).add(cur_dir)
+            try:
+                with os.scandir(cur_dir) as it:
+                    for entry in it:
+                        try:
+                            is_dir = entry.is_dir()
+                        except OSError:
+                            is_dir = False
+                        if self._matcher and self._matcher.match(entry.path, is_dir):
+                            continue
+                        if is_dir:
+                            if not entry.is_symlink():
+                                stack.append((entry.path, cur_dir))
+                        else:
+                            self._add_file(cur_dir, entry.path)
+            except OSError:
+                pass
+        self._frozen = None
+
+    def _drop_tree(self, dirpath, parent=None):
+        """ forgets files & watches below a removed / moved away directory (lock held), visiting
+            only that subtree
+        """
+        if parent is not None and parent in self._subdirs:
+            self._subdirs[parent].discard(dirpath)
+        stack = [dirpath]
+        while stack:
+            cur_dir = stack.pop()
+            for itm in self._files.pop(cur_dir, ()):
+                self._paths.discard(itm)
+                self._record(itm, 'removed')
+            stack.extend(self._subdirs.pop(cur_dir, ()))
+            wd = self._dir_wds.pop(cur_dir, None)
+            if wd is not None:
+                _libc.inotify_rm_watch(self._fd, wd)
+                self._wds.pop(wd, None)
+        self._frozen = None
+
+    def _run(self):
+        while True:
+            ready, _, _ = select.select([self._fd, self._wake_r], [], [])
+            if self._wake_r in ready:
+                return
+            try:
+                buf = os.read(self._fd, 65536)
+            except BlockingIOError:
+                continue
+            if self._handle(buf):
+                self.overflows = self.overflows + 1
+                if self.options['dbg']:
+                    print("inotify queue overflow, rescanning %s" % (self.options['path']))
+                self.rescan(conservative=True)
+
+    def _handle(self, buf):
+        """ applies buffer of inotify events, returns True if the queue overflowed """
+        overflow = False
+        offset = 0
+        with self._lock:
+            while offset < len(buf):
+                wd, mask, _, name_len = _EVENT.unpack_from(buf, offset)
+                name = buf[offset + _EVENT.size:offset + _EVENT.size + name_len].rstrip(b"\0")
+                offset = offset + _EVENT.size + name_len
+
+                if mask & IN_Q_OVERFLOW:
+                    overflow = True
+                    continue
+                if mask & IN_IGNORED:
+                    path = self._wds.pop(wd, None)
+                    if path is not None and self._dir_wds.get(path) == wd:
+                        del self._dir_wds[path]
+                    continue
+                dirpath = self._wds.get(wd)
+                if dirpath is None or not name:
+                    continue
+
+                path = os.sep.join([dirpath, os.fsdecode(name)])
+                is_dir = bool(mask & IN_ISDIR)
+                if self._matcher and self._matcher.match(path, is_dir):
+                    continue
+
+                if is_dir:
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        self._add_tree(path, dirpath)
+                    elif mask & (IN_DELETE | IN_MOVED_FROM):
+                        self._drop_tree(path, dirpath)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    self._discard_file(dirpath, path)
+                elif mask & (IN_CREATE | IN_MOVED_TO | IN_CLOSE_WRITE | IN_ATTRIB):
+                    if not self._add_file(dirpath, path):
+                        self._record(path, 'modified')
+        return overflow
@@ -0,0 +1,133 @@
+#!/usr/bin/python3
+""" Command line utility (and API) reporting duplicate files below a directory. Candidates are
+narrowed in stages -- size, head/tail sample hash, full (cached) hash -- so as few bytes as
+possible are read.
+"""
+import json
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import diskwalk_api as dwa
+import diskhash_api as dha
+
+SAMPLE_SIZE = 64 * 1024
+
+
+def partial_hash(path, size, sample=SAMPLE_SIZE):
+    """ BLAKE2b of the first & last sample bytes (whole file if size <= 2 * sample) """
+    digest = hashlib.blake2b(digest_size=16)
+    try:
+        with open(path, "rb") as fp:
+            digest.update(fp.read(sample))
+            if size > sample:
+                fp.seek(max(sample, size - sample))
+                digest.update(fp.read(sample))
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+def _regroup(groups, key_func, pool):
+    """ splits each candidate group by key_func(entry) evaluated on pool, drops singletons """
+    rslt = []
+    for group in groups:
+        split = {}
+        for ent, key in zip(group, pool.map(key_func, group)):
+            if key is not None:
+                split.setdefault(key, []).append(ent)
+        rslt.extend([(key, itm) for key, itm in split.items() if len(itm) > 1])
+    return rslt
+
+
+def find_duplicates(path, cache=None, workers=4, min_size=1, sample=SAMPLE_SIZE, dbg=False):
+    """ Returns report dict: groups (size, digest, paths, reclaimable) ordered by reclaimable
+        bytes, plus totals. path is anything diskwalk accepts (str or options dict). Hardlinks
+        to an already seen (device, inode) are not reported as duplicates.
+    """
+    walker = dwa.diskwalk(path)
+    by_size = {}
+    seen_inodes = set()
+    scanned = 0
+    for ent in walker.iterEntries():
+        if not ent.is_file() or ent.size < min_size:
+            continue
+        scanned = scanned + 1
+        if (ent.dev, ent.inode) in seen_inodes:
+            continue
+        seen_inodes.add((ent.dev, ent.inode))
+        by_size.setdefault(ent.size, []).append(ent)
+    del seen_inodes
+
+    groups = [itm for itm in by_size.values() if len(itm) > 1]
+    del by_size
+    report = {'scanned': scanned, 'size_candidates': sum([len(itm) for itm in groups])}
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        groups = _regroup(groups, lambda ent: partial_hash(ent.path, ent.size, sample), pool)
+        report['sample_candidates'] = sum([len(itm) for _, itm in groups])
+
+        # samples cover small files entirely, only larger ones need their full content hashed
+        final = [(key, itm) for key, itm in groups if itm[0].size <= 2 * sample]
+        large = [itm for _, itm in groups if itm[0].size > 2 * sample]
+
+    with dha.diskhash(cache, workers=workers, dbg=dbg) as hasher:
+        split = {}
+        for ent, digest in hasher.hashEntries([ent for itm in large for ent in itm]):
+            if digest is not None:
+                split.setdefault((ent.size, digest), []).append(ent)
+        final.extend([(key[1], itm) for key, itm in split.items() if len(itm) > 1])
+        report['bytes_hashed'] = hasher.stats['bytes']
+
+    report['groups'] = []
+    for key, itm in final:
+        size = itm[0].size
+        report['groups'].append({'size': size, 'digest': key,
+                                 'paths': sorted([ent.path for ent in itm]),
+                                 'reclaimable': size * (len(itm) - 1)})
+    report['groups'].sort(key=lambda x: (-x['reclaimable'], x['paths'][0]))
+    report['duplicates'] = sum([len(itm['paths']) - 1 for itm in report['groups']])
+    report['reclaimable'] = sum([itm['reclaimable'] for itm in report['groups']])
+    return report
+
+
+def print_report(report, limit=None):
+    """ prints duplicate groups (largest reclaimable first) followed by totals """
+    for itm in report['groups'][:limit]:
+        print("%d bytes x %d (%d reclaimable)" % (itm['size'], len(itm['paths']),
+                                                   itm['reclaimable']))
+        for path in itm['paths']:
+            print("    " + path)
+    print("%d files scanned, %d duplicates in %d groups, %d bytes reclaimable" % (
+        report['scanned'], report['duplicates'], len(report['groups']), report['reclaimable']))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Duplicate file finder"
+    )
+
+    parser.add_argument("-c", "--cache", default=None, type=str,
+                        help="sqlite hash cache (reused between runs)")
+    parser.add_argument("-i", "--ignore", default="", type=str,
+                        help="comma separated ignore patterns (rsync style)")
+    parser.add_argument("-j", "--json", default=None, type=str,
+                        help="write report as JSON to file")
+    parser.add_argument("-l", "--limit", default=None, type=int,
+                        help="number of groups to print")
+    parser.add_argument("-m", "--min_size", default=1, type=int,
+                        help="ignore files smaller than min_size bytes")
+    parser.add_argument("-s", "--src", type=str, required=True,
+                        help="directory to search")
+    parser.add_argument("-v", "--verbose", default=0, type=int)
+    parser.add_argument("-w", "--workers", default=4, type=int)
+
+    args = parser.parse_args()
+
+    options = {'path': args.src, 'dbg': args.verbose > 0,
+               'ignore': [itm for itm in args.ignore.split(",") if itm]}
+    rslt = find_duplicates(options, cache=args.cache, workers=args.workers,
+                           min_size=args.min_size, dbg=args.verbose > 0)
+    if args.json:
+        with open(args.json, "w") as fp:
+            json.dump(rslt, fp, indent=4)
+    print_report(rslt, args.limit)
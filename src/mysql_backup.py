@@ -4,7 +4,6 @@ month.
 """
 import os
 import json
-import subprocess as subp
 import shutil as sh
 import argparse
 
@@ -14,24 +13,22 @@ import debug_control as dbc
 import backup_utility as bu
 
 
+@dbc.span("mysql_backup_call")
 def mysql_backup_call(command_list, dest, dbg=False):
-    """ Key function that calls mysqldump to (or user specified) function to backup database"""
+    """ Key function that calls mysqldump to (or user specified) function to backup database
+    dump goes straight to dest, stderr is streamed into the debug log as it arrives"""
 
-    file_ptr = open(dest, "a")
-
-    call_rslt = subp.run(
-        command_list, stdout=file_ptr, stderr=subp.PIPE, stdin=subp.PIPE
-    )
-    if call_rslt.returncode != 0:
-        dbc.error_helper("MySQL Backup Error:", call_rslt.stderr, post=None, dbg=dbg)
+    with open(dest, "a") as file_ptr:
+        returncode, err = dbc.stream_process(command_list, "mysqldump", dbg=dbg,
+                                             stdout=file_ptr)
+    dbc.span_add(path=dest, returncode=returncode)
+    if returncode != 0:
+        dbc.error_helper("MySQL Backup Error:", err, post=None, dbg=dbg)
 
     else:
-        if call_rslt.stdout is not None:
-            dbc.print_helper(("Successful MySQL  Backup" + call_rslt.stdout), dbg)
-        else:
-            out_str = "--".join(["Successful MySQL Backup", " ".join(command_list)])
-            dbc.print_helper(out_str, dbg)
-    file_ptr.close()
+        dbc.span_add(files=1, nbytes=os.path.getsize(dest))
+        out_str = "--".join(["Successful MySQL Backup", " ".join(command_list)])
+        dbc.print_helper(out_str, dbg)
 
 
 if __name__ == "__main__":
@@ -39,12 +36,20 @@ if __name__ == "__main__":
         description="Initial MySQL Schema Backup tool"
     )
 
+    parser.add_argument("-a", "--repository", default=None, type=str,
+                        help="deduplicating repository directory used instead of archives")
     parser.add_argument(
         "-b", "--backup_dir", default="/mnt/droboP/backups/MySQL", type=str
     )
+    parser.add_argument("-c", "--codec", default="gzip", type=str,
+                        help="archive codec gzip, bz2, xz or zstd")
     parser.add_argument("-f", "--debug_file", type=str)
+    parser.add_argument("-g", "--log_format", default="text", type=str,
+                        help="debug file format text or json (one record per line)")
     parser.add_argument("-i", "--db_host_ip", default="127.0.0.1", type=str,
                         help="IP address of server where MySQL DB operates -- def: 127.0.0.1")
+    parser.add_argument("-j", "--jobs", default=0, type=int,
+                        help="compression threads for the tar.gz (0 / 1 single threaded)")
 
     parser.add_argument(
         "-l", "--items", default="example,introSQL,intermedSQL,Investing,jobsearch", type=str,
@@ -53,11 +58,17 @@ if __name__ == "__main__":
     parser.add_argument("-n", "--tool", default="/usr/bin/mysqldump", type=str)
     parser.add_argument("-o", "--options", default=None, type=str)
     parser.add_argument("-p", "--password", type=str)
+    parser.add_argument("-r", "--incremental", default=0, type=int,
+                        help="incremental archives, full archive every N runs (0 always full)")
 
     parser.add_argument("-u", "--user", default="spennington", type=str)
     parser.add_argument("-v", "--verbose", default=0, type=int)
     parser.add_argument("-w", "--temp_dir", default="/home/spennington/workspace", type=str,
                         help="Working directory where files are backed-up")
+    parser.add_argument("-x", "--profile", default=None, type=str,
+                        help="phase (span) to profile, cProfile stats written to <phase>.prof")
+    parser.add_argument("-z", "--level", default=None, type=int,
+                        help="compression level for codec (codec default if omitted)")
 
     args = parser.parse_args()
     args_dict = vars(args)
@@ -77,6 +88,11 @@ if __name__ == "__main__":
         else:
             if "verbose" not in args_dict.keys() and "debug_file" not in args_dict.keys():
                 args_dict["verbose"] = 0
+            elif "debug_file" in args_dict.keys():
+                args_dict["debug_file"] = bu.calc_debug_file(args_dict)
+
+        if "log_format" not in args_dict.keys():
+            args_dict["log_format"] = args.log_format
 
         if "items" in args_dict.keys() and isinstance(args_dict["items"], list):
             tables = args_dict["items"]
@@ -98,6 +114,10 @@ if __name__ == "__main__":
 
     dbg, print_dbg = bu.calc_debug_levels(args_dict)
 
+    profile = args_dict["profile"] if "profile" in args_dict.keys() else args.profile
+    if profile:
+        dbc.profile_span(profile)
+
     dest, dt_str = bu.calc_directory(args_dict["temp_dir"], dbg=dbg)
     if os.path.exists(dest):
         dbc.print_helper(("Directory Exists: " + dest + os.linesep), dbg=dbg)
@@ -112,13 +132,31 @@ if __name__ == "__main__":
         mysql_backup_call(backup_list, tbl_dest, dbg=dbg)
 
     os.chdir("../")
-    tarfilename, _ = bu.construct_gzip(args_dict["temp_dir"], dt_str, dbg=dbg)
+    jobs = args_dict["jobs"] if "jobs" in args_dict.keys() else args.jobs
+    codec = args_dict["codec"] if "codec" in args_dict.keys() else args.codec
+    level = args_dict["level"] if "level" in args_dict.keys() else args.level
+    incremental = args_dict["incremental"] if "incremental" in args_dict.keys() else\
+        args.incremental
+    repository = args_dict["repository"] if "repository" in args_dict.keys() else\
+        args.repository
+    if repository:
+        tarfilename = bu.construct_repository(args_dict["temp_dir"], dt_str, repository,
+                                              workers=jobs, codec=codec, level=level, dbg=dbg)
+    elif incremental > 0:
+        tarfilename, _ = bu.construct_incremental(args_dict["temp_dir"], dt_str,
+                                                  args_dict["backup_dir"], full_every=incremental,
+                                                  workers=jobs, codec=codec, level=level, dbg=dbg)
+    else:
+        tarfilename, _ = bu.construct_gzip(args_dict["temp_dir"], dt_str, workers=jobs,
+                                           codec=codec, level=level,
+                                           dest_dir=args_dict["backup_dir"], dbg=dbg)
     if tarfilename is not None:
-        base_str = "Moving " + tarfilename + " to " + args_dict["backup_dir"]
+        base_str = "Wrote " + tarfilename
         dbc.print_helper(base_str, dbg=dbg)
-        sh.move(tarfilename, args_dict["backup_dir"])
         sh.rmtree(dt_str)
 
     else:
         dbc.print_helper("tarfilename is None -- review tar process", dbg=dbg)
     # bu.apply_rsync(args.temp_dir, dest, "Back-up", dbg=dbg)
+    if not isinstance(dbg, dbc.debug_control):
+        dbc.report_spans(dbg)
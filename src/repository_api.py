@@ -0,0 +1,239 @@
+#!/usr/bin/python3
+""" Backup repository -- content addressed, deduplicated storage for backup snapshots """
+import os
+import json
+import time
+import hashlib
+import collections
+from concurrent.futures import ThreadPoolExecutor
+import diskwalk_api as dwa
+import compress_api as cpa
+
+MIN_CHUNK = 16 * 1024
+AVG_CHUNK = 64 * 1024
+MAX_CHUNK = 1024 * 1024
+READ_SIZE = 1024 * 1024
+
+
+# gear table of the rolling hash, derived from BLAKE2b so chunk boundaries (and with them chunk
+# ids) stay the same across runs & interpreters
+_GEAR = tuple([int.from_bytes(hashlib.blake2b(bytes([idx]), digest_size=8).digest(), "little")
+               for idx in range(256)])
+_HASH_MASK = (1 << 64) - 1
+_WINDOW = 64
+
+
+def _find_cut(buf, min_size, avg_size, max_size):
+    """ Returns length of the next chunk of buf (FastCDC). A 64 bit gear hash rolls over the
+        data, each byte shifting the previous ones one bit up so the top bits depend on the last
+        64 bytes alone; a chunk ends where the top bits are all zero. The first min_size bytes
+        are skipped (only the last window before it is hashed), up to avg_size one more bit than
+        log2(avg_size) must be zero, past it one less, which keeps sizes close to avg_size.
+        Without a boundary the chunk is cut at max_size
+    """
+    limit = min(len(buf), max_size)
+    if limit <= min_size:
+        return limit
+    normal = max(min(avg_size, limit), min_size)
+    bits = max(avg_size.bit_length() - 1, 2)
+    mask_small = ((1 << (bits + 1)) - 1) << (63 - bits)
+    mask_large = ((1 << (bits - 1)) - 1) << (65 - bits)
+    gear = _GEAR
+    hsh = 0
+    for byte in buf[max(0, min_size - _WINDOW):min_size]:
+        hsh = ((hsh << 1) + gear[byte]) & _HASH_MASK
+    idx = min_size
+    for byte in buf[min_size:normal]:
+        hsh = ((hsh << 1) + gear[byte]) & _HASH_MASK
+        idx = idx + 1
+        if not hsh & mask_small:
+            return idx
+    for byte in buf[normal:limit]:
+        hsh = ((hsh << 1) + gear[byte]) & _HASH_MASK
+        idx = idx + 1
+        if not hsh & mask_large:
+            return idx
+    return limit
+
+
+def iter_chunks(file_ptr, min_size=MIN_CHUNK, avg_size=AVG_CHUNK, max_size=MAX_CHUNK):
+    """ Generator yielding content defined chunks (bytes) read from binary file_ptr. Inserting or
+        deleting data (text or binary) only changes the chunks around the edit, the rest of a
+        file keeps its chunks (and chunk ids) from one backup to the next
+    """
+    buf = bytearray()
+    eof = False
+    while True:
+        while not eof and len(buf) < max_size:
+            data = file_ptr.read(READ_SIZE)
+            if data:
+                buf += data
+            else:
+                eof = True
+        if not buf:
+            return
+        cut = _find_cut(buf, min_size, avg_size, max_size)
+        yield bytes(buf[:cut])
+        del buf[:cut]
+
+
+class backup_repository():
+    """ Local content addressed repository. Files are split into content defined chunks, each
+        chunk is compressed and stored once under chunks/<id[:2]>/<id> (id = BLAKE2b of the raw
+        chunk). A backup is a small JSON index in snapshots/ listing every file with its chunk
+        ids, so unchanged data costs neither disk space nor writes. The codec is fixed when the
+        repository is created (config.json); compression & writes run on a pool of workers.
+    """
+
+    def __init__(self, path, codec="gzip", level=None, workers=0, dbg=False):
+        self.path = path
+        self.workers = max(1, workers)
+        self.dbg = dbg
+        self.chunk_dir = os.sep.join([path, "chunks"])
+        self.snapshot_dir = os.sep.join([path, "snapshots"])
+        self._known = set()
+
+        config_path = os.sep.join([path, "config.json"])
+        if os.path.exists(config_path):
+            with open(config_path, "r", encoding="utf-8") as file_ptr:
+                self.config = json.load(file_ptr)
+        else:
+            codec, level = cpa.calc_codec(codec, level)
+            self.config = {"version": 1, "codec": codec, "level": level,
+                           "chunker": [MIN_CHUNK, AVG_CHUNK, MAX_CHUNK]}
+            os.makedirs(self.chunk_dir, exist_ok=True)
+            os.makedirs(self.snapshot_dir, exist_ok=True)
+            with cpa.atomic_file(config_path) as out_ptr:
+                out_ptr.file.write(json.dumps(self.config, indent=4).encode("utf-8"))
+
+    def _chunk_path(self, chunk_id):
+        return os.sep.join([self.chunk_dir, chunk_id[:2], chunk_id])
+
+    def _has_chunk(self, chunk_id):
+        """ True when chunk_id is stored (or being stored) -- one stat per chunk not seen yet by
+            this repository object instead of listing the whole store
+        """
+        if chunk_id in self._known:
+            return True
+        if os.path.exists(self._chunk_path(chunk_id)):
+            self._known.add(chunk_id)
+            return True
+        return False
+
+    def _store_chunk(self, chunk_id, data):
+        """ compresses & durably writes one chunk, returns stored size """
+        path = self._chunk_path(chunk_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        comp = cpa.compress_bytes(data, self.config["codec"], self.config["level"])
+        with cpa.atomic_file(path) as out_ptr:
+            out_ptr.file.write(comp)
+        return len(comp)
+
+    def read_chunk(self, chunk_id):
+        """ Returns raw chunk content, verifying its id """
+        with open(self._chunk_path(chunk_id), "rb") as file_ptr:
+            data = cpa.decompress_bytes(file_ptr.read(), self.config["codec"])
+        if hashlib.blake2b(data, digest_size=32).hexdigest() != chunk_id:
+            raise ValueError("Corrupt chunk " + chunk_id)
+        return data
+
+    def backup(self, root, name, excluded_ending=None):
+        """ Stores every file below root (anything diskwalk accepts) as snapshot name
+        RETURNS :: snapshot index path, stats dict (files, bytes, chunks, new_chunks,
+            new_bytes -- compressed bytes written, elapsed)
+        """
+        start = time.time()
+        walker = dwa.diskwalk(root)
+        root_path = walker.options['path']
+        min_size, avg_size, max_size = self.config["chunker"]
+        excluded_final = set() if excluded_ending is None else set(excluded_ending)
+        index = {"name": name, "created": start, "source": root_path, "files": {}}
+        stats = {"files": 0, "bytes": 0, "chunks": 0, "new_chunks": 0, "new_bytes": 0}
+        pending = collections.deque()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for ent in walker.iterEntries():
+                _, init_splt = os.path.splitext(ent.path)
+                if not ent.is_file() or (init_splt != '' and init_splt in excluded_final):
+                    continue
+                chunks = []
+                with open(ent.path, "rb") as file_ptr:
+                    for data in iter_chunks(file_ptr, min_size, avg_size, max_size):
+                        chunk_id = hashlib.blake2b(data, digest_size=32).hexdigest()
+                        chunks.append(chunk_id)
+                        if not self._has_chunk(chunk_id):
+                            self._known.add(chunk_id)
+                            pending.append(pool.submit(self._store_chunk, chunk_id, data))
+                            stats["new_chunks"] = stats["new_chunks"] + 1
+                            while len(pending) > 4 * self.workers:
+                                stats["new_bytes"] = stats["new_bytes"] + pending.popleft().result()
+
+                rel = os.path.relpath(ent.path, root_path).replace(os.sep, "/")
+                index["files"][rel] = {"size": ent.size, "mtime": ent.mtime,
+                                       "mode": ent.mode & 0o7777, "chunks": chunks}
+                stats["files"] = stats["files"] + 1
+                stats["bytes"] = stats["bytes"] + ent.size
+                stats["chunks"] = stats["chunks"] + len(chunks)
+
+            while pending:
+                stats["new_bytes"] = stats["new_bytes"] + pending.popleft().result()
+
+        # chunks are durable before the index referencing them is published
+        stats["elapsed"] = time.time() - start
+        index["stats"] = stats
+        snapshot = os.sep.join([self.snapshot_dir, name + ".json"])
+        with cpa.atomic_file(snapshot) as out_ptr:
+            out_ptr.file.write(json.dumps(index, separators=(",", ":")).encode("utf-8"))
+        if self.dbg:
+            print("snapshot %s: %d files, %d bytes, %d of %d chunks new (%d bytes written)" % (
+                name, stats["files"], stats["bytes"], stats["new_chunks"], stats["chunks"],
+                stats["new_bytes"]))
+        return snapshot, stats
+
+    def snapshots(self):
+        """ Returns sorted snapshot names """
+        return sorted([itm[:-5] for itm in os.listdir(self.snapshot_dir)
+                       if itm.endswith(".json") and not itm.startswith(".")])
+
+    def load_snapshot(self, name):
+        """ Returns snapshot index dict """
+        with open(os.sep.join([self.snapshot_dir, name + ".json"]), "r",
+                  encoding="utf-8") as file_ptr:
+            return json.load(file_ptr)
+
+    def restore(self, name, target_dir):
+        """ Recreates snapshot name below target_dir, returns number of files restored """
+        index = self.load_snapshot(name)
+        target = os.path.realpath(target_dir)
+        for rel, itm in index["files"].items():
+            path = os.path.realpath(os.sep.join([target, rel.replace("/", os.sep)]))
+            if not path.startswith(target + os.sep):
+                raise ValueError("Snapshot path escapes target: " + rel)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as file_ptr:
+                for chunk_id in itm["chunks"]:
+                    file_ptr.write(self.read_chunk(chunk_id))
+            os.chmod(path, itm["mode"])
+            os.utime(path, (itm["mtime"], itm["mtime"]))
+        return len(index["files"])
+
+    def remove_snapshot(self, name):
+        """ Deletes snapshot index (chunks are reclaimed by collect_garbage) """
+        os.remove(os.sep.join([self.snapshot_dir, name + ".json"]))
+
+    def collect_garbage(self):
+        """ Deletes chunks referenced by no snapshot, returns (chunks, bytes) removed """
+        used = set()
+        for name in self.snapshots():
+            for itm in self.load_snapshot(name)["files"].values():
+                used.update(itm["chunks"])
+
+        count = freed = 0
+        for ent in dwa.diskwalk(self.chunk_dir).iterEntries():
+            chunk_id = os.path.basename(ent.path)
+            if chunk_id not in used:
+                os.remove(ent.path)
+                count = count + 1
+                freed = freed + ent.size
+        self._known = set()
+        return count, freed
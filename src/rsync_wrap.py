@@ -1,11 +1,9 @@
 #!/usr/bin/python3
 """ Rsync wrapper intended to sync drives.
 """
-import subprocess as subp
 import os
 # import sys
 # import shutil as sh
-import datetime as dt
 # import tarfile
 # import zipfile as zp
 # import debug_control as dbc
@@ -17,6 +15,7 @@ import debug_control as dbc
 import backup_utility as bu
 
 
+@dbc.span("exec_rsync")
 def exec_rsync(opt, dbg=False, print_dbg=False):
     ''' executes calls to rsync '''
     if 'dest' not in opt.keys() or 'source' not in opt.keys():
@@ -45,8 +44,6 @@ def exec_rsync(opt, dbg=False, print_dbg=False):
             raise ValueError("Destination must be valid or constructable %s", dest)
 
     # copies files from src (init_base_dir) to dest (init_rslt_dir)
-    print_dbg = dbc.test_dbg(dbg)
-
     rsync_list = ["rsync"]
     for itm in ['base', 'delete', 'exclusion']:
         if itm in opt.keys() and opt[itm] and isinstance(opt[itm], (str, list)):
@@ -69,28 +66,12 @@ def exec_rsync(opt, dbg=False, print_dbg=False):
     dbc.print_helper(base_str, dbg)
 
     try:
-        call_rslt = subp.run(rsync_list, check=True, stdout=subp.PIPE, stderr=subp.PIPE)
-        if print_dbg:
-            if isinstance(dbg, bool):
-                base_time_str = dt.datetime.now()
-                print(
-                    "".join(
-                        [
-                            call_rslt.stdout.decode("UTF-8"),
-                            os.linesep,
-                            base_time_str.strftime("%Y/%m/%d %H:%M:%S"),
-                        ]
-                    )
-                )
-
-            else:
-                dbg.write_stdout(itm, call_rslt.stdout)
+        returncode, err = dbc.stream_process(rsync_list, itm, dbg=dbg)
+        if returncode != 0:
+            dbc.error_helper("RSYNC Error:", err, post=" ".join([str(returncode), "\n"]),
+                             dbg=dbg)
     except ValueError as v:
         dbc.error_helper("RSYNC Error:", v, post="", dbg=dbg)
-    except subp.CalledProcessError as c:
-        dbc.error_helper("RSYNC Error:", c.stderr,
-                         post=" ".join([c.output.decode("UTF-8"), str(c.returncode), "\n"]),
-                         dbg=dbg)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
@@ -5,7 +5,9 @@ month.
 import os
 import json
 # import shutil as sh
+import time
 import argparse
+import functools
 import shutil as sh
 import debug_control as dbc
 
@@ -44,13 +46,135 @@ def update_file(src, file_filter, day=1, split='.', dbg=False):
     else:
         dbc.print_helper("update_file created NO file", dbg=dbg)
 
-def update_files(src, dest, temp, excluded_ending=None, dbg=False):
+def _calc_append(dirpath, init_len, init_index=-1):
+    """ returns trailing part of dirpath (src basename onward) mirrored under dest & temp """
+    dir_split = str(dirpath).split(os.sep)
+    cur_len = len(dir_split)
+    cur_index = init_index + (init_len - cur_len)
+    return os.sep.join(dir_split[cur_index:]), cur_len, cur_index
+
+def plan_updates(src, dest, temp, excluded_ending=None, dbg=False):
+    """ walks src once and plans update_files without touching dest / temp. Returns dict:
+        mkdirs (parents first), copies [(src_file, temp_dir, cur_dir)] for new files,
+        compares [(dirpath, cur_dir, temp_dir, filename)] for files present in both, excluded
+    """
+    init_len = len(str(src).split(os.sep))
+    if excluded_ending is None:
+        excluded_final = set([".swo", ".swp", ".pyc", ".o", ".gz"])
+    else:
+        excluded_final = set(excluded_ending)
+
+    plan = {'mkdirs': [], 'copies': [], 'compares': [], 'excluded': 0}
+    planned = set()
+    for dirpath, _, filenames in os.walk(src):
+        cur_append, _, _ = _calc_append(dirpath, init_len)
+        cur_dir = os.sep.join([dest, cur_append])
+
+        not_empty = os.path.exists(cur_dir)
+        base_dest_set = set(os.listdir(cur_dir)) if not_empty else set()
+        if not not_empty:
+            plan['mkdirs'].append(cur_dir)
+
+        temp_dir = os.sep.join([temp, cur_append])
+        for filename in filenames:
+            _, init_splt = os.path.splitext(filename)
+            if init_splt != '' and init_splt in excluded_final:
+                dbc.print_helper(("Excluding " + filename), dbg=dbg)
+                plan['excluded'] = plan['excluded'] + 1
+                continue
+
+            if temp_dir not in planned and not os.path.exists(temp_dir):
+                plan['mkdirs'].append(temp_dir)
+            planned.add(temp_dir)
+            if filename in base_dest_set:
+                plan['compares'].append((dirpath, cur_dir, temp_dir, filename))
+            else:
+                plan['copies'].append((os.sep.join([dirpath, filename]), temp_dir, cur_dir))
+
+    return plan
+
+def _copy_new(src_file, temp_dir, cur_dir, log=False):
+    """ copies new file to temp & dest (pool task)
+        RETURNS :: "added" or "error", messages for the parent to log (empty unless log)
+    """
+    messages = []
+    try:
+        sh.copy(src_file, temp_dir)
+        sh.copy(src_file, cur_dir)
+    except OSError as err:
+        dbc.error_helper("Copy Error: " + str(err.strerror), stderr=None, post=src_file,
+                         dbg=messages if log else False)
+        return "error", messages
+    dbc.print_helper("Adding " + os.path.basename(src_file), dbg=messages if log else False)
+    return "added", messages
+
+def _compare_file(dirpath, cur_dir, temp_dir, filename, log=False):
+    """ calc_diff as pool task; the worker cannot write to the parent's debug file, so the
+        messages are collected and handed back
+        RETURNS :: calc_diff status, messages for the parent to log (empty unless log)
+    """
+    messages = []
+    status = bu.calc_diff(dirpath, cur_dir, temp_dir, filename,
+                          inc_backup=frozenset(["index.wiki"]), dbg=messages if log else False)
+    return status, messages
+
+def update_files_pipeline(src, dest, temp, excluded_ending=None, workers=None, dbg=False):
+    """ update_files as plan + execute: the tree is planned in one pass, directories created,
+        then comparisons / diff writes and new file copies run on a process pool.
+        RETURNS :: summary dict (dirs, added, identical, diff, error, excluded, elapsed)
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    start = time.perf_counter()
+    plan = plan_updates(src, dest, temp, excluded_ending=excluded_ending, dbg=dbg)
+    summary = {'dirs': 0, 'added': 0, 'identical': 0, 'diff': 0, 'error': 0,
+               'excluded': plan['excluded']}
+
+    for itm in plan['mkdirs']:
+        if not os.path.exists(itm):
+            os.makedirs(itm)
+            summary['dirs'] = summary['dirs'] + 1
+
+    # workers return their messages, written here through dbg (debug file or stdout)
+    log = dbc.test_dbg(dbg)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        rslts = []
+        if plan['compares']:
+            rslts.append(pool.map(functools.partial(_compare_file, log=log),
+                                  *zip(*plan['compares']), chunksize=32))
+        if plan['copies']:
+            rslts.append(pool.map(functools.partial(_copy_new, log=log),
+                                  *zip(*plan['copies']), chunksize=32))
+        for rslt in rslts:
+            for status, messages in rslt:
+                summary[status] = summary[status] + 1
+                for line in messages:
+                    dbc.print_helper(line, dbg=dbg)
+
+    summary['elapsed'] = time.perf_counter() - start
+    # comparisons ran in the pool processes, their calc_diff spans are not collected
+    dbc.span_add(files=summary['added'] + summary['identical'] + summary['diff'] +
+                 summary['error'])
+    dbc.print_helper(
+        "update_files: %(dirs)d dirs created, %(added)d added, %(diff)d changed, "
+        "%(identical)d identical, %(error)d errors, %(excluded)d excluded in %(elapsed).2fs"
+        % summary, dbg=dbg)
+    return summary
+
+@dbc.span("update_files")
+def update_files(src, dest, temp, excluded_ending=None, workers=0, dbg=False):
     """ walks directory structure in src, and compares to dest files
     excluded_ending is None removes items [".swo", ".swp", ".pyc", ".o", ".gz"], for all pass in []
+    workers > 0 runs update_files_pipeline on that many processes (returns its summary)
     """
+    if workers and workers > 0:
+        return update_files_pipeline(src, dest, temp, excluded_ending=excluded_ending,
+                                     workers=workers, dbg=dbg)
+
     init_index = -1
     init_len = len(str(src).split(os.sep))
     excluded_final = None
+    inc_backup = frozenset(["index.wiki"])
 
     if excluded_ending is None:
         excluded_final = set([".swo", ".swp", ".pyc", ".o", ".gz"])
@@ -58,10 +182,7 @@ def update_files(src, dest, temp, excluded_ending=None, dbg=False):
         excluded_final = set(excluded_ending)
 
     for dirpath, _, filenames in os.walk(src):
-        dir_split = str(dirpath).split(os.sep)
-        cur_len = len(str(dirpath).split(os.sep))
-        cur_index = init_index + (init_len - cur_len)
-        cur_append = os.sep.join(dir_split[cur_index:])
+        cur_append, cur_len, cur_index = _calc_append(dirpath, init_len, init_index)
         cur_dir = os.sep.join([dest, cur_append])
         dbc.print_helper(
             " ".join([str(cur_len), str(cur_index), cur_append, cur_dir]), dbg=dbg
@@ -86,10 +207,11 @@ def update_files(src, dest, temp, excluded_ending=None, dbg=False):
                     os.mkdir(temp_dir)
 
                 if not_empty and filename in base_dest_set:
-                    bu.calc_diff(dirpath, cur_dir, temp_dir, filename, inc_backup=["index.wiki"],
+                    bu.calc_diff(dirpath, cur_dir, temp_dir, filename, inc_backup=inc_backup,
                                  dbg=dbg)
                 else:
                     dbc.print_helper(("Adding " + filename), dbg=dbg)
+                    dbc.span_add(files=1)
                     sh.copy(os.sep.join([dirpath, filename]), temp_dir)
                     sh.copy(os.sep.join([dirpath, filename]), cur_dir)
 
@@ -99,12 +221,24 @@ if __name__ == "__main__":
         description="Initial Vimwiki backup tool and updater"
     )
 
+    parser.add_argument("-a", "--repository", default=None, type=str,
+                        help="deduplicating repository directory used instead of the zip")
     parser.add_argument("-b", "--backup_dir", default="/mnt/droboP/backups", type=str,
                         help="Directory where wikis will be backed to")
+    parser.add_argument("-c", "--codec", default=None, type=str,
+                        help="zip codec (default stored) gzip, bz2, xz or zstd")
     parser.add_argument("-f", "--debug_file", type=str)
+    parser.add_argument("-g", "--log_format", default="text", type=str,
+                        help="debug file format text or json (one record per line)")
+    parser.add_argument("-j", "--jobs", default=0, type=int,
+                        help="update files on a pool of jobs processes (0 sequential)")
 
+    parser.add_argument("-k", "--snapshots", default=0, type=int,
+                        help="with update, hardlinked dated snapshots keeping N (0 plain rsync)")
     parser.add_argument("-n", "--new", type=str, help="Construct new files")
     parser.add_argument("-o", "--options", default=None, type=str)
+    parser.add_argument("-r", "--incremental", default=0, type=int,
+                        help="incremental tar archives (codec default gzip), full every N runs")
     parser.add_argument("-s", "--src", default="/home/spennington/vimwiki", type=str,
                         help="Directory containing wikis to backup")
     parser.add_argument("-u", "--update", default=0, type=int)
@@ -112,6 +246,10 @@ if __name__ == "__main__":
     parser.add_argument(
         "-w", "--temp_dir", default="/home/spennington/workspace", type=str
     )
+    parser.add_argument("-x", "--profile", default=None, type=str,
+                        help="phase (span) to profile, cProfile stats written to <phase>.prof")
+    parser.add_argument("-z", "--level", default=None, type=int,
+                        help="compression level for codec (codec default if omitted)")
 
     args = parser.parse_args()
     args_dict = vars(args)
@@ -128,6 +266,9 @@ if __name__ == "__main__":
         if "backup_dir" not in args_dict.keys():
             raise ValueError("JSON must include backup_dir")
 
+        if "log_format" not in args_dict.keys():
+            args_dict["log_format"] = args.log_format
+
         hostname = None
         if "hostname" in args_dict.keys():
             hostname = args_dict["hostname"]
@@ -138,7 +279,7 @@ if __name__ == "__main__":
             if "verbose" not in args_dict.keys() and "debug_file" not in args_dict.keys():
                 args_dict["verbose"] = 0
             elif "debug_file" in args_dict.keys():
-                args_dict["debug_file"] = bu.append_date_file(args_dict["debug_file"])
+                args_dict["debug_file"] = bu.calc_debug_file(args_dict)
     else:
         if "backup_dir" not in args_dict.keys() or "src" not in args_dict.keys():
             raise ValueError("Dictionary Combination")
@@ -159,27 +300,58 @@ if __name__ == "__main__":
     if not os.path.exists(temp):
         os.mkdir(temp)
 
-    update_files(args_dict["src"], dest, temp, dbg=dbg)
+    profile = args_dict["profile"] if "profile" in args_dict.keys() else args.profile
+    if profile:
+        dbc.profile_span(profile)
+
+    jobs = args_dict["jobs"] if "jobs" in args_dict.keys() else args.jobs
+    update_files(args_dict["src"], dest, temp, workers=jobs, dbg=dbg)
 
     # zipfile construction
     os.chdir(args_dict["temp_dir"])
     dbc.print_helper(("Temp "  + args_dict["temp_dir"]), dbg=dbg)
     dbc.print_helper(("Dest: " + dest), dbg=dbg)
 
-    zipname = bu.construct_zip(args_dict["temp_dir"], dt_str, dbg=dbg)
+    codec = args_dict["codec"] if "codec" in args_dict.keys() else args.codec
+    level = args_dict["level"] if "level" in args_dict.keys() else args.level
+    incremental = args_dict["incremental"] if "incremental" in args_dict.keys() else\
+        args.incremental
+    repository = args_dict["repository"] if "repository" in args_dict.keys() else\
+        args.repository
+    if repository:
+        zipname = bu.construct_repository(args_dict["temp_dir"], dt_str, repository,
+                                          base_name="vimwiki_diff_backup", workers=jobs,
+                                          codec=codec or "gzip", level=level, dbg=dbg)
+    elif incremental > 0:
+        zipname, _ = bu.construct_incremental(args_dict["temp_dir"], dt_str, dest,
+                                              base_name="vimwiki_diff_backup",
+                                              full_every=incremental, codec=codec or "gzip",
+                                              level=level, dbg=dbg)
+    else:
+        zipname = bu.construct_zip(args_dict["temp_dir"], dt_str, codec=codec, level=level,
+                                   dest_dir=dest, dbg=dbg)
     # CLEANING UP
     if zipname is not None and os.path.exists(zipname):
-        sh.move(zipname, dest)
+        dbc.print_helper(("Wrote " + zipname), dbg=dbg)
     else:
         zipname = "EMPTY" if zipname is None else zipname
         dbc.print_helper(("Missing zip" + zipname), dbg=dbg)
     sh.rmtree(dt_str)
     # RSYNC
     if args_dict["update"] > 0:
-        dest = dest + os.sep + "vimwiki"
-        bu.apply_rsync(args_dict["src"], dest, "Back-up", dbg=dbg)
+        snapshots = args_dict["snapshots"] if "snapshots" in args_dict.keys() else args.snapshots
+        if snapshots > 0:
+            snapshot_root = dest + os.sep + "vimwiki_snapshots"
+            if bu.apply_rsync_snapshot(args_dict["src"], snapshot_root, "Back-up", dbg=dbg):
+                bu.prune_snapshots(snapshot_root, keep=snapshots, dbg=dbg)
+        else:
+            dest = dest + os.sep + "vimwiki"
+            bu.apply_rsync(args_dict["src"], dest, "Back-up", dbg=dbg)
         if isinstance(dbg, dbc.debug_control):
             dbg.close()
 
     if args_dict["new"]:
         update_file(args_dict["src"], hostname, dbg=dbg)
+
+    if not isinstance(dbg, dbc.debug_control):
+        dbc.report_spans(dbg)
@@ -0,0 +1,6 @@
+""" pytest setup -- the modules in src/ import each other by bare name """
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                "src"))
@@ -0,0 +1,106 @@
+""" backup_utility -- zip archives built from the diskwalk entries, debug log naming & retention """
+import os
+import glob
+import time
+import fnmatch
+import zipfile
+import pytest
+import backup_utility as bu
+
+
+@pytest.fixture
+def wiki(tmp_path):
+    root = tmp_path / "src" / "wiki"
+    (root / "sub").mkdir(parents=True)
+    (root / "index.wiki").write_text("index\n" * 2000)
+    (root / "sub" / "page.wiki").write_text("".join(["%06d\n" % (idx) for idx in range(5000)]))
+    (root / "skip.swp").write_text("swap\n")
+    os.utime(str(root / "index.wiki"), (1000, 1000))
+    return str(tmp_path / "src")
+
+
+def _contents(zipname):
+    with zipfile.ZipFile(zipname) as zp_ptr:
+        return {itm.filename: (itm.compress_type, zp_ptr.read(itm))
+                for itm in zp_ptr.infolist()}
+
+
+@pytest.mark.parametrize("codec", [None, "gzip", "bz2"])
+def test_zip_roundtrip(wiki, codec):
+    zipname = bu.construct_zip(wiki, "wiki", codec=codec)
+    assert zipname is not None and os.path.exists(zipname)
+    contents = _contents(zipname)
+    assert sorted(contents) == ["wiki/index.wiki", "wiki/sub/page.wiki"]
+    assert contents["wiki/index.wiki"][1] == b"index\n" * 2000
+    expected = {None: zipfile.ZIP_STORED, "gzip": zipfile.ZIP_DEFLATED, "bz2": zipfile.ZIP_BZIP2}
+    assert set([itm[0] for itm in contents.values()]) == {expected[codec]}
+    with zipfile.ZipFile(zipname) as zp_ptr:
+        assert zp_ptr.getinfo("wiki/index.wiki").date_time == (1980, 1, 1, 0, 0, 0)
+
+
+def test_zip_level_applied(wiki, tmp_path):
+    sizes = []
+    for level in (1, 9):
+        dest = tmp_path / ("level%d" % (level))
+        dest.mkdir()
+        zipname = bu.construct_zip(wiki, "wiki", codec="gzip", level=level, dest_dir=str(dest))
+        with zipfile.ZipFile(zipname) as zp_ptr:
+            sizes.append(zp_ptr.getinfo("wiki/sub/page.wiki").compress_size)
+        assert _contents(zipname)["wiki/sub/page.wiki"][1].count(b"\n") == 5000
+    assert sizes[1] < sizes[0]
+
+
+def _touch(path, age=0):
+    with open(path, "w", encoding="utf-8") as file_ptr:
+        file_ptr.write("log\n")
+    mtime = time.time() - age
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_calc_debug_file_sweeps_only_its_template(tmp_path):
+    log_dir = tmp_path / "logs[1]"
+    log_dir.mkdir()
+    template = str(log_dir / "backup_----.log")
+    args = {"debug_file": template, "log_keep": 3}
+    filename = bu.calc_debug_file(args)
+    assert os.path.dirname(filename) == str(log_dir)
+    assert any([fnmatch.fnmatchcase(filename, itm) for itm in args["log_sweep"]])
+
+    ours = ["backup_20240101_930.log", "backup_20240101_1230.log",
+            "backup_20240101_1230.log.20240102_010101.gz",
+            "backup_20240101_1230.log.20240102_010101.1"]
+    others = ["other_20240101_930.log", "backup_x_20240101_930.log", "backup_latest.log",
+              "backup_20240101_930.log.bak", "backup_20240101_12345.log",
+              "backup_2024010_930.log", "backup_20240101_930.log.gz.part.x"]
+    for name in ours + others:
+        _touch(str(log_dir / name))
+    found = set([os.path.basename(path) for pat in args["log_sweep"] for path in glob.glob(pat)])
+    assert found == set(ours)
+
+
+def test_calc_debug_file_keeps_explicit_sweep():
+    args = {"debug_file": "/tmp/backup_----.log", "log_keep": 3, "log_sweep": "/tmp/x*"}
+    bu.calc_debug_file(args)
+    assert args["log_sweep"] == "/tmp/x*"
+    args = {"debug_file": "/tmp/backup_----.log"}
+    bu.calc_debug_file(args)
+    assert "log_sweep" not in args
+
+
+def test_keep_days_alone_prunes_by_age_only(tmp_path):
+    log_dir = str(tmp_path)
+    recent = [_touch(os.path.join(log_dir, "backup_20240101_%d00.log" % (idx)), age=7200)
+              for idx in range(8)]
+    old = [_touch(os.path.join(log_dir, "backup_20230101_%d00.log" % (idx)), age=3 * 86400)
+           for idx in range(2)]
+    args = {"debug_file": os.path.join(log_dir, "backup_----.log"), "log_keep_days": 1,
+            "buffered_log": False}
+    args["debug_file"] = bu.calc_debug_file(args)
+    dbg, _ = bu.calc_debug_levels(args)
+    assert dbg.keep is None and dbg.keep_days == 1
+    dbg.close()
+    assert not [itm for itm in old if os.path.exists(itm) or os.path.exists(itm + ".gz")]
+    # every recent log survives (no count limit), gzip'ed being older than an hour
+    assert all([os.path.exists(itm + ".gz") for itm in recent])
+    assert os.path.exists(args["debug_file"])
@@ -0,0 +1,95 @@
+""" compress_api -- parallel_gzip must produce a standard gzip stream """
+import io
+import gzip
+import random
+import pytest
+import compress_api as cpa
+
+
+def _payload(size, seed=7):
+    """ compressible but not trivially repetitive text """
+    rnd = random.Random(seed)
+    words = [b"backup", b"vimwiki", b"snapshot", b"rsync", b"chunk", b"tar", b"\n"]
+    out = bytearray()
+    while len(out) < size:
+        out += rnd.choice(words) + b" "
+    return bytes(out[:size])
+
+
+@pytest.mark.parametrize("size,block_size", [
+    (0, 1024),
+    (1, 1024),
+    (1024, 1024),
+    (10 * 1024 + 17, 1024),
+    (200 * 1024, 64 * 1024),
+])
+@pytest.mark.parametrize("workers", [1, 3])
+def test_parallel_gzip_roundtrip(tmp_path, size, block_size, workers):
+    data = _payload(size)
+    path = tmp_path / "out.gz"
+    with cpa.parallel_gzip(str(path), level=6, workers=workers, block_size=block_size) as out:
+        for idx in range(0, len(data), 1000):
+            out.write(data[idx:idx + 1000])
+    raw = path.read_bytes()
+    assert gzip.decompress(raw) == data
+    with gzip.open(str(path), "rb") as file_ptr:
+        assert file_ptr.read() == data
+
+
+def test_parallel_gzip_fileobj_left_open():
+    data = _payload(50 * 1024)
+    buf = io.BytesIO()
+    comp = cpa.parallel_gzip(None, level=1, workers=2, block_size=8 * 1024, fileobj=buf)
+    comp.write(data)
+    comp.close()
+    comp.close()
+    assert not buf.closed
+    assert gzip.decompress(buf.getvalue()) == data
+
+
+def test_parallel_gzip_ratio_close_to_serial():
+    data = _payload(512 * 1024)
+    buf = io.BytesIO()
+    with cpa.parallel_gzip(None, level=6, workers=2, block_size=64 * 1024, fileobj=buf) as out:
+        out.write(data)
+    assert len(buf.getvalue()) < 1.05 * len(gzip.compress(data, compresslevel=6)) + 1024
+
+
+def test_open_compressed_workers_uses_parallel_gzip(tmp_path):
+    data = _payload(300 * 1024)
+    path = str(tmp_path / "out.gz")
+    with cpa.open_compressed(path, "gz", 6, workers=2) as out:
+        assert isinstance(out, cpa.parallel_gzip)
+        out.write(data)
+    with open(path, "rb") as file_ptr:
+        assert gzip.decompress(file_ptr.read()) == data
+
+
+@pytest.mark.parametrize("codec", cpa.available_codecs())
+def test_compress_bytes_roundtrip(codec):
+    data = _payload(20 * 1024)
+    assert cpa.decompress_bytes(cpa.compress_bytes(data, codec), codec) == data
+
+
+def test_calc_codec_rejects_bad_level():
+    with pytest.raises(ValueError):
+        cpa.calc_codec("gzip", 10)
+    with pytest.raises(ValueError):
+        cpa.calc_codec("rar")
+
+
+@pytest.mark.parametrize("codec", cpa.available_codecs())
+def test_open_decompressed_detects_codec(tmp_path, codec):
+    data = _payload(100 * 1024)
+    path = str(tmp_path / "out.bin")
+    with cpa.open_compressed(path, codec) as out:
+        out.write(data)
+    with cpa.open_decompressed(path) as file_ptr:
+        assert file_ptr.read() == data
+
+
+def test_open_decompressed_rejects_unknown(tmp_path):
+    path = tmp_path / "plain.txt"
+    path.write_bytes(b"not compressed")
+    with pytest.raises(ValueError):
+        cpa.open_decompressed(str(path))
@@ -0,0 +1,258 @@
+""" debug_control -- process streaming, structured events & log rotation """
+import os
+import glob
+import gzip
+import sys
+import time
+import threading
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import pytest
+import debug_control as dbc
+
+
+def _in_thread(func, *args, timeout=20, **kwargs):
+    """ runs func on a helper thread so a hang fails the test instead of blocking the run """
+    rslt = {}
+
+    def target():
+        try:
+            rslt['value'] = func(*args, **kwargs)
+        except BaseException as err:
+            rslt['error'] = err
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "%s did not return" % (func.__name__)
+    return rslt
+
+
+@pytest.fixture
+def procs(monkeypatch):
+    """ records the children stream_process starts """
+    started = []
+    original = subprocess.Popen
+
+    def popen(*args, **kwargs):
+        started.append(original(*args, **kwargs))
+        return started[-1]
+    monkeypatch.setattr(subprocess, "Popen", popen)
+    return started
+
+
+def _child(code):
+    return [sys.executable, "-c", code]
+
+
+def test_stream_process_logs_lines():
+    lines = []
+    code = "import sys; print('out one'); print('out two'); sys.stderr.write('err\\n'); sys.exit(3)"
+    returncode, err = dbc.stream_process(_child(code), "child", dbg=lines)
+    assert returncode == 3 and err == b"err\n"
+    assert "child (stdout) out one" in lines and "child (stdout) out two" in lines
+    assert "child (stderr) err" in lines
+
+
+def test_logging_error_kills_child_ignoring_its_output(procs, monkeypatch):
+    def failing(base_str, dbg):
+        raise RuntimeError("log disk full")
+    monkeypatch.setattr(dbc, "print_helper", failing)
+    # the child never looks at its pipes again and would outlive a plain wait()
+    code = "import time; print('first', flush=True); time.sleep(60)"
+    start = time.time()
+    rslt = _in_thread(dbc.stream_process, _child(code), "child", dbg=True)
+    assert isinstance(rslt.get('error'), RuntimeError)
+    assert time.time() - start < 20
+    assert procs[0].returncode is not None and procs[0].returncode < 0
+
+
+def test_interrupted_mid_stream(procs, monkeypatch):
+    seen = []
+
+    def interrupt(base_str, dbg):
+        seen.append(base_str)
+        if len(seen) == 3:
+            raise KeyboardInterrupt()
+    monkeypatch.setattr(dbc, "print_helper", interrupt)
+    code = ("import signal, time\nsignal.signal(signal.SIGPIPE, signal.SIG_IGN)\n"
+            "for idx in range(100000):\n"
+            "    try:\n        print('line', idx, flush=True)\n"
+            "    except OSError:\n        pass\ntime.sleep(60)")
+    rslt = _in_thread(dbc.stream_process, _child(code), "child", dbg=True)
+    assert isinstance(rslt.get('error'), KeyboardInterrupt)
+    assert seen[:3] == ["child (stdout) line 0", "child (stdout) line 1", "child (stdout) line 2"]
+    assert procs[0].returncode is not None and procs[0].returncode < 0
+    assert procs[0].stdout.closed and procs[0].stderr.closed
+
+
+def test_stderr_drained_after_logging_error(monkeypatch):
+    def failing(base_str, dbg):
+        if "(stderr)" in base_str:
+            raise RuntimeError("log disk full")
+    monkeypatch.setattr(dbc, "print_helper", failing)
+    # far more than a pipe buffer: the child only exits when stderr keeps being read
+    code = "import sys\nfor idx in range(50000):\n    sys.stderr.write('err %d\\n' % idx)"
+    rslt = _in_thread(dbc.stream_process, _child(code), "child", dbg=True, tail=2)
+    assert rslt['value'] == (0, b"err 49998\nerr 49999\n")
+
+
+@pytest.fixture
+def spans():
+    dbc.reset_spans()
+    yield
+    dbc.reset_spans()
+
+
+def test_json_events_roundtrip(tmp_path, spans):
+    log = str(tmp_path / "events.log")
+    dbg = dbc.debug_control(log, debug_level=1, log_format="json", host="box")
+    dbg.write("plain message")
+    dbc.log_event("process", process="rsync", returncode=0, seconds=1.5)
+    with dbc.span("backup"):
+        with dbc.span("copy"):
+            dbc.span_add(files=2, nbytes=300, path="/data/x")
+    dbg.close()
+    with open(log, "a", encoding="utf-8") as file_ptr:
+        file_ptr.write('{"ts": 1, "event": "trunc')
+
+    records = list(dbc.read_events(log))
+    assert [itm["event"] for itm in records] ==\
+        ["message", "process", "span", "span", "span_total", "span_total", "finish"]
+    assert all([itm["host"] == "box" and itm["ts"] > 0 for itm in records])
+    assert records[0]["msg"] == "plain message"
+    assert records[1]["process"] == "rsync" and records[1]["returncode"] == 0
+    assert {key: records[2][key] for key in ("phase", "files", "bytes", "path")} ==\
+        {"phase": "backup/copy", "files": 2, "bytes": 300, "path": "/data/x"}
+    assert records[3]["phase"] == "backup"
+
+    gz_log = dbc.compress_log(log)
+    assert gz_log == log + ".gz" and not os.path.exists(log)
+    copies = list(dbc.read_events(gz_log, kinds=["span"], where=lambda rec: rec["files"] > 0))
+    assert copies == [records[2]]
+
+
+def test_text_log_events(tmp_path, spans):
+    log = str(tmp_path / "text.log")
+    dbg = dbc.debug_control(log, debug_level=1)
+    dbg.event("process", process="rsync", returncode=0)
+    dbc.log_event("ignored", process="rsync")
+    dbg.close()
+    with open(log, "r", encoding="utf-8") as file_ptr:
+        lines = file_ptr.read().splitlines()
+    assert lines[0].startswith("process process=rsync returncode=0-- ")
+    assert not [itm for itm in lines if "ignored" in itm]
+
+
+@dbc.span("worker_span")
+def _worker(idx):
+    # well past the inherited handle's buffer, so an unguarded child would reach the file
+    for _ in range(100):
+        dbc.log_event("worker", idx=idx, pad="x" * 200)
+    dbc.print_helper("worker %d" % (idx), dbc._EVENT_LOG)
+    return os.getpid()
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(),
+                    reason="needs fork start method")
+@pytest.mark.parametrize("buffered", [False, True])
+def test_forked_workers_do_not_write(tmp_path, spans, buffered):
+    log = str(tmp_path / "events.log")
+    dbg = dbc.debug_control(log, debug_level=1, log_format="json", buffered=buffered)
+    dbg.write("before")
+    with ProcessPoolExecutor(2, mp_context=multiprocessing.get_context("fork")) as pool:
+        pids = set(pool.map(_worker, range(8)))
+    assert os.getpid() not in pids
+    dbg.write("after")
+    dbg.close()
+    records = list(dbc.read_events(log))
+    assert [itm.get("msg") for itm in records if itm["event"] == "message"] == ["before", "after"]
+    assert not [itm for itm in records if itm["event"] in ("worker", "span")]
+    assert not [itm for itm in records if itm.get("phase") == "worker_span"]
+
+
+def _log_lines(log):
+    """ lines of the active log & every rotated segment (gzip'ed or not) """
+    lines = []
+    for path in [log] + glob.glob(log + ".*"):
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as file_ptr:
+            lines.extend(file_ptr.read().splitlines())
+    return lines
+
+
+def _numbered(lines):
+    return sorted([int(itm.split("--")[0].split()[1]) for itm in lines if itm.startswith("line ")])
+
+
+@pytest.mark.parametrize("buffered", [False, True])
+def test_rotation_by_size_loses_no_line(tmp_path, spans, buffered):
+    log = str(tmp_path / "run.log")
+    dbg = dbc.debug_control(log, debug_level=1, buffered=buffered, flush_interval=0.01,
+                            max_bytes=2000, keep=None)
+    for idx in range(500):
+        dbg.write("line %05d" % (idx))
+        if buffered and idx % 100 == 0:
+            dbg.flush()
+    dbg.close()
+    segments = glob.glob(log + ".*")
+    assert len(segments) > 5
+    assert all([itm.endswith(".gz") for itm in segments])
+    for path in segments:
+        with gzip.open(path, "rt", encoding="utf-8") as file_ptr:
+            assert len(file_ptr.read()) < 2000 + 40
+    assert _numbered(_log_lines(log)) == list(range(500))
+
+
+def test_rotation_by_age(tmp_path, spans):
+    log = str(tmp_path / "run.log")
+    dbg = dbc.debug_control(log, debug_level=1, max_age=3600)
+    dbg.write("line 00000")
+    assert glob.glob(log + ".*") == []
+    dbg._opened = dbg._opened - 7200
+    dbg.write("line 00001")
+    dbg.write("line 00002")
+    dbg.close()
+    segments = glob.glob(log + ".*")
+    assert len(segments) == 1 and segments[0].endswith(".gz")
+    with gzip.open(segments[0], "rt", encoding="utf-8") as file_ptr:
+        assert _numbered(file_ptr.read().splitlines()) == [0, 1]
+    with open(log, "r", encoding="utf-8") as file_ptr:
+        assert _numbered(file_ptr.read().splitlines()) == [2]
+
+
+def test_compressed_segment_keeps_mtime_for_retention(tmp_path):
+    base = str(tmp_path / "run.log")
+    paths = []
+    for idx in range(1, 7):
+        paths.append("%s.2024010%d_000000" % (base, idx))
+        with open(paths[-1], "w", encoding="utf-8") as file_ptr:
+            file_ptr.write("segment %d\n" % (idx))
+        os.utime(paths[-1], (idx * 1000, idx * 1000))
+    # the oldest were compressed last, e.g. by a lagging maintenance thread
+    for idx, path in enumerate(paths[:2]):
+        assert dbc.compress_log(path) == path + ".gz"
+        assert os.stat(path + ".gz").st_mtime == (idx + 1) * 1000
+    removed = dbc.sweep_logs(base + ".*", keep=3, compress=False)
+    assert sorted(removed) == [paths[0] + ".gz", paths[1] + ".gz", paths[2]]
+    assert sorted(glob.glob(base + ".*")) == paths[3:]
+
+
+def test_rotation_keeps_newest_segments(tmp_path, spans):
+    log = str(tmp_path / "run.log")
+    dbg = dbc.debug_control(log, debug_level=1, max_bytes=2000, keep=3)
+    for idx in range(500):
+        dbg.write("line %05d" % (idx))
+    dbg.close()
+    assert len(glob.glob(log + ".*")) == 3
+    kept = _numbered(_log_lines(log))
+    assert kept == list(range(500 - len(kept), 500))
+
+
+def test_maintenance_error_goes_to_stderr(tmp_path, spans, capsys):
+    dbg = dbc.debug_control(str(tmp_path / "run.log"), debug_level=1)
+    dbg._background(os.remove, str(tmp_path / "missing.log"))
+    dbg.close()
+    captured = capsys.readouterr()
+    assert captured.out == ""
+    assert "log maintenance failed" in captured.err and "missing.log" in captured.err
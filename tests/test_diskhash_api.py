@@ -0,0 +1,68 @@
+""" diskhash_api -- cached content hashes keyed by (dev, inode, size, mtime) """
+import os
+import hashlib
+import sqlite3
+import diskwalk_api as dwa
+import diskhash_api as dha
+
+
+def _entry(path, dev=None, inode=None):
+    st = os.stat(path)
+    return dwa.diskentry(path, st.st_size, st.st_mtime, st.st_ino if inode is None else inode,
+                         st.st_mode, st.st_uid, st.st_gid, st.st_dev if dev is None else dev)
+
+
+def test_hash_matches_hashlib(tmp_path):
+    path = tmp_path / "a.bin"
+    path.write_bytes(b"abc" * 100000)
+    with dha.diskhash() as hasher:
+        assert hasher.hashFile(str(path)) ==\
+            hashlib.blake2b(b"abc" * 100000, digest_size=32).hexdigest()
+
+
+def test_cache_persists_between_objects(tmp_path):
+    path = tmp_path / "a.bin"
+    path.write_bytes(b"payload")
+    cache = str(tmp_path / "cache.db")
+    with dha.diskhash(cache) as hasher:
+        digest = hasher.hashFile(str(path))
+    with dha.diskhash(cache) as hasher:
+        assert hasher.hashFile(str(path)) == digest
+        assert hasher.stats['cached'] == 1 and hasher.stats['hashed'] == 0
+
+
+def test_same_inode_other_device_not_served_from_cache(tmp_path):
+    first = tmp_path / "a.bin"
+    second = tmp_path / "b.bin"
+    first.write_bytes(b"first!")
+    second.write_bytes(b"second")
+    os.utime(str(second), (os.stat(str(first)).st_mtime,) * 2)
+    inode = os.stat(str(first)).st_ino
+    cache = str(tmp_path / "cache.db")
+    with dha.diskhash(cache) as hasher:
+        one = hasher.hashFile(_entry(str(first), dev=1, inode=inode))
+    with dha.diskhash(cache) as hasher:
+        two = hasher.hashFile(_entry(str(second), dev=2, inode=inode))
+        assert hasher.stats['hashed'] == 1
+        assert hasher.lookup(_entry(str(second), dev=1, inode=inode)) == one
+    assert one != two
+
+
+def test_old_cache_layout_rebuilt(tmp_path):
+    cache = str(tmp_path / "cache.db")
+    con = sqlite3.connect(cache)
+    con.execute("CREATE TABLE hashes (inode INTEGER, size INTEGER, mtime REAL, "
+                "digest_size INTEGER, digest TEXT, PRIMARY KEY (inode, size, mtime, "
+                "digest_size)) WITHOUT ROWID")
+    con.execute("INSERT INTO hashes VALUES (1, 2, 3.0, 32, 'stale')")
+    con.commit()
+    con.close()
+    path = tmp_path / "a.bin"
+    path.write_bytes(b"data")
+    with dha.diskhash(cache) as hasher:
+        assert hasher.hashFile(str(path)) == hashlib.blake2b(b"data", digest_size=32).hexdigest()
+    con = sqlite3.connect(cache)
+    columns = [row[1] for row in con.execute("PRAGMA table_info(hashes)")]
+    assert columns[:2] == ["dev", "inode"]
+    assert con.execute("SELECT COUNT(*) FROM hashes").fetchone()[0] == 1
+    con.close()
@@ -0,0 +1,145 @@
+""" diskwalk_api -- walks, disk usage & cleanse """
+import os
+import pytest
+import diskwalk_api as dwa
+
+
+def _make(root, files):
+    for rel, size in files.items():
+        path = root.joinpath(*rel.split("/"))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"x" * size)
+
+
+def _expected_order(top):
+    """ depth first, each directory's files then its subdirectories, all by name """
+    rslt = []
+    for dirpath, dirnames, filenames in os.walk(top):
+        dirnames.sort()
+        rslt.extend([os.path.join(dirpath, itm) for itm in sorted(filenames)])
+    return rslt
+
+
+@pytest.fixture
+def tree(tmp_path):
+    files = {}
+    for idx in range(6):
+        for sub in range(4):
+            for name in ("b.txt", "a.txt", "c.swp"):
+                files["d%d/s%d/%s" % (idx, sub, name)] = idx + sub + 1
+        files["d%d/top.txt" % (idx)] = 10
+    files["root.txt"] = 100
+    files["daily/skip.txt"] = 1000
+    _make(tmp_path, files)
+    return tmp_path
+
+
+@pytest.mark.parametrize("workers", [2, 5])
+def test_parallel_matches_serial_and_is_sorted(tree, workers):
+    walker = dwa.diskwalk({'path': str(tree), 'ignore': ["daily"]})
+    serial = list(walker.iterPaths(workers=0))
+    parallel = list(walker.iterPaths(workers=workers))
+    assert sorted(serial) == sorted(parallel)
+    assert parallel == [itm for itm in _expected_order(str(tree)) if "daily" not in itm]
+    assert len(parallel) == 6 * 4 * 3 + 6 + 1
+
+
+def test_parallel_entries_match_serial(tree):
+    walker = dwa.diskwalk(str(tree))
+    serial = {ent.path: (ent.size, ent.inode, ent.dev) for ent in walker.iterEntries(0)}
+    parallel = [ent for ent in walker.iterEntries(3)]
+    assert {ent.path: (ent.size, ent.inode, ent.dev) for ent in parallel} == serial
+    assert [ent.path for ent in parallel] == _expected_order(str(tree))
+
+
+def test_parallel_scans_ahead_boundedly(tmp_path, monkeypatch):
+    _make(tmp_path, {"d%03d/f.txt" % (idx): 1 for idx in range(200)})
+    scanned = []
+    original = dwa.diskwalk._scan_dir
+
+    def counting(self, dirpath, matcher, records):
+        scanned.append(dirpath)
+        return original(self, dirpath, matcher, records)
+    monkeypatch.setattr(dwa.diskwalk, "_scan_dir", counting)
+    walk = dwa.diskwalk(str(tmp_path))._scan_parallel(2, False, ahead=4)
+    next(walk)
+    assert len(scanned) <= 1 + 2 * 4
+    assert len(list(walk)) == 199
+    assert len(scanned) == 201
+
+
+@pytest.mark.parametrize("workers", [0, 3])
+def test_cleanse_dryrun_keeps_files(tree, workers, capsys):
+    walker = dwa.diskwalk({'path': str(tree), 'delete': {'filetype': ['.swp'], 'regex': []}})
+    summary = walker.cleanseDir(dryrun=True, workers=workers)
+    assert summary == {'files': 24, 'bytes': sum([idx + sub + 1 for idx in range(6)
+                                                   for sub in range(4)]),
+                       'failed': [], 'dryrun': True}
+    assert len(list(tree.glob("*/*/*.swp"))) == 24
+    assert capsys.readouterr().out.count("D: dryrun deletion of") == 24
+
+
+@pytest.mark.parametrize("workers", [0, 3])
+def test_cleanse_removes_matches(tree, workers):
+    walker = dwa.diskwalk({'path': str(tree), 'ignore': ["daily"],
+                           'delete': {'filetype': ['swp'], 'regex': [r'/d1/s0/a\.txt$']}})
+    summary = walker.cleanseDir(dryrun=False, workers=workers)
+    assert summary['files'] == 25
+    assert summary['failed'] == [] and not summary['dryrun']
+    assert not list(tree.glob("*/*/*.swp"))
+    assert not (tree / "d1" / "s0" / "a.txt").exists()
+    assert (tree / "d1" / "s0" / "b.txt").exists()
+    assert len(walker.path_collection) == 6 * 4 * 3 + 6 + 1 - 25
+
+
+def test_cleanse_without_criteria_is_noop(tree):
+    summary = dwa.diskwalk(str(tree)).cleanseDir(dryrun=False)
+    assert summary['files'] == 0
+    assert len(list(tree.glob("*/*/*.swp"))) == 24
+
+
+def test_cleanse_reports_failures(tree):
+    walker = dwa.diskwalk({'path': str(tree), 'delete': {'filetype': ['swp']}})
+    walker.path_collection = [str(tree / "missing.swp"), str(tree / "d0" / "s0" / "c.swp")]
+    summary = walker.cleanseDir(dryrun=False)
+    assert summary['files'] == 1 and summary['bytes'] == 1
+    assert summary['failed'] == [str(tree / "missing.swp")]
+
+
+def test_disk_usage_totals(tree):
+    usage = dwa.diskwalk({'path': str(tree), 'ignore': ["daily"]}).diskUsage(top=3)
+    sub_bytes = 3 * sum([idx + sub + 1 for idx in range(6) for sub in range(4)])
+    assert usage['path'] == str(tree)
+    assert usage['files'] == 6 * 4 * 3 + 6 + 1
+    assert usage['bytes'] == sub_bytes + 6 * 10 + 100
+    dirs = {itm['path']: (itm['bytes'], itm['files']) for itm in usage['dirs']}
+    assert str(tree / "daily") not in dirs
+    assert dirs[str(tree)] == (usage['bytes'], usage['files'])
+    assert dirs[str(tree / "d5")] == (3 * sum([5 + sub + 1 for sub in range(4)]) + 10, 13)
+    assert dirs[str(tree / "d5" / "s3")] == (27, 3)
+    assert usage['dirs'][0]['path'] == str(tree)
+    assert [itm['bytes'] for itm in usage['dirs']] ==\
+        sorted([itm['bytes'] for itm in usage['dirs']], reverse=True)
+
+
+def test_disk_usage_largest_heap(tree):
+    usage = dwa.diskwalk(str(tree)).diskUsage(top=3)
+    assert usage['largest'][:2] == [(1000, str(tree / "daily" / "skip.txt")),
+                                    (100, str(tree / "root.txt"))]
+    assert [itm[0] for itm in usage['largest']] == [1000, 100, 10]
+    assert dwa.diskwalk(str(tree)).diskUsage(top=0)['largest'] == []
+
+
+@pytest.mark.parametrize("sort_key", ["bytes", "files", "path"])
+def test_disk_usage_sort_keys(tree, sort_key):
+    dirs = dwa.diskwalk(str(tree)).diskUsage(sort_key=sort_key)['dirs']
+    if sort_key == 'path':
+        assert [itm['path'] for itm in dirs] == sorted([itm['path'] for itm in dirs])
+    else:
+        assert [itm[sort_key] for itm in dirs] ==\
+            sorted([itm[sort_key] for itm in dirs], reverse=True)
+
+
+def test_disk_usage_rejects_unknown_sort_key(tree):
+    with pytest.raises(ValueError):
+        dwa.diskwalk(str(tree)).diskUsage(sort_key='size')
@@ -0,0 +1,120 @@
+""" diskwatch_api -- inotify backed live file set (Linux only) """
+import os
+import sys
+import time
+import shutil
+import pytest
+import diskwatch_api as dwt
+
+pytestmark = pytest.mark.skipif(not sys.platform.startswith("linux"),
+                                reason="inotify is Linux only")
+
+
+def _wait(pred, timeout=5.0):
+    """ events arrive on the watch thread, poll until pred() holds """
+    end = time.time() + timeout
+    while time.time() < end:
+        if pred():
+            return True
+        time.sleep(0.02)
+    return pred()
+
+
+def _write(path, text="x"):
+    with open(str(path), "w", encoding="utf-8") as file_ptr:
+        file_ptr.write(text)
+
+
+@pytest.fixture
+def watch(tmp_path):
+    root = tmp_path / "root"
+    (root / "sub").mkdir(parents=True)
+    _write(root / "a.txt")
+    _write(root / "sub" / "b.txt")
+    watcher = dwt.diskwatch({'path': str(root), 'ignore': ["*.swp"]}).start()
+    yield root, watcher
+    watcher.stop()
+
+
+def test_initial_set(watch):
+    root, watcher = watch
+    assert watcher.paths() == {str(root / "a.txt"), str(root / "sub" / "b.txt")}
+    assert watcher.changes() == {'added': set(), 'modified': set(), 'removed': set()}
+
+
+def test_create_modify_move_delete(watch):
+    root, watcher = watch
+    new = str(root / "sub" / "new.txt")
+    _write(new)
+    _write(root / "skip.swp")
+    assert _wait(lambda: new in watcher.paths())
+    assert watcher.changes()['added'] == {new}
+
+    _write(root / "a.txt", "changed")
+    assert _wait(lambda: watcher.changes(reset=False)['modified'])
+    assert watcher.changes()['modified'] == {str(root / "a.txt")}
+
+    moved = str(root / "moved.txt")
+    os.rename(new, moved)
+    assert _wait(lambda: moved in watcher.paths())
+    changes = watcher.changes()
+    assert changes['added'] == {moved} and changes['removed'] == {new}
+
+    os.remove(moved)
+    assert _wait(lambda: moved not in watcher.paths())
+    assert watcher.changes()['removed'] == {moved}
+    assert str(root / "skip.swp") not in watcher.paths()
+
+
+def test_directory_created_moved_out_and_deleted(watch, tmp_path):
+    root, watcher = watch
+    deep = root / "tree" / "deep"
+    deep.mkdir(parents=True)
+    _write(deep / "c.txt")
+    assert _wait(lambda: str(deep / "c.txt") in watcher.paths())
+    watches = len(watcher._wds)
+
+    outside = tmp_path / "outside"
+    shutil.move(str(root / "tree"), str(outside))
+    assert _wait(lambda: str(deep / "c.txt") not in watcher.paths())
+    assert _wait(lambda: len(watcher._wds) == watches - 2)
+    assert str(deep) not in watcher._dir_wds and str(root / "tree") not in watcher._subdirs
+
+    shutil.move(str(outside), str(root / "back"))
+    back = str(root / "back" / "deep" / "c.txt")
+    assert _wait(lambda: back in watcher.paths())
+
+    shutil.rmtree(str(root / "sub"))
+    assert _wait(lambda: str(root / "sub" / "b.txt") not in watcher.paths())
+    assert watcher.paths() == {str(root / "a.txt"), back}
+    assert watcher.changes()['removed'] == {str(root / "sub" / "b.txt")}
+
+
+def test_overflow_falls_back_to_rescan(watch, monkeypatch):
+    root, watcher = watch
+    handle = watcher._handle
+    calls = []
+
+    def lossy(buf):
+        # first batch is lost as with a real IN_Q_OVERFLOW
+        calls.append(buf)
+        if len(calls) == 1:
+            return handle(dwt._EVENT.pack(-1, dwt.IN_Q_OVERFLOW, 0, 0))
+        return handle(buf)
+    monkeypatch.setattr(watcher, "_handle", lossy)
+
+    _write(root / "sub" / "late.txt")
+    assert _wait(lambda: watcher.overflows == 1)
+    assert _wait(lambda: str(root / "sub" / "late.txt") in watcher.paths())
+    changes = watcher.changes()
+    assert str(root / "sub" / "late.txt") in changes['added']
+    assert changes['modified'] == {str(root / "a.txt"), str(root / "sub" / "b.txt")}
+
+
+def test_rescan_unchanged_tree_records_nothing(watch):
+    root, watcher = watch
+    wds = dict(watcher._wds)
+    watcher.rescan()
+    assert watcher.changes() == {'added': set(), 'modified': set(), 'removed': set()}
+    assert watcher._wds == wds
+    assert watcher.paths() == {str(root / "a.txt"), str(root / "sub" / "b.txt")}
@@ -0,0 +1,88 @@
+""" duplicate_finder -- staged size / sample / full hash grouping """
+import os
+import pytest
+import diskwalk_api as dwa
+import duplicate_finder as dfi
+
+SAMPLE = 1024
+
+
+def _write(root, rel, data):
+    path = root.joinpath(*rel.split("/"))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return str(path)
+
+
+@pytest.fixture
+def tree(tmp_path):
+    big = b"".join([b"%08d" % (idx) for idx in range(1000)])
+    other_middle = big[:4000] + b"X" + big[4001:]
+    paths = {
+        'small': [_write(tmp_path, rel, b"same small") for rel in ("a.txt", "x/a.txt", "y/a.txt")],
+        'big': [_write(tmp_path, rel, big) for rel in ("big1.bin", "x/big2.bin")],
+        'middle': _write(tmp_path, "y/big3.bin", other_middle),
+        'size_only': _write(tmp_path, "b.txt", b"diff small"),
+        'unique': _write(tmp_path, "u.txt", b"nothing like it"),
+        'empty': [_write(tmp_path, rel, b"") for rel in ("e1", "e2")],
+    }
+    return tmp_path, paths
+
+
+def test_groups_and_totals(tree):
+    root, paths = tree
+    report = dfi.find_duplicates(str(root), sample=SAMPLE)
+    groups = [(itm['size'], itm['paths'], itm['reclaimable']) for itm in report['groups']]
+    assert groups == [(8000, sorted(paths['big']), 8000),
+                      (10, sorted(paths['small']), 20)]
+    assert report['scanned'] == 8
+    assert report['duplicates'] == 3
+    assert report['reclaimable'] == 8020
+    # same size & sample but a different middle is only told apart by the full hash
+    assert report['size_candidates'] == 6 + 1
+    assert report['sample_candidates'] == 6
+    assert report['bytes_hashed'] == 3 * 8000
+
+
+def test_min_size_zero_groups_empty_files(tree):
+    root, paths = tree
+    report = dfi.find_duplicates(str(root), sample=SAMPLE, min_size=0)
+    assert sorted(paths['empty']) in [itm['paths'] for itm in report['groups']]
+
+
+def test_hardlinks_not_reported(tree):
+    root, paths = tree
+    os.link(paths['unique'], str(root / "x" / "u_link.txt"))
+    os.link(paths['small'][0], str(root / "y" / "a_link.txt"))
+    report = dfi.find_duplicates(str(root), sample=SAMPLE)
+    small = [itm for itm in report['groups'] if itm['size'] == 10][0]
+    assert len(small['paths']) == 3
+    assert not [itm for itm in report['groups'] if itm['size'] == 15]
+
+
+def test_same_inode_on_other_device_is_kept(tree, monkeypatch):
+    """ inode numbers repeat across file systems, only (dev, inode) identifies a file """
+    root, paths = tree
+    original = dwa.diskentry.from_direntry.__func__
+
+    def fake_mount(cls, entry):
+        # root, x/ and y/ on three devices, same named files share an inode number
+        ent = original(cls, entry)
+        rel = os.path.relpath(ent.path, str(root))
+        ent.dev = {"x": 2, "y": 3}.get(rel.split(os.sep)[0], 1)
+        ent.inode = sum(os.path.basename(rel).encode("utf-8"))
+        return ent
+    monkeypatch.setattr(dwa.diskentry, "from_direntry", classmethod(fake_mount))
+    report = dfi.find_duplicates(str(root), sample=SAMPLE)
+    assert report['scanned'] == 8
+    small = [itm for itm in report['groups'] if itm['size'] == 10][0]
+    assert small['paths'] == sorted(paths['small'])
+
+
+def test_cache_reused(tree, tmp_path_factory):
+    root, _ = tree
+    cache = str(tmp_path_factory.mktemp("cache") / "hashes.db")
+    first = dfi.find_duplicates(str(root), cache=cache, sample=SAMPLE)
+    second = dfi.find_duplicates(str(root), cache=cache, sample=SAMPLE)
+    assert second['groups'] == first['groups']
+    assert second['bytes_hashed'] == 0
@@ -0,0 +1,121 @@
+""" diskwalk_api.ignore_matcher -- rsync style exclusions from the shipped data/ configs """
+import os
+import glob
+import json
+import pytest
+import diskwalk_api as dwa
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+CONFIGS = sorted(glob.glob(os.path.join(DATA_DIR, "rsync*config*.json")))
+ROOT = os.sep + os.path.join("home", "user")
+
+# relative path, is_dir -> ignored by the patterns it is checked against
+FILE_CASES = [
+    ("notes.swp", False, True),
+    ("wiki/index.wiki.swo", False, True),
+    ("a/b/core.stackdump", False, True),
+    ("notes.swp.bak", False, False),
+    ("swp", False, False),
+    ("wiki/index.wiki", False, False),
+]
+TREE_CASES = [
+    ("daily", True, True),
+    ("projects/daily", True, True),
+    ("projects/daily/report.txt", False, True),
+    ("daily.txt", False, False),
+    ("notdaily", True, False),
+    ("RMBS2/deal.csv", False, True),
+    ("RMBS22/deal.csv", False, False),
+    ("Vendor/BBG/CMP/V2/CmpExcelInstall", True, True),
+    ("x/Vendor/BBG/CMP/V2/CmpExcelUpdate/setup.exe", False, True),
+    ("Vendor/BBG/CMP/V2/CmpExcelInstaller", True, False),
+    ("Vendor/BBG/CMP/V2/other.xls", False, False),
+    ("research/.ipynb_checkpoints/nb-checkpoint.ipynb", False, True),
+    (".vscode/settings.json", False, True),
+    ("research/model.ipynb", False, False),
+]
+
+
+def _load(path):
+    with open(path, "r", encoding="utf-8") as file_ptr:
+        return json.load(file_ptr)["exclusions"]
+
+
+def _full(rel):
+    return os.sep.join([ROOT] + rel.split("/"))
+
+
+def test_configs_found():
+    assert len(CONFIGS) >= 3
+
+
+@pytest.mark.parametrize("config", CONFIGS, ids=os.path.basename)
+@pytest.mark.parametrize("rel,is_dir,expected", FILE_CASES)
+def test_extension_exclusions(config, rel, is_dir, expected):
+    matcher = dwa.ignore_matcher(_load(config), ROOT)
+    assert matcher.match_tree(_full(rel), is_dir) == expected
+
+
+@pytest.mark.parametrize("config", [itm for itm in CONFIGS if "daily" in _load(itm)],
+                         ids=os.path.basename)
+@pytest.mark.parametrize("rel,is_dir,expected", TREE_CASES)
+def test_directory_exclusions(config, rel, is_dir, expected):
+    matcher = dwa.ignore_matcher(_load(config), ROOT)
+    assert matcher.match_tree(_full(rel), is_dir) == expected
+
+
+def test_match_only_tests_entry_itself():
+    matcher = dwa.ignore_matcher(["daily"], ROOT)
+    assert matcher.match(_full("daily"), True)
+    assert not matcher.match(_full("daily/report.txt"))
+
+
+@pytest.mark.parametrize("patterns,rel,is_dir,expected", [
+    (["build/"], "build", True, True),
+    (["build/"], "build", False, False),
+    (["*.tmp"], "a.TMP", False, False),
+    (["**/cache/*.bin"], "a/b/cache/x.bin", False, True),
+    (["cache/*.bin"], "cache/sub/x.bin", False, False),
+    (["log?.txt"], "log1.txt", False, True),
+    (["log?.txt"], "log/.txt", False, False),
+    (["[!a]*.dat"], "b.dat", False, True),
+    (["[!a]*.dat"], "a.dat", False, False),
+])
+def test_rsync_pattern_forms(patterns, rel, is_dir, expected):
+    matcher = dwa.ignore_matcher(patterns, ROOT)
+    assert matcher.match(_full(rel), is_dir) == expected
+
+
+def test_absolute_prefix_kept():
+    matcher = dwa.ignore_matcher([os.sep.join(["", "mnt", "backup"])], ROOT)
+    assert matcher.match(os.sep.join(["", "mnt", "backup", "x"]))
+    assert not matcher.match(_full("mnt/backup/x"))
+
+
+def test_walk_prunes_config_exclusions(tmp_path):
+    config = os.path.join(DATA_DIR, "rsync_config.json")
+    for rel in ["keep/a.txt", "keep/a.swp", "daily/b.txt", ".vscode/c.json",
+                "Vendor/BBG/CMP/V2/CmpExcelInstall/d.exe", "Vendor/BBG/CMP/V2/e.xls"]:
+        path = tmp_path.joinpath(*rel.split("/"))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("x")
+    walker = dwa.diskwalk({'path': str(tmp_path), 'ignore': _load(config)})
+    found = sorted([os.path.relpath(itm, str(tmp_path)).replace(os.sep, "/")
+                    for itm in walker.iterPaths()])
+    assert found == ["Vendor/BBG/CMP/V2/e.xls", "keep/a.txt"]
+
+
+def test_enumerate_dir_compiles_matcher_once(tmp_path, monkeypatch):
+    for rel in ["keep/sub", "daily/sub", "keep/.vscode"]:
+        tmp_path.joinpath(*rel.split("/")).mkdir(parents=True)
+    built = []
+    original = dwa.ignore_matcher.__init__
+
+    def counting_init(self, *args, **kwargs):
+        built.append(args)
+        original(self, *args, **kwargs)
+    monkeypatch.setattr(dwa.ignore_matcher, "__init__", counting_init)
+    walker = dwa.diskwalk({'path': str(tmp_path), 'ignore': ["daily", ".vscode"]})
+    found = sorted([os.path.relpath(itm, str(tmp_path)) for itm in walker.enumerateDir()])
+    assert found == ["keep", os.path.join("keep", "sub")]
+    assert len(built) == 1
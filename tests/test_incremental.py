@@ -0,0 +1,159 @@
+""" backup_utility -- incremental tar chains: full -> incr -> restore with tombstones """
+import os
+import shutil
+import itertools
+import pytest
+import backup_utility as bu
+import compress_api as cpa
+
+
+@pytest.fixture
+def stamps(monkeypatch):
+    """ distinct archive names for runs within the same second """
+    counter = itertools.count()
+
+    def calc_date_time(join_char="", include_sec=False):
+        return "20240101", "%06d" % (next(counter))
+    monkeypatch.setattr(bu, "calc_date_time", calc_date_time)
+
+
+def _write(root, rel, text, mtime=None):
+    path = os.path.join(root, *rel.split("/"))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as file_ptr:
+        file_ptr.write(text)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+def _tree(root):
+    rslt = {}
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            with open(path, "r", encoding="utf-8") as file_ptr:
+                rslt[os.path.relpath(path, root).replace(os.sep, "/")] = file_ptr.read()
+    return rslt
+
+
+@pytest.mark.parametrize("codec", cpa.available_codecs())
+def test_full_incr_restore_roundtrip(tmp_path, stamps, codec):
+    src = str(tmp_path / "src")
+    dest = str(tmp_path / "dest")
+    root = os.path.join(src, "wiki")
+    os.makedirs(dest)
+    _write(root, "index.wiki", "index\n", 1000)
+    _write(root, "diary/2024-01-01.wiki", "day one\n", 1000)
+    _write(root, "old/gone.wiki", "deleted later\n", 1000)
+    _write(root, "same.wiki", "unchanged\n", 1000)
+    states = []
+
+    archive, manifest = bu.construct_incremental(src, "wiki", dest, base_name="wiki",
+                                                 full_every=5, codec=codec)
+    assert archive.endswith("full" + cpa.tar_extension(codec))
+    states.append((manifest, _tree(root)))
+
+    _write(root, "index.wiki", "index v2\n", 2000)
+    _write(root, "new.wiki", "new page\n", 2000)
+    os.remove(os.path.join(root, "old", "gone.wiki"))
+    archive, manifest = bu.construct_incremental(src, "wiki", dest, base_name="wiki",
+                                                 full_every=5, codec=codec)
+    assert archive.endswith("incr" + cpa.tar_extension(codec))
+    loaded = bu._load_manifest(manifest)
+    assert loaded["deleted"] == ["old/gone.wiki"]
+    assert loaded["parent"] is not None
+    states.append((manifest, _tree(root)))
+
+    os.remove(os.path.join(root, "new.wiki"))
+    _write(root, "diary/2024-01-02.wiki", "day two\n", 3000)
+    archive, manifest = bu.construct_incremental(src, "wiki", dest, base_name="wiki",
+                                                 full_every=5, codec=codec)
+    states.append((manifest, _tree(root)))
+
+    for idx, (manifest, expected) in enumerate(states):
+        target = str(tmp_path / ("restore%d" % (idx)))
+        applied = bu.restore_incremental(manifest, target)
+        assert len(applied) == idx + 1
+        assert _tree(target) == expected
+
+
+def test_incremental_only_archives_changes(tmp_path, stamps):
+    import tarfile
+
+    src = str(tmp_path / "src")
+    dest = str(tmp_path / "dest")
+    root = os.path.join(src, "wiki")
+    os.makedirs(dest)
+    for idx in range(5):
+        _write(root, "page%d.wiki" % (idx), "page %d\n" % (idx), 1000)
+    bu.construct_incremental(src, "wiki", dest, base_name="wiki", full_every=5)
+    _write(root, "page3.wiki", "page 3 edited\n", 2000)
+    archive, _ = bu.construct_incremental(src, "wiki", dest, base_name="wiki", full_every=5)
+    with tarfile.open(archive, "r:gz") as tar:
+        assert [itm.name for itm in tar.getmembers() if itm.isfile()] == ["page3.wiki"]
+
+
+def test_chain_restarts_with_full(tmp_path, stamps):
+    src = str(tmp_path / "src")
+    dest = str(tmp_path / "dest")
+    os.makedirs(dest)
+    _write(os.path.join(src, "wiki"), "a.wiki", "a\n", 1000)
+    kinds = []
+    for _ in range(4):
+        archive, _ = bu.construct_incremental(src, "wiki", dest, base_name="wiki", full_every=2)
+        kinds.append("full" if "_full" in os.path.basename(archive) else "incr")
+    assert kinds == ["full", "incr", "full", "incr"]
+
+
+def test_removed_directory_gets_tombstone(tmp_path, stamps):
+    src = str(tmp_path / "src")
+    dest = str(tmp_path / "dest")
+    root = os.path.join(src, "wiki")
+    os.makedirs(dest)
+    _write(root, "index.wiki", "index\n", 1000)
+    _write(root, "old/deep/gone.wiki", "gone\n", 1000)
+    _write(root, "old/also.wiki", "gone\n", 1000)
+    bu.construct_incremental(src, "wiki", dest, base_name="wiki", full_every=5)
+    shutil.rmtree(os.path.join(root, "old"))
+    _, manifest = bu.construct_incremental(src, "wiki", dest, base_name="wiki", full_every=5)
+    loaded = bu._load_manifest(manifest)
+    assert loaded["deleted_dirs"] == ["old", "old/deep"]
+    assert loaded["dirs"] == []
+
+    target = str(tmp_path / "restore")
+    bu.restore_incremental(manifest, target)
+    assert os.listdir(target) == ["index.wiki"]
+
+
+def test_unhashable_file_treated_as_changed(tmp_path, stamps, monkeypatch):
+    import tarfile
+    import diskhash_api as dha
+
+    src = str(tmp_path / "src")
+    dest = str(tmp_path / "dest")
+    root = os.path.join(src, "wiki")
+    os.makedirs(dest)
+    _write(root, "page.wiki", "page v1\n", 1000)
+    _write(root, "same.wiki", "same\n", 1000)
+    original = dha.diskhash.hashFile
+
+    def failing(self, ent, *args, **kwargs):
+        # hash errors come back as None
+        if os.path.basename(getattr(ent, "path", ent)) == "page.wiki":
+            return None
+        return original(self, ent, *args, **kwargs)
+    monkeypatch.setattr(dha.diskhash, "hashFile", failing)
+    bu.construct_incremental(src, "wiki", dest, base_name="wiki", full_every=5)
+    _write(root, "page.wiki", "page v2\n", 2000)
+    archive, manifest = bu.construct_incremental(src, "wiki", dest, base_name="wiki",
+                                                 full_every=5)
+    with tarfile.open(archive, "r:gz") as tar:
+        assert [itm.name for itm in tar.getmembers() if itm.isfile()] == ["page.wiki"]
+    # unchanged size & mtime do not make a missing hash trusted either
+    archive, manifest = bu.construct_incremental(src, "wiki", dest, base_name="wiki",
+                                                 full_every=5)
+    with tarfile.open(archive, "r:gz") as tar:
+        assert [itm.name for itm in tar.getmembers() if itm.isfile()] == ["page.wiki"]
+    target = str(tmp_path / "restore")
+    bu.restore_incremental(manifest, target)
+    assert _tree(target) == {"page.wiki": "page v2\n", "same.wiki": "same\n"}
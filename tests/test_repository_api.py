@@ -0,0 +1,113 @@
+""" repository_api -- content defined chunking & deduplicated snapshots """
+import io
+import random
+import pytest
+import repository_api as rpa
+
+
+def _text(lines, seed=3):
+    rnd = random.Random(seed)
+    return "".join(["line %d %s\n" % (idx, "x" * rnd.randint(10, 120))
+                    for idx in range(lines)]).encode("utf-8")
+
+
+def _chunks(data, **kwargs):
+    return list(rpa.iter_chunks(io.BytesIO(data), **kwargs))
+
+
+def test_chunks_rebuild_input():
+    data = _text(20000)
+    chunks = _chunks(data)
+    assert b"".join(chunks) == data
+    assert len(chunks) > 5
+    assert all(len(itm) <= rpa.MAX_CHUNK for itm in chunks)
+    assert all(len(itm) >= rpa.MIN_CHUNK for itm in chunks[:-1])
+
+
+def test_chunks_empty_and_bounds():
+    assert _chunks(b"") == []
+    assert _chunks(b"short") == [b"short"]
+    # no boundary in constant data, every chunk is cut at max_size
+    chunks = _chunks(bytes(300000), max_size=100000)
+    assert [len(itm) for itm in chunks] == [100000, 100000, 100000]
+
+
+def test_binary_insert_only_changes_nearby_chunks():
+    data = random.Random(5).randbytes(1500000).replace(b"\n", b" ")
+    chunks = _chunks(data)
+    assert b"".join(chunks) == data
+    assert len(chunks) > 5
+    assert all(rpa.MIN_CHUNK <= len(itm) <= rpa.MAX_CHUNK for itm in chunks[:-1])
+    edited = data[:700000] + b"\x00" + data[700000:]
+    before = set(chunks)
+    assert len([itm for itm in _chunks(edited) if itm not in before]) <= 2
+
+
+def test_insert_only_changes_nearby_chunks():
+    data = _text(20000)
+    idx = data.index(b"line 10000 ")
+    edited = data[:idx] + b"an inserted line\n" + data[idx:]
+    before = set(_chunks(data))
+    after = _chunks(edited)
+    assert len([itm for itm in after if itm not in before]) <= 2
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / "src"
+    (root / "sub").mkdir(parents=True)
+    (root / "big.txt").write_bytes(_text(20000))
+    (root / "sub" / "small.txt").write_bytes(b"small\n")
+    (root / "skip.swp").write_bytes(b"swap\n")
+    return root
+
+
+def test_backup_dedup_restore(tmp_path, tree):
+    repo = rpa.backup_repository(str(tmp_path / "repo"))
+    _, first = repo.backup(str(tree), "one", excluded_ending=[".swp"])
+    assert first["files"] == 2
+    assert first["new_chunks"] == first["chunks"]
+
+    data = (tree / "big.txt").read_bytes()
+    idx = data.index(b"line 5000 ")
+    (tree / "big.txt").write_bytes(data[:idx] + b"edit\n" + data[idx:])
+    _, second = repo.backup(str(tree), "two", excluded_ending=[".swp"])
+    assert 0 < second["new_chunks"] <= 2
+    assert repo.snapshots() == ["one", "two"]
+
+    for name in ("one", "two"):
+        target = tmp_path / ("restore_" + name)
+        assert repo.restore(name, str(target)) == 2
+        assert not (target / "skip.swp").exists()
+        assert (target / "sub" / "small.txt").read_bytes() == b"small\n"
+    assert (tmp_path / "restore_one" / "big.txt").read_bytes() == data
+    assert (tmp_path / "restore_two" / "big.txt").read_bytes() == (tree / "big.txt").read_bytes()
+
+
+def test_new_repository_object_dedups_against_store(tmp_path, tree):
+    rpa.backup_repository(str(tmp_path / "repo")).backup(str(tree), "one")
+    _, stats = rpa.backup_repository(str(tmp_path / "repo")).backup(str(tree), "two")
+    assert stats["chunks"] > 0 and stats["new_chunks"] == 0
+
+
+def test_collect_garbage_keeps_referenced(tmp_path, tree):
+    repo = rpa.backup_repository(str(tmp_path / "repo"))
+    repo.backup(str(tree), "one")
+    (tree / "big.txt").write_bytes(_text(20000, seed=9))
+    repo.backup(str(tree), "two")
+    repo.remove_snapshot("one")
+    count, freed = repo.collect_garbage()
+    assert count > 0 and freed > 0
+    assert repo.restore("two", str(tmp_path / "restore")) == 3
+    assert rpa.backup_repository(str(tmp_path / "repo")).collect_garbage() == (0, 0)
+
+
+def test_corrupt_chunk_detected(tmp_path, tree):
+    repo = rpa.backup_repository(str(tmp_path / "repo"))
+    repo.backup(str(tree), "one")
+    chunk_id = repo.load_snapshot("one")["files"]["sub/small.txt"]["chunks"][0]
+    path = repo._chunk_path(chunk_id)
+    with open(path, "wb") as file_ptr:
+        file_ptr.write(rpa.cpa.compress_bytes(b"tampered\n"))
+    with pytest.raises(ValueError):
+        repo.read_chunk(chunk_id)
@@ -0,0 +1,103 @@
+""" vimwiki_backup -- update planning & the process pool pipeline """
+import os
+import pytest
+import debug_control as dbc
+import vimwiki_backup as vwb
+
+
+def _write(root, rel, text):
+    path = root.joinpath(*rel.split("/"))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+    return str(path)
+
+
+@pytest.fixture
+def wiki(tmp_path):
+    src = tmp_path / "src" / "wiki"
+    dest = tmp_path / "dest"
+    temp = tmp_path / "temp"
+    for name, text in (("index.wiki", "index v2\n"), ("page.wiki", "same\n"),
+                       ("new.wiki", "new\n"), ("x.swp", "swap\n"), ("sub/deep.wiki", "deep\n"),
+                       ("broken.wiki", "cannot compare\n")):
+        _write(src, name, text)
+    _write(dest, "wiki/index.wiki", "index v1\n")
+    _write(dest, "wiki/page.wiki", "same\n")
+    (dest / "wiki" / "broken.wiki").mkdir()
+    temp.mkdir()
+    return str(src), str(dest), str(temp)
+
+
+def test_plan_updates(wiki):
+    src, dest, temp = wiki
+    plan = vwb.plan_updates(src, dest, temp)
+    assert plan['mkdirs'] == [os.path.join(temp, "wiki"), os.path.join(dest, "wiki", "sub"),
+                              os.path.join(temp, "wiki", "sub")]
+    assert sorted([itm[3] for itm in plan['compares']]) ==\
+        ["broken.wiki", "index.wiki", "page.wiki"]
+    assert all([itm[1] == os.path.join(dest, "wiki") for itm in plan['compares']])
+    assert sorted(plan['copies']) == [
+        (os.path.join(src, "new.wiki"), os.path.join(temp, "wiki"), os.path.join(dest, "wiki")),
+        (os.path.join(src, "sub", "deep.wiki"), os.path.join(temp, "wiki", "sub"),
+         os.path.join(dest, "wiki", "sub"))]
+    assert plan['excluded'] == 1
+    # planning leaves dest & temp untouched
+    assert os.listdir(temp) == []
+    assert not os.path.exists(os.path.join(dest, "wiki", "sub"))
+
+
+def test_plan_updates_custom_exclusions(wiki):
+    src, dest, temp = wiki
+    plan = vwb.plan_updates(src, dest, temp, excluded_ending=[".wiki"])
+    assert plan['excluded'] == 5
+    assert [itm[0] for itm in plan['copies']] == [os.path.join(src, "x.swp")]
+
+
+def _check_tree(src, dest, temp):
+    assert open(os.path.join(dest, "wiki", "new.wiki")).read() == "new\n"
+    assert open(os.path.join(dest, "wiki", "sub", "deep.wiki")).read() == "deep\n"
+    assert os.path.exists(os.path.join(temp, "wiki", "new.wiki"))
+    assert os.path.exists(os.path.join(temp, "wiki", "index.diff"))
+    assert not os.path.exists(os.path.join(temp, "wiki", "page.diff"))
+
+
+def test_pipeline_summary_and_log(wiki, tmp_path):
+    src, dest, temp = wiki
+    log = str(tmp_path / "debug.log")
+    dbg = dbc.debug_control(log, debug_level=1)
+    summary = vwb.update_files_pipeline(src, dest, temp, workers=2, dbg=dbg)
+    dbg.close()
+    elapsed = summary.pop('elapsed')
+    assert elapsed >= 0
+    assert summary == {'dirs': 3, 'added': 2, 'identical': 1, 'diff': 1, 'error': 1,
+                       'excluded': 1}
+    _check_tree(src, dest, temp)
+
+    with open(log, "r", encoding="utf-8") as file_ptr:
+        text = file_ptr.read()
+    # messages of the pool workers reach the parent's debug file
+    assert "Diff Error" in text and "broken.wiki" in text
+    assert "Excluding Identical File: page.wiki" in text
+    assert "Adding new.wiki" in text and "Adding deep.wiki" in text
+    assert "index.diff success" in text
+    assert "1 errors, 1 excluded" in text
+
+
+def test_pipeline_prints_worker_messages(wiki, capsys):
+    src, dest, temp = wiki
+    vwb.update_files_pipeline(src, dest, temp, workers=2, dbg=True)
+    out = capsys.readouterr().out
+    assert "Diff Error" in out and "Adding new.wiki" in out
+
+
+def test_pipeline_quiet_without_dbg(wiki, capsys):
+    src, dest, temp = wiki
+    summary = vwb.update_files_pipeline(src, dest, temp, workers=2, dbg=False)
+    assert summary['error'] == 1
+    assert capsys.readouterr().out == ""
+
+
+def test_update_files_uses_pipeline(wiki):
+    src, dest, temp = wiki
+    summary = vwb.update_files(src, dest, temp, workers=2)
+    assert summary['added'] == 2 and summary['diff'] == 1